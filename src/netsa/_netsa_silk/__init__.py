@@ -47,6 +47,7 @@
 # @OPENSOURCE_HEADER_END@
 
 from netsa._netsa_silk.python_impl import *
+from netsa._netsa_silk.prefixmap import prefix_map
 
 __all__ = """
     has_IPv6Addr
@@ -57,6 +58,10 @@ __all__ = """
 
     TCP_FIN TCP_SYN TCP_RST TCP_PSH TCP_ACK TCP_URG TCP_ECE TCP_CWR
 
+    parse_many
+    prefix_map
+    TCPFlagMask matches_many
+
     __version__
     __impl_version__
 """.split()
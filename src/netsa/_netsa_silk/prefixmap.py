@@ -0,0 +1,323 @@
+# Copyright 2008-2013 by Carnegie Mellon University
+
+# @OPENSOURCE_HEADER_START@
+# Use of the Network Situational Awareness Python support library and
+# related source code is subject to the terms of the following licenses:
+# 
+# GNU Public License (GPL) Rights pursuant to Version 2, June 1991
+# Government Purpose License Rights (GPLR) pursuant to DFARS 252.227.7013
+# 
+# NO WARRANTY
+# 
+# ANY INFORMATION, MATERIALS, SERVICES, INTELLECTUAL PROPERTY OR OTHER 
+# PROPERTY OR RIGHTS GRANTED OR PROVIDED BY CARNEGIE MELLON UNIVERSITY 
+# PURSUANT TO THIS LICENSE (HEREINAFTER THE "DELIVERABLES") ARE ON AN 
+# "AS-IS" BASIS. CARNEGIE MELLON UNIVERSITY MAKES NO WARRANTIES OF ANY 
+# KIND, EITHER EXPRESS OR IMPLIED AS TO ANY MATTER INCLUDING, BUT NOT 
+# LIMITED TO, WARRANTY OF FITNESS FOR A PARTICULAR PURPOSE, 
+# MERCHANTABILITY, INFORMATIONAL CONTENT, NONINFRINGEMENT, OR ERROR-FREE 
+# OPERATION. CARNEGIE MELLON UNIVERSITY SHALL NOT BE LIABLE FOR INDIRECT, 
+# SPECIAL OR CONSEQUENTIAL DAMAGES, SUCH AS LOSS OF PROFITS OR INABILITY 
+# TO USE SAID INTELLECTUAL PROPERTY, UNDER THIS LICENSE, REGARDLESS OF 
+# WHETHER SUCH PARTY WAS AWARE OF THE POSSIBILITY OF SUCH DAMAGES. 
+# LICENSEE AGREES THAT IT WILL NOT MAKE ANY WARRANTY ON BEHALF OF 
+# CARNEGIE MELLON UNIVERSITY, EXPRESS OR IMPLIED, TO ANY PERSON 
+# CONCERNING THE APPLICATION OF OR THE RESULTS TO BE OBTAINED WITH THE 
+# DELIVERABLES UNDER THIS LICENSE.
+# 
+# Licensee hereby agrees to defend, indemnify, and hold harmless Carnegie 
+# Mellon University, its trustees, officers, employees, and agents from 
+# all claims or demands made against them (and any related losses, 
+# expenses, or attorney's fees) arising out of, or relating to Licensee's 
+# and/or its sub licensees' negligent use or willful misuse of or 
+# negligent conduct or willful misconduct regarding the Software, 
+# facilities, or other rights or assistance granted by Carnegie Mellon 
+# University under this License, including, but not limited to, any 
+# claims of product liability, personal injury, death, damage to 
+# property, or violation of any laws or regulations.
+# 
+# Carnegie Mellon University Software Engineering Institute authored 
+# documents are sponsored by the U.S. Department of Defense under 
+# Contract FA8721-05-C-0003. Carnegie Mellon University retains 
+# copyrights in all material produced under this contract. The U.S. 
+# Government retains a non-exclusive, royalty-free license to publish or 
+# reproduce these documents, or allow others to do so, for U.S. 
+# Government purposes only pursuant to the copyright license under the 
+# contract clause at 252.227.7013.
+# @OPENSOURCE_HEADER_END@
+
+"""
+A longest-prefix-match table mapping CIDR blocks to arbitrary values.
+
+This is an extension provided by the pure-Python netsa_silk
+implementation in netsa-python, and is not part of the netsa_silk API.
+"""
+
+import array
+import mmap
+import struct
+import sys
+
+import netsa.json
+from netsa._netsa_silk.python_impl import (
+    IPAddr, _ip_conv, _ip_int, _IPv4_MAPPED_MIN)
+
+# The trie is a binary radix trie over the IPv6 address space (with
+# IPv4 addresses mapped into ::ffff:0:0/96), held as three parallel
+# arrays indexed by node number.  _left and _right hold the node
+# numbers of the children of each node (0 for none, since the root,
+# node 0, is never a child) and _value holds the index in _values of
+# the value stored at the node (-1 for none).
+
+_PMAP_FILE_MAGIC = "NSAPFXMP"
+_PMAP_FILE_VERSION = 1
+_PMAP_FILE_HEADER = struct.Struct(">8sBxxxLQ")
+_PMAP_NODE = struct.Struct(">l")
+
+class _mapped_ints(object):
+    """
+    A read-only sequence of the 32-bit signed integers stored in an
+    array within a memory-mapped prefix_map file.
+    """
+    __slots__ = ['_buf', '_offset', '_count']
+    def __init__(self, buf, offset, count):
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+    def __len__(self):
+        return self._count
+    def __getitem__(self, i):
+        if i < 0 or i >= self._count:
+            raise IndexError("index out of range")
+        return _PMAP_NODE.unpack_from(self._buf, self._offset + 4 * i)[0]
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield self[i]
+
+def _pack_ints(values):
+    if array.array('i').itemsize != 4:
+        return "".join(_PMAP_NODE.pack(v) for v in values)
+    a = array.array('i', values)
+    if sys.byteorder == 'little':
+        a.byteswap()
+    return a.tostring()
+
+def _cidr_conv(cidr):
+    """
+    Returns a pair ``(a, prefix_len)`` for the given CIDR block, where
+    *a* is the integer value of the block's first address in the IPv6
+    address space, and *prefix_len* is its prefix length in that
+    space.  *cidr* may be an ``(addr, prefix_len)`` pair, a string of
+    the form ``addr/prefix_len``, or a single address.
+    """
+    try:
+        if isinstance(cidr, tuple):
+            (addr, prefix_len) = cidr
+            addr = IPAddr(addr)
+        elif isinstance(cidr, basestring) and '/' in cidr:
+            (addr, prefix_len) = cidr.split('/', 1)
+            addr = IPAddr(addr)
+            prefix_len = int(prefix_len)
+        else:
+            addr = IPAddr(cidr)
+            prefix_len = None
+    except ValueError:
+        value_error = ValueError("Invalid CIDR block: %r" % (cidr,))
+        raise value_error
+    if addr.is_ipv6():
+        bits = 128
+    else:
+        bits = 32
+    if prefix_len is None:
+        prefix_len = bits
+    if prefix_len < 0 or prefix_len > bits:
+        value_error = ValueError("Invalid CIDR block: %r" % (cidr,))
+        raise value_error
+    prefix_len += 128 - bits
+    a = _ip_int(addr) >> (128 - prefix_len) << (128 - prefix_len)
+    return (a, prefix_len)
+
+class prefix_map(object):
+    """
+    A mapping from CIDR blocks to values, which finds the value for
+    the longest (most specific) block containing a given address.
+    IPv4 blocks and addresses are treated as IPv4-mapped IPv6 blocks
+    and addresses.
+    """
+    __slots__ = ['_left', '_right', '_value', '_values', '_v4_start']
+    def __init__(self, items=None):
+        """
+        Creates a new prefix map, inserting the ``(cidr, value)``
+        pairs from *items* if given.
+        """
+        self._left = array.array('l', [0])
+        self._right = array.array('l', [0])
+        self._value = array.array('l', [-1])
+        self._values = []
+        self._v4_start = None
+        if items:
+            for (cidr, value) in items:
+                self.insert(cidr, value)
+    def __len__(self):
+        return len(self._values)
+    def _make_mutable(self):
+        if not isinstance(self._left, array.array):
+            self._left = array.array('l', self._left)
+            self._right = array.array('l', self._right)
+            self._value = array.array('l', self._value)
+    def insert(self, cidr, value):
+        """
+        Associates *value* with the CIDR block *cidr*, replacing any
+        value previously associated with the same block.  *cidr* may
+        be a string of the form ``'addr/prefix_len'``, a single
+        address (as a string or :class:`IPAddr`), or a pair
+        ``(addr, prefix_len)`` as returned by :meth:`ip_set.cidr_iter`.
+        """
+        (a, prefix_len) = _cidr_conv(cidr)
+        self._make_mutable()
+        self._v4_start = None
+        (left, right) = (self._left, self._right)
+        n = 0
+        for i in xrange(127, 127 - prefix_len, -1):
+            if (a >> i) & 1:
+                children = right
+            else:
+                children = left
+            child = children[n]
+            if not child:
+                child = len(left)
+                left.append(0)
+                right.append(0)
+                self._value.append(-1)
+                children[n] = child
+            n = child
+        v = self._value[n]
+        if v < 0:
+            self._value[n] = len(self._values)
+            self._values.append(value)
+        else:
+            self._values[v] = value
+    def _ipv4_start(self):
+        """
+        Returns a triple ``(n, best, i)`` describing where a search for
+        an IPv4-mapped address should resume after the common
+        ::ffff:0:0/96 prefix: the node reached (or ``None``), the best
+        value index found so far, and the next bit to examine.
+        """
+        if self._v4_start is None:
+            (n, best, i) = self._walk(_IPv4_MAPPED_MIN, 0, -1, 127, 32)
+            if i < 32:
+                self._v4_start = (n, best, 31)
+            else:
+                self._v4_start = (None, best, 31)
+        return self._v4_start
+    def _walk(self, a, n, best, i, stop):
+        (left, right, value) = (self._left, self._right, self._value)
+        v = value[n]
+        if v >= 0:
+            best = v
+        while i >= stop:
+            if (a >> i) & 1:
+                n = right[n]
+            else:
+                n = left[n]
+            if not n:
+                break
+            v = value[n]
+            if v >= 0:
+                best = v
+            i -= 1
+        return (n, best, i)
+    def _lookup(self, a, default):
+        if _IPv4_MAPPED_MIN <= a <= _IPv4_MAPPED_MIN | 0xFFFFFFFF:
+            (n, best, i) = self._ipv4_start()
+            if n is not None:
+                best = self._walk(a, n, best, i, 0)[1]
+        else:
+            best = self._walk(a, 0, -1, 127, 0)[1]
+        if best < 0:
+            return default
+        return self._values[best]
+    def lookup(self, addr, default=None):
+        """
+        Returns the value associated with the longest CIDR block
+        containing *addr* (an :class:`IPAddr` or address string), or
+        *default* if no block contains it.
+        """
+        return self._lookup(_ip_conv(addr), default)
+    def lookup_many(self, values, default=None, ipv6=False):
+        """
+        Returns a list of the results of :meth:`lookup` for each
+        integer address in *values*.  If *ipv6* is false, the values
+        are IPv4 addresses (as returned by :func:`parse_many`),
+        otherwise they are IPv6 addresses.
+        """
+        if ipv6:
+            base = 0
+        else:
+            base = _IPv4_MAPPED_MIN
+        lookup = self._lookup
+        return [lookup(base | v, default) for v in values]
+    def save(self, path):
+        """
+        Writes this prefix map to the file at *path*, from which it
+        may be read back with :meth:`prefix_map.load`.  All values must
+        be serializable as JSON.
+        """
+        values = netsa.json.dumps(self._values)
+        f = open(path, 'wb')
+        try:
+            f.write(_PMAP_FILE_HEADER.pack(
+                _PMAP_FILE_MAGIC, _PMAP_FILE_VERSION, len(self._left),
+                len(values)))
+            f.write(_pack_ints(self._left))
+            f.write(_pack_ints(self._right))
+            f.write(_pack_ints(self._value))
+            f.write(values)
+        finally:
+            f.close()
+    @classmethod
+    def load(class_, path):
+        """
+        Returns a prefix map read from the file at *path*, which must
+        have been written by :meth:`prefix_map.save`.  The trie is
+        memory-mapped read-only and searched in place, so processes
+        loading the same file share its pages.  The values are read
+        into memory.  (Strings are returned as unicode.)
+        """
+        f = open(path, 'rb')
+        try:
+            header_size = _PMAP_FILE_HEADER.size
+            header = f.read(header_size)
+            if len(header) != header_size:
+                value_error = ValueError("Not a prefix_map file: %r" % path)
+                raise value_error
+            (magic, version, count,
+             values_len) = _PMAP_FILE_HEADER.unpack(header)
+            if (magic != _PMAP_FILE_MAGIC or version != _PMAP_FILE_VERSION
+                    or count < 1):
+                value_error = ValueError("Not a prefix_map file: %r" % path)
+                raise value_error
+            values_offset = header_size + 3 * count * _PMAP_NODE.size
+            f.seek(0, 2)
+            if f.tell() != values_offset + values_len:
+                value_error = ValueError(
+                    "Truncated prefix_map file: %r" % path)
+                raise value_error
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            result = class_()
+            node_bytes = count * _PMAP_NODE.size
+            result._left = _mapped_ints(buf, header_size, count)
+            result._right = _mapped_ints(
+                buf, header_size + node_bytes, count)
+            result._value = _mapped_ints(
+                buf, header_size + 2 * node_bytes, count)
+            result._values = netsa.json.loads(
+                buf[values_offset:values_offset + values_len])
+            return result
+        finally:
+            f.close()
+    def __repr__(self):
+        return "%s(<%d prefixes>)" % (self.__class__.__name__, len(self))
+
+__all__ = ['prefix_map']
@@ -46,7 +46,15 @@
 # contract clause at 252.227.7013.
 # @OPENSOURCE_HEADER_END@
 
+import array
+import bisect
+import mmap
+import socket
+import struct
 import sys
+import zlib
+
+from itertools import izip
 
 def has_IPv6Addr():
     """
@@ -358,113 +366,718 @@ class IPv6Addr(IPAddr):
     def mask_prefix(self, len):
         return IPv6Addr(self._addr & (IPv6_MAX << (128-len)) & IPv6_MAX)
 
+_has_inet_pton = hasattr(socket, 'inet_pton')
+
+def _pton_ipv4(a):
+    """
+    Returns the packed four-byte form of the IPv4 address string *a*,
+    or ``None`` if it cannot be parsed.  Strict dotted quads are
+    handled by inet_pton; anything else goes through _parse_ipv4 so
+    that the accepted syntax matches IPv4Addr exactly.
+    """
+    if _has_inet_pton:
+        try:
+            return socket.inet_pton(socket.AF_INET, a)
+        except (socket.error, TypeError, ValueError):
+            pass
+    try:
+        return struct.pack(">L", _parse_ipv4(a))
+    except (TypeError, ValueError):
+        return None
+
+def _parse_ip_int(a):
+    """
+    Returns the integer value in the IPv6 address space of the IP
+    address string *a*, mapping IPv4 addresses into ::ffff:0:0/96, or
+    ``None`` if it cannot be parsed.
+    """
+    packed = _pton_ipv4(a)
+    if packed is not None:
+        return _IPv4_MAPPED_MIN | struct.unpack(">L", packed)[0]
+    if _has_inet_pton:
+        try:
+            (hi, lo) = struct.unpack(
+                ">QQ", socket.inet_pton(socket.AF_INET6, a))
+            return (hi << 64) | lo
+        except (socket.error, TypeError, ValueError):
+            pass
+    try:
+        if ':' in a:
+            return _parse_ipv6(a)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+_IPv4_MAPPED_PREFIX = "\0" * 10 + "\xff\xff"
+
+def _pton_ip(a):
+    """
+    Returns the packed 16-byte form of the IP address string *a*,
+    mapping IPv4 addresses into ::ffff:0:0/96, or ``None`` if it
+    cannot be parsed.
+    """
+    packed = _pton_ipv4(a)
+    if packed is not None:
+        return _IPv4_MAPPED_PREFIX + packed
+    if _has_inet_pton:
+        try:
+            return socket.inet_pton(socket.AF_INET6, a)
+        except (socket.error, TypeError, ValueError):
+            pass
+    try:
+        if ':' in a:
+            v = _parse_ipv6(a)
+            return struct.pack(">QQ", v >> 64, v & 0xFFFFFFFFFFFFFFFF)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def parse_many(strings, ipv6=False):
+    """
+    Parses each IP address string in the iterable *strings* without
+    creating any IPAddr objects, and returns a pair ``(values,
+    errors)``.  *errors* is an ``array('B')`` holding 1 for each
+    string that could not be parsed and 0 otherwise.  If *ipv6* is
+    false, *values* is an array of unsigned 32-bit integers, and IPv6
+    addresses are treated as errors.  If *ipv6* is true, *values* is
+    a read-only sequence of integers in the IPv6 address space, with
+    IPv4 addresses mapped into ::ffff:0:0/96, stored packed in 16
+    bytes each.  The value for each unparsable string is 0.
+
+    The IPv4 array and *errors* support the buffer interface, so they
+    may be wrapped without copying by, for example,
+    ``numpy.frombuffer``.
+    """
+    errors = array.array('B')
+    packed = []
+    if ipv6:
+        zero = "\0" * 16
+        for a in strings:
+            p = _pton_ip(a)
+            if p is None:
+                packed.append(zero)
+                errors.append(1)
+            else:
+                packed.append(p)
+                errors.append(0)
+        return (_mapped_addrs("".join(packed), 0, len(packed), 16), errors)
+    zero = "\0\0\0\0"
+    for a in strings:
+        p = _pton_ipv4(a)
+        if p is None:
+            packed.append(zero)
+            errors.append(1)
+        else:
+            packed.append(p)
+            errors.append(0)
+    values = array.array(_ARRAY_UINT32)
+    values.fromstring("".join(packed))
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return (values, errors)
+
+_IPv4_MAPPED_MIN = 0xFFFF00000000
+_IPv4_MAPPED_MAX = 0xFFFFFFFFFFFF
+
+def _ip_int(addr):
+    """
+    Returns the integer value of an IPAddr in the IPv6 address space,
+    mapping IPv4 addresses into ::ffff:0:0/96.
+    """
+    if addr.is_ipv6():
+        return addr._addr
+    return _IPv4_MAPPED_MIN | addr._addr
+
 def _ip_conv(addr):
     if isinstance(addr, IPAddr):
-        return addr.to_ipv6()
+        return _ip_int(addr)
     if isinstance(addr, basestring):
-        try:
-            return IPAddr(addr).to_ipv6()
-        except:
-            pass
+        a = _parse_ip_int(addr)
+        if a is not None:
+            return a
     type_error = TypeError(
         "Addr must be an IPAddr or parsable IPAddr string: %r" % addr)
     raise type_error
 
-def _ip_iter(iterable):
+def _coalesce_ranges(ranges):
+    """
+    Given a sorted iterable of ``(min, max)`` integer pairs, returns a
+    list of pairs in which overlapping and adjacent ranges have been
+    joined together.
+    """
+    result = []
+    for (r_min, r_max) in ranges:
+        if result and r_min <= result[-1][1] + 1:
+            if r_max > result[-1][1]:
+                result[-1] = (result[-1][0], r_max)
+        else:
+            result.append((r_min, r_max))
+    return result
+
+def _int_ranges(values):
+    """
+    Given a sorted iterable of integers, returns a list of ``(min,
+    max)`` pairs covering runs of consecutive values.
+    """
+    result = []
+    r_min = r_max = None
+    for v in values:
+        if r_max is not None and v <= r_max + 1:
+            if v > r_max:
+                r_max = v
+        else:
+            if r_max is not None:
+                result.append((r_min, r_max))
+            r_min = r_max = v
+    if r_max is not None:
+        result.append((r_min, r_max))
+    return result
+
+def _wildcard_ip_ranges(wildcard):
+    if wildcard._is_ipv6:
+        return wildcard._ranges()
+    return ((_IPv4_MAPPED_MIN | r_min, _IPv4_MAPPED_MIN | r_max)
+            for (r_min, r_max) in wildcard._ranges())
+
+def _ip_ranges(iterable):
+    """
+    Converts an ip_set, an IPWildcard, or an iterable of IPAddr,
+    IPWildcard, and parsable strings into a sorted, coalesced list of
+    ``(min, max)`` ranges in the IPv6 address space.
+    """
     if isinstance(iterable, ip_set):
-        for v in iterable._content:
-            yield v
-    else:
-        for v in iterable:
-            if isinstance(v, IPAddr):
-                yield v.to_ipv6()
-                continue
-            if isinstance(v, IPWildcard):
-                for addr in v:
-                    yield addr.to_ipv6()
-                continue
-            if isinstance(v, basestring):
-                try:
-                    yield IPAddr(v).to_ipv6()
-                    continue
-                except ValueError:
-                    for addr in IPWildcard(v):
-                        yield addr.to_ipv6()
-                    continue
-            type_error = TypeError(
-                "iterables must contain IPAddr, IPWildcard, or parsable "
-                "strings: %r" % v)
-            raise type_error
+        return zip(iterable._starts, iterable._ends)
+    if isinstance(iterable, IPWildcard):
+        return _coalesce_ranges(_wildcard_ip_ranges(iterable))
+    addrs = []
+    ranges = []
+    for v in iterable:
+        if isinstance(v, IPAddr):
+            addrs.append(_ip_int(v))
+            continue
+        if isinstance(v, IPWildcard):
+            ranges.extend(_wildcard_ip_ranges(v))
+            continue
+        if isinstance(v, basestring):
+            a = _parse_ip_int(v)
+            if a is None:
+                ranges.extend(_wildcard_ip_ranges(IPWildcard(v)))
+            else:
+                addrs.append(a)
+            continue
+        type_error = TypeError(
+            "iterables must contain IPAddr, IPWildcard, or parsable "
+            "strings: %r" % v)
+        raise type_error
+    addrs.sort()
+    if not ranges:
+        return _int_ranges(addrs)
+    ranges.extend(_int_ranges(addrs))
+    ranges.sort()
+    return _coalesce_ranges(ranges)
+
+def _ranges_have_ipv6(ranges):
+    for (r_min, r_max) in ranges:
+        if r_min < _IPv4_MAPPED_MIN or r_max > _IPv4_MAPPED_MAX:
+            return True
+    return False
+
+def _ranges_union(xs, ys):
+    if not xs:
+        return list(ys)
+    if not ys:
+        return list(xs)
+    result = list(xs)
+    result.extend(ys)
+    result.sort()
+    return _coalesce_ranges(result)
 
-def _ip_iters(iterables):
-    for iterable in iterables:
-        for addr in _ip_iter(iterable):
-            yield addr
+def _ranges_intersection(xs, ys):
+    result = []
+    (i, j) = (0, 0)
+    (nx, ny) = (len(xs), len(ys))
+    while i < nx and j < ny:
+        (x_min, x_max) = xs[i]
+        (y_min, y_max) = ys[j]
+        r_min = max(x_min, y_min)
+        r_max = min(x_max, y_max)
+        if r_min <= r_max:
+            result.append((r_min, r_max))
+        if x_max < y_max:
+            i += 1
+        else:
+            j += 1
+    return result
+
+def _ranges_difference(xs, ys):
+    result = []
+    j = 0
+    ny = len(ys)
+    for (x_min, x_max) in xs:
+        while j < ny and ys[j][1] < x_min:
+            j += 1
+        k = j
+        covered = False
+        while k < ny and ys[k][0] <= x_max:
+            (y_min, y_max) = ys[k]
+            if y_min > x_min:
+                result.append((x_min, y_min - 1))
+            if y_max >= x_max:
+                covered = True
+                break
+            x_min = y_max + 1
+            k += 1
+        if not covered:
+            result.append((x_min, x_max))
+    return result
+
+def _cidr_blocks(range_min, range_max, bits):
+    """
+    Given the first and last integer addresses of a range and the
+    width in bits of the address space, generates ``(prefix,
+    prefix_len)`` pairs for the minimal list of CIDR blocks covering
+    the range, in order.
+    """
+    while range_min <= range_max:
+        # The largest block starting at range_min is limited both by
+        # the alignment of range_min and by the size of the range.
+        host_bits = 0
+        while (host_bits < bits and not (range_min >> host_bits) & 1 and
+               range_min + (2 << host_bits) - 1 <= range_max):
+            host_bits += 1
+        yield range_min, bits - host_bits
+        range_min += 1 << host_bits
+
+# Binary ip_set files consist of a fixed-size header followed by the
+# range starts and then the range ends, each an array of big-endian
+# unsigned integers of the given width (4 bytes for IPv4-only sets,
+# in which case values are offsets into ::ffff:0:0/96, or 16 bytes.)
+_IPSET_FILE_MAGIC = "NSAIPSET"
+_IPSET_FILE_VERSION = 1
+_IPSET_FILE_HEADER = struct.Struct(">8sBBBxxxxxQ")
+_IPSET_FLAG_IPV6 = 0x01
+
+if array.array('I').itemsize == 4:
+    _ARRAY_UINT32 = 'I'
+else:
+    _ARRAY_UINT32 = 'L'
+
+class _mapped_addrs(object):
+    """
+    A read-only sequence of the integer addresses stored as an array
+    of big-endian integers in a buffer, such as a memory-mapped binary
+    ip_set file or the packed output of :func:`parse_many`.  This
+    supports just enough of the list interface for ip_set to search
+    and iterate over it in place.
+    """
+    __slots__ = ['_buf', '_offset', '_count', '_width', '_base']
+    def __init__(self, buf, offset, count, width):
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+        self._width = width
+        if width == 4:
+            self._base = _IPv4_MAPPED_MIN
+        else:
+            self._base = 0
+    def __len__(self):
+        return self._count
+    def _get(self, i):
+        offset = self._offset + i * self._width
+        if self._width == 4:
+            return self._base | struct.unpack_from(">L", self._buf, offset)[0]
+        (hi, lo) = struct.unpack_from(">QQ", self._buf, offset)
+        return (hi << 64) | lo
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._get(j) for j in xrange(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if i < 0 or i >= self._count:
+            raise IndexError("index out of range")
+        return self._get(i)
+    def __iter__(self):
+        get = self._get
+        for i in xrange(self._count):
+            yield get(i)
+    def __eq__(self, other):
+        return list(self) == list(other)
+    def __ne__(self, other):
+        return not self == other
+
+def _pack_addrs(addrs, width):
+    if width == 4:
+        a = array.array(_ARRAY_UINT32, [x & IPv4_MAX for x in addrs])
+        if sys.byteorder == 'little':
+            a.byteswap()
+        return a.tostring()
+    return "".join(struct.pack(">QQ", x >> 64, x & 0xFFFFFFFFFFFFFFFF)
+                   for x in addrs)
+
+# SiLK IPset files have a SiLK file header followed by a data section
+# whose layout depends on the record version.  Record version 2 (the
+# "classic" IPv4 format) is a series of /24 blocks, each a base
+# address followed by a 256-bit bitmap stored as eight 32-bit words.
+# Record version 4 is a series of blocks, each an address (a 32-bit
+# integer for IPv4, 16 network-order bytes for IPv6) followed by one
+# byte which is either a CIDR prefix length or a marker indicating
+# that a 256-bit bitmap of the /24 (or /120) follows.  Integers in the
+# data section use the byte order given in the file header.  Record
+# version 3 (a serialized radix tree) is not supported.
+_SILK_MAGIC = "\xDE\xAD\xBE\xEF"
+_SILK_HEADER_START = struct.Struct(">4sBBBBLHH")
+_SILK_HENTRY_SPEC = struct.Struct(">LL")
+_SILK_HENTRY_IPSET = struct.Struct(">LLLLLL")
+_SILK_HENTRY_END_ID = 0
+_SILK_HENTRY_IPSET_ID = 7
+_SILK_FLAG_BIG_ENDIAN = 0x01
+_SILK_FT_IPSET = 0x1D
+_SILK_FILE_VERSION = 16
+_SILK_COMP_NONE = 0
+_SILK_COMP_ZLIB = 1
+_SILK_BLOCK_HEADER = struct.Struct(">LL")
+_SILK_IPSET_CLASSIC_VERSIONS = (0, 1, 2)
+_SILK_IPSET_CIDRBMAP_VERSION = 4
+_SILK_IPSET_MAP256 = 0x81
+
+class _silk_data_reader(object):
+    """
+    Reads the data section of a SiLK file, undoing block compression
+    if necessary.
+    """
+    def __init__(self, f, comp_method):
+        self._f = f
+        self._comp_method = comp_method
+        self._buf = ""
+    def read(self, n):
+        if self._comp_method == _SILK_COMP_NONE:
+            return self._f.read(n)
+        while len(self._buf) < n:
+            block_header = self._f.read(_SILK_BLOCK_HEADER.size)
+            if len(block_header) < _SILK_BLOCK_HEADER.size:
+                break
+            (comp_len, uncomp_len) = _SILK_BLOCK_HEADER.unpack(block_header)
+            self._buf += zlib.decompress(self._f.read(comp_len))
+        (result, self._buf) = (self._buf[:n], self._buf[n:])
+        return result
+
+def _silk_read(reader, n, path):
+    """
+    Reads *n* bytes from *reader*.  Returns an empty string at the
+    end of the data, and raises ValueError on a partial read.
+    """
+    data = reader.read(n)
+    if data and len(data) != n:
+        value_error = ValueError("Truncated SiLK IPset file: %r" % path)
+        raise value_error
+    return data
+
+def _silk_read_exact(reader, n, path):
+    data = reader.read(n)
+    if len(data) != n:
+        value_error = ValueError("Truncated SiLK IPset file: %r" % path)
+        raise value_error
+    return data
+
+def _bitmap_ranges(base, words):
+    """
+    Generates the ``(min, max)`` ranges of set bits in a bitmap of
+    consecutive addresses starting at *base*, given as a sequence of
+    32-bit words with the least significant bit first.
+    """
+    for (i, w) in enumerate(words):
+        if not w:
+            continue
+        word_base = base + 32 * i
+        if w == 0xFFFFFFFF:
+            yield (word_base, word_base + 31)
+            continue
+        j = 0
+        while j < 32:
+            if (w >> j) & 1:
+                r_min = j
+                while j < 32 and (w >> j) & 1:
+                    j += 1
+                yield (word_base + r_min, word_base + j - 1)
+            else:
+                j += 1
 
-def _ip_iters_check(iterables, s):
-    addrs = _ip_iters(iterables)
-    if not s._contains_ipv6:
+def _silk_ipset_ranges(reader, rec_version, is_ipv6, endian, path):
+    """
+    Generates the ``(min, max)`` ranges in the IPv6 address space
+    stored in the data section of a SiLK IPset file.
+    """
+    if is_ipv6:
+        base = 0
+    else:
+        base = _IPv4_MAPPED_MIN
+    words = struct.Struct(endian + "8L")
+    if rec_version in _SILK_IPSET_CLASSIC_VERSIONS:
+        block = struct.Struct(endian + "9L")
         while True:
-            addr = addrs.next()
-            yield addr
-            if addr._addr < 0xFFFF00000000 or addr._addr > 0xFFFFFFFFFFFF:
-                s._contains_ipv6 = True
+            data = _silk_read(reader, block.size, path)
+            if not data:
                 break
+            values = block.unpack(data)
+            for r in _bitmap_ranges(base | values[0], values[1:]):
+                yield r
+        return
+    if is_ipv6:
+        (addr_size, bits) = (16, 128)
+    else:
+        (addr_size, bits) = (4, 32)
+    uint32 = endian + "L"
     while True:
-        yield addrs.next()
+        data = _silk_read(reader, addr_size, path)
+        if not data:
+            break
+        if is_ipv6:
+            (hi, lo) = struct.unpack(">QQ", data)
+            addr = (hi << 64) | lo
+        else:
+            addr = base | struct.unpack(uint32, data)[0]
+        prefix = ord(_silk_read_exact(reader, 1, path))
+        if prefix == _SILK_IPSET_MAP256:
+            values = words.unpack(_silk_read_exact(reader, words.size, path))
+            for r in _bitmap_ranges(addr, values):
+                yield r
+        elif prefix <= bits:
+            yield (addr, addr | ((1 << (bits - prefix)) - 1))
+        else:
+            value_error = ValueError(
+                "Invalid block in SiLK IPset file: %r" % path)
+            raise value_error
+
+def _read_silk_ipset(path):
+    """
+    Returns a pair ``(is_ipv6, ranges)`` for the SiLK IPset file at
+    *path*, where *ranges* is a sorted, coalesced list of ``(min,
+    max)`` ranges in the IPv6 address space.
+    """
+    f = open(path, 'rb')
+    try:
+        header = f.read(_SILK_HEADER_START.size)
+        if len(header) != _SILK_HEADER_START.size:
+            value_error = ValueError("Not a SiLK IPset file: %r" % path)
+            raise value_error
+        (magic, flags, file_format, file_version, comp_method, silk_version,
+         rec_size, rec_version) = _SILK_HEADER_START.unpack(header)
+        if (magic != _SILK_MAGIC or file_format != _SILK_FT_IPSET or
+                file_version < _SILK_FILE_VERSION):
+            value_error = ValueError("Not a SiLK IPset file: %r" % path)
+            raise value_error
+        if comp_method not in (_SILK_COMP_NONE, _SILK_COMP_ZLIB):
+            value_error = ValueError(
+                "Unsupported compression method %d in SiLK IPset file: %r" %
+                (comp_method, path))
+            raise value_error
+        if (rec_version not in _SILK_IPSET_CLASSIC_VERSIONS and
+                rec_version != _SILK_IPSET_CIDRBMAP_VERSION):
+            value_error = ValueError(
+                "Unsupported SiLK IPset record version %d: %r" %
+                (rec_version, path))
+            raise value_error
+        is_ipv6 = False
+        while True:
+            spec = f.read(_SILK_HENTRY_SPEC.size)
+            if len(spec) != _SILK_HENTRY_SPEC.size:
+                value_error = ValueError(
+                    "Truncated SiLK IPset file: %r" % path)
+                raise value_error
+            (hentry_id, hentry_len) = _SILK_HENTRY_SPEC.unpack(spec)
+            body = f.read(hentry_len - _SILK_HENTRY_SPEC.size)
+            if hentry_id == _SILK_HENTRY_END_ID:
+                break
+            if (hentry_id == _SILK_HENTRY_IPSET_ID and
+                    len(body) >= _SILK_HENTRY_IPSET.size):
+                leaf_size = _SILK_HENTRY_IPSET.unpack(
+                    body[:_SILK_HENTRY_IPSET.size])[2]
+                is_ipv6 = (rec_version == _SILK_IPSET_CIDRBMAP_VERSION and
+                           leaf_size == 16)
+        if flags & _SILK_FLAG_BIG_ENDIAN:
+            endian = ">"
+        else:
+            endian = "<"
+        reader = _silk_data_reader(f, comp_method)
+        ranges = []
+        in_order = True
+        for (r_min, r_max) in _silk_ipset_ranges(
+                reader, rec_version, is_ipv6, endian, path):
+            if ranges:
+                last_max = ranges[-1][1]
+                if r_min <= last_max:
+                    in_order = False
+                elif r_min == last_max + 1:
+                    ranges[-1] = (ranges[-1][0], r_max)
+                    continue
+            ranges.append((r_min, r_max))
+        if not in_order:
+            ranges.sort()
+            ranges = _coalesce_ranges(ranges)
+        return (is_ipv6, ranges)
+    finally:
+        f.close()
 
-ip_iters_check = _ip_iters_check
+def _write_silk_ipset(path, ranges, is_ipv6, rec_version):
+    """
+    Writes the sorted ``(min, max)`` ranges to a SiLK IPset file at
+    *path*, using the given record version.  The data section is
+    written uncompressed, in big-endian byte order.
+    """
+    if rec_version in _SILK_IPSET_CLASSIC_VERSIONS:
+        if is_ipv6:
+            value_error = ValueError(
+                "SiLK IPset record version %d cannot hold IPv6 addresses" %
+                rec_version)
+            raise value_error
+    elif rec_version != _SILK_IPSET_CIDRBMAP_VERSION:
+        value_error = ValueError(
+            "Unsupported SiLK IPset record version %r" % rec_version)
+        raise value_error
+    if is_ipv6:
+        (addr_size, bits, mask) = (16, 128, IPv6_MAX)
+    else:
+        (addr_size, bits, mask) = (4, 32, IPv4_MAX)
+    f = open(path, 'wb')
+    try:
+        f.write(_SILK_HEADER_START.pack(
+            _SILK_MAGIC, _SILK_FLAG_BIG_ENDIAN, _SILK_FT_IPSET,
+            _SILK_FILE_VERSION, _SILK_COMP_NONE, 0, 1, rec_version))
+        f.write(_SILK_HENTRY_SPEC.pack(
+            _SILK_HENTRY_IPSET_ID,
+            _SILK_HENTRY_SPEC.size + _SILK_HENTRY_IPSET.size))
+        f.write(_SILK_HENTRY_IPSET.pack(0, 0, addr_size, 0, 0, 0))
+        f.write(_SILK_HENTRY_SPEC.pack(
+            _SILK_HENTRY_END_ID, _SILK_HENTRY_SPEC.size))
+        if rec_version == _SILK_IPSET_CIDRBMAP_VERSION:
+            for (r_min, r_max) in ranges:
+                for (prefix, prefix_len) in _cidr_blocks(
+                        r_min & mask, r_max & mask, bits):
+                    if is_ipv6:
+                        f.write(struct.pack(">QQB", prefix >> 64,
+                                            prefix & 0xFFFFFFFFFFFFFFFF,
+                                            prefix_len))
+                    else:
+                        f.write(struct.pack(">LB", prefix, prefix_len))
+            return
+        block = struct.Struct(">9L")
+        def write_block(block_base, bitmap):
+            f.write(block.pack(block_base,
+                               *[(bitmap >> (32 * i)) & 0xFFFFFFFF
+                                 for i in xrange(8)]))
+        (block_base, bitmap) = (None, 0)
+        for (r_min, r_max) in ranges:
+            (r_min, r_max) = (r_min & mask, r_max & mask)
+            while r_min <= r_max:
+                base = r_min & ~0xFF
+                hi = min(r_max, base | 0xFF)
+                if base != block_base:
+                    if block_base is not None:
+                        write_block(block_base, bitmap)
+                    (block_base, bitmap) = (base, 0)
+                bitmap |= ((1 << (hi - r_min + 1)) - 1) << (r_min - base)
+                r_min = hi + 1
+        if block_base is not None:
+            write_block(block_base, bitmap)
+    finally:
+        f.close()
 
 class ip_set(object):
-    __slots__ = ['_content', '_contains_ipv6']
+    # _starts and _ends are parallel sorted lists holding the first
+    # and last address (as integers in the IPv6 address space) of each
+    # of the non-overlapping, non-adjacent ranges in the set.  A set
+    # loaded from a binary file holds _mapped_addrs sequences instead,
+    # which are replaced by lists the first time the set is modified
+    # in place.
+    __slots__ = ['_starts', '_ends', '_contains_ipv6']
     def __init__(self, iterable=None):
-        self._content = set()
+        self._starts = []
+        self._ends = []
         self._contains_ipv6 = False
         if iterable:
             self.update(iterable)
+    def _ranges(self):
+        return zip(self._starts, self._ends)
+    def _set_ranges(self, ranges):
+        self._starts = [r_min for (r_min, r_max) in ranges]
+        self._ends = [r_max for (r_min, r_max) in ranges]
+    def _make_mutable(self):
+        if not isinstance(self._starts, list):
+            self._starts = list(self._starts)
+            self._ends = list(self._ends)
+    def _out(self, a):
+        if self._contains_ipv6:
+            return IPv6Addr(a)
+        return IPv4Addr(a & IPv4_MAX)
     def cardinality(self):
-        return len(self._content)
+        result = len(self._starts)
+        for (r_min, r_max) in izip(self._starts, self._ends):
+            result += r_max - r_min
+        return result
     def __len__(self):
         return self.cardinality()
     def __contains__(self, addr):
-        return _ip_conv(addr) in self._content
-    def __iter__(self):
-        if self._contains_ipv6:
-            for addr in self._content:
-                yield addr
+        a = _ip_conv(addr)
+        i = bisect.bisect_right(self._starts, a)
+        return i > 0 and a <= self._ends[i-1]
+    def contains_many(self, values, ipv6=False):
+        """
+        Returns an ``array('B')`` holding 1 for each integer address
+        in *values* that is in this set and 0 for each that is not.
+        If *ipv6* is false, the values are IPv4 addresses (as
+        returned by :func:`parse_many`), otherwise they are IPv6
+        addresses.
+        """
+        result = array.array('B')
+        starts = self._starts
+        ends = self._ends
+        bisect_right = bisect.bisect_right
+        if ipv6:
+            base = 0
         else:
-            for addr in self._content:
-                yield addr.to_ipv4()
+            base = _IPv4_MAPPED_MIN
+        for v in values:
+            a = base | v
+            i = bisect_right(starts, a)
+            result.append(i > 0 and a <= ends[i-1])
+        return result
+    def __iter__(self):
+        out = self._out
+        for (r_min, r_max) in izip(self._starts, self._ends):
+            a = r_min
+            while a <= r_max:
+                yield out(a)
+                a += 1
     def __eq__(self, s2):
         if not isinstance(s2, ip_set):
             return False
-        return (self._content == s2._content)
+        return (self._starts == s2._starts and self._ends == s2._ends)
     def __ne__(self, s2):
         if not isinstance(s2, ip_set):
             return True
-        return (self._content != s2._content)
+        return (self._starts != s2._starts or self._ends != s2._ends)
     def isdisjoint(self, iterable):
-        return self._content.isdisjoint(_ip_iter(iterable))
+        return not _ranges_intersection(self._ranges(), _ip_ranges(iterable))
     def issubset(self, iterable):
-        return self._content.issubset(_ip_iter(iterable))
+        return not _ranges_difference(self._ranges(), _ip_ranges(iterable))
     def __le__(self, s2):
         if not isinstance(s2, ip_set):
             raise TypeError("can only compare to an ip_set")
-        return self._content <= s2._content
+        return self.issubset(s2)
     def __lt__(self, s2):
         if not isinstance(s2, ip_set):
             raise TypeError("can only compare to an ip_set")
-        return self._content < s2._content
+        return self.issubset(s2) and self != s2
     def issuperset(self, iterable):
-        return self._content.issuperset(_ip_iter(iterable))
+        return not _ranges_difference(_ip_ranges(iterable), self._ranges())
     def __ge__(self, s2):
         if not isinstance(s2, ip_set):
             raise TypeError("can only compare to an ip_set")
-        return self._content >= s2._content
+        return self.issuperset(s2)
     def __gt__(self, s2):
         if not isinstance(s2, ip_set):
             raise TypeError("can only compare to an ip_set")
-        return self._content > s2._content
+        return self.issuperset(s2) and self != s2
     def union(self, *iterables):
         result = self.copy()
         result.update(*iterables)
@@ -484,103 +1097,216 @@ class ip_set(object):
         result.difference_update(*iterables)
         return result
     def __sub__(self, s2):
-        if not isinstance(s2, ip_set): return NotImplemented        
+        if not isinstance(s2, ip_set): return NotImplemented
         return self.difference(s2)
     def symmetric_difference(self, iterable):
         result = self.copy()
         result.symmetric_difference_update(iterable)
         return result
     def __xor__(self, s2):
-        if not isinstance(s2, ip_set): return NotImplemented        
+        if not isinstance(s2, ip_set): return NotImplemented
         return self.symmetric_difference(s2)
     def copy(self):
-        return self.__class__(self)
+        result = self.__class__()
+        result._starts = list(self._starts)
+        result._ends = list(self._ends)
+        result._contains_ipv6 = self._contains_ipv6
+        return result
     def update(self, *iterables):
-        self._content.update(_ip_iters_check(iterables, self))
+        ranges = self._ranges()
+        for iterable in iterables:
+            ys = _ip_ranges(iterable)
+            if not self._contains_ipv6 and _ranges_have_ipv6(ys):
+                self._contains_ipv6 = True
+            ranges = _ranges_union(ranges, ys)
+        self._set_ranges(ranges)
     def __ior__(self, s2):
         if not isinstance(s2, ip_set): return NotImplemented
         self.update(s2)
         return self
     def intersection_update(self, *iterables):
-        self._content.intersection_update(_ip_iters(iterables))
+        ranges = self._ranges()
+        for iterable in iterables:
+            ranges = _ranges_intersection(ranges, _ip_ranges(iterable))
+        self._set_ranges(ranges)
     def __iand__(self, s2):
         if not isinstance(s2, ip_set): return NotImplemented
         self.intersection_update(s2)
         return self
     def difference_update(self, *iterables):
-        self._content.difference_update(_ip_iters(iterables))
+        ranges = self._ranges()
+        for iterable in iterables:
+            ranges = _ranges_difference(ranges, _ip_ranges(iterable))
+        self._set_ranges(ranges)
     def __isub__(self, s2):
         if not isinstance(s2, ip_set): return NotImplemented
         self.difference_update(s2)
         return self
     def symmetric_difference_update(self, iterable):
-        self._content.symmetric_difference_update(
-            _ip_iters_check([iterable], self))
+        xs = self._ranges()
+        ys = _ip_ranges(iterable)
+        if not self._contains_ipv6 and _ranges_have_ipv6(ys):
+            self._contains_ipv6 = True
+        self._set_ranges(_ranges_difference(_ranges_union(xs, ys),
+                                            _ranges_intersection(xs, ys)))
     def __ixor__(self, s2):
         if not isinstance(s2, ip_set): return NotImplemented
         self.symmetric_difference_update(s2)
         return self
     def add(self, addr):
-        addr = _ip_conv(addr)
-        if addr._addr < 0xFFFF00000000 or addr._addr > 0xFFFFFFFFFFFF:
+        a = _ip_conv(addr)
+        if a < _IPv4_MAPPED_MIN or a > _IPv4_MAPPED_MAX:
             self._contains_ipv6 = True
-        self._content.add(addr)
+        self._make_mutable()
+        starts = self._starts
+        ends = self._ends
+        i = bisect.bisect_right(starts, a)
+        join_prev = (i > 0 and ends[i-1] + 1 >= a)
+        if join_prev and ends[i-1] >= a:
+            return
+        join_next = (i < len(starts) and starts[i] == a + 1)
+        if join_prev and join_next:
+            ends[i-1] = ends[i]
+            del starts[i]
+            del ends[i]
+        elif join_prev:
+            ends[i-1] = a
+        elif join_next:
+            starts[i] = a
+        else:
+            starts.insert(i, a)
+            ends.insert(i, a)
+    def _discard(self, a):
+        self._make_mutable()
+        starts = self._starts
+        ends = self._ends
+        i = bisect.bisect_right(starts, a) - 1
+        if i < 0 or ends[i] < a:
+            return False
+        (r_min, r_max) = (starts[i], ends[i])
+        if r_min == r_max:
+            del starts[i]
+            del ends[i]
+        elif a == r_min:
+            starts[i] = a + 1
+        elif a == r_max:
+            ends[i] = a - 1
+        else:
+            ends[i] = a - 1
+            starts.insert(i+1, a + 1)
+            ends.insert(i+1, r_max)
+        return True
     def remove(self, addr):
-        addr = _ip_conv(addr)
-        self._content.remove(addr)
+        if not self._discard(_ip_conv(addr)):
+            raise KeyError(addr)
     def discard(self, addr):
-        addr = _ip_conv(addr)
-        self._content.discard(addr)
+        self._discard(_ip_conv(addr))
     def pop(self):
-        addr = self._content.pop()
-        if self._contains_ipv6:
-            return addr.to_ipv4()
+        if not self._starts:
+            raise KeyError('pop from an empty ip_set')
+        self._make_mutable()
+        a = self._ends[-1]
+        if self._starts[-1] == a:
+            self._starts.pop()
+            self._ends.pop()
         else:
-            return addr
+            self._ends[-1] = a - 1
+        return self._out(a)
     def clear(self):
         self._contains_ipv6 = False
-        self._content.clear()
+        self._starts = []
+        self._ends = []
     def _range_iter(self):
-        sorted_ips = sorted(self)
-        while sorted_ips:
-            range_min = sorted_ips.pop(0)._addr
-            range_max = range_min
-            while sorted_ips and sorted_ips[0]._addr == range_max + 1:
-                range_max = sorted_ips.pop(0)._addr
-            if self._contains_ipv6:
-                yield (IPv6Addr(range_min), IPv6Addr(range_max))
-            else:
-                yield (IPv4Addr(range_min & IPv4_MAX),
-                       IPv4Addr(range_max & IPv4_MAX))
+        out = self._out
+        for (range_min, range_max) in izip(self._starts, self._ends):
+            yield (out(range_min), out(range_max))
     def cidr_iter(self):
-        for (range_min, range_max) in self._range_iter():
-            range_min = range_min._addr
-            range_max = range_max._addr
-            if self._contains_ipv6:
-                bit, bits = 1, 128
-                make_ip = IPv6Addr
-            else:
-                bit, bits = 1, 32
-                range_min &= IPv4_MAX
-                range_max &= IPv4_MAX
-                make_ip = IPv4Addr
-            while bits:
-                if range_min + bit > range_max:
-                    break
-                elif range_min & bit:
-                    yield make_ip(range_min & ~(bit - 1)), bits
-                    range_min += bit
-                bit <<= 1
-                bits -= 1
-            prefix = range_max & ~(bit - 1)
-            while bit:
-                if prefix + bit - 1 <= range_max:
-                    yield make_ip(prefix), bits
-                    prefix += bit
-                    if prefix > range_max:
-                        break
-                bit >>= 1
-                bits += 1
+        if self._contains_ipv6:
+            (bits, make_ip, mask) = (128, IPv6Addr, IPv6_MAX)
+        else:
+            (bits, make_ip, mask) = (32, IPv4Addr, IPv4_MAX)
+        for (range_min, range_max) in izip(self._starts, self._ends):
+            for (prefix, prefix_len) in _cidr_blocks(
+                    range_min & mask, range_max & mask, bits):
+                yield make_ip(prefix), prefix_len
+    def save(self, path):
+        """
+        Writes this set to the file at *path* in a compact binary
+        format which may be read back with :meth:`ip_set.load`.
+        """
+        if _ranges_have_ipv6(self._ranges()):
+            width = 16
+        else:
+            width = 4
+        flags = 0
+        if self._contains_ipv6:
+            flags |= _IPSET_FLAG_IPV6
+        f = open(path, 'wb')
+        try:
+            f.write(_IPSET_FILE_HEADER.pack(
+                _IPSET_FILE_MAGIC, _IPSET_FILE_VERSION, width, flags,
+                len(self._starts)))
+            f.write(_pack_addrs(self._starts, width))
+            f.write(_pack_addrs(self._ends, width))
+        finally:
+            f.close()
+    @classmethod
+    def load(class_, path):
+        """
+        Returns a new set read from the binary file at *path*, which
+        must have been written by :meth:`ip_set.save`.  The file is
+        memory-mapped read-only, and queries are answered directly
+        from the mapped data, so that processes loading the same file
+        share its pages.
+        """
+        f = open(path, 'rb')
+        try:
+            header_size = _IPSET_FILE_HEADER.size
+            header = f.read(header_size)
+            if len(header) != header_size:
+                value_error = ValueError("Not an ip_set file: %r" % path)
+                raise value_error
+            (magic, version, width, flags,
+             count) = _IPSET_FILE_HEADER.unpack(header)
+            if (magic != _IPSET_FILE_MAGIC or
+                    version != _IPSET_FILE_VERSION or width not in (4, 16)):
+                value_error = ValueError("Not an ip_set file: %r" % path)
+                raise value_error
+            f.seek(0, 2)
+            if f.tell() != header_size + 2 * count * width:
+                value_error = ValueError("Truncated ip_set file: %r" % path)
+                raise value_error
+            result = class_()
+            result._contains_ipv6 = bool(flags & _IPSET_FLAG_IPV6)
+            if count:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                result._starts = _mapped_addrs(
+                    buf, header_size, count, width)
+                result._ends = _mapped_addrs(
+                    buf, header_size + count * width, count, width)
+            return result
+        finally:
+            f.close()
+    def save_silk(self, path, record_version=4):
+        """
+        Writes this set to the file at *path* as a SiLK IPset file
+        with the given *record_version*, which may be 4 (readable by
+        SiLK 3.7 and later) or 2 (the classic format, which may only
+        hold IPv4 addresses.)
+        """
+        _write_silk_ipset(path, izip(self._starts, self._ends),
+                          self._contains_ipv6, record_version)
+    @classmethod
+    def load_silk(class_, path):
+        """
+        Returns a new set read from the SiLK IPset file at *path*.
+        Files using record version 3 are not supported.
+        """
+        (is_ipv6, ranges) = _read_silk_ipset(path)
+        result = class_()
+        result._contains_ipv6 = is_ipv6
+        result._set_ranges(ranges)
+        return result
     @classmethod
     def supports_ipv6(class_):
         return True
@@ -597,6 +1323,73 @@ class ip_set(object):
                                list(start_of(self)))
         return "%s(%r)" % (self.__class__.__name__, list(self))
 
+def _make_fields(field_ranges, field_bits):
+    """
+    Given the accepted ``(min, max)`` value ranges for each field of a
+    wildcard (most significant field first) and the width in bits of
+    each field, returns a list of ``(bits, ranges)`` pairs with each
+    field's ranges sorted and coalesced.
+    """
+    return [(bits, _coalesce_ranges(sorted(r)))
+            for (r, bits) in zip(field_ranges, field_bits)]
+
+def _block_fields(a_min, a_max, field_bits):
+    """
+    Given the first and last integer addresses of a CIDR block and the
+    width in bits of each field of the address (most significant field
+    first), returns the ``(bits, ranges)`` fields of a wildcard
+    matching exactly the addresses in the block.
+    """
+    fields = []
+    shift = sum(field_bits)
+    for bits in field_bits:
+        shift -= bits
+        field_max = (1 << bits) - 1
+        fields.append((bits, [((a_min >> shift) & field_max,
+                               (a_max >> shift) & field_max)]))
+    return fields
+
+def _field_mask(bits, ranges):
+    """
+    Returns an integer bitmap with bit *v* set for each value *v*
+    accepted by a wildcard field, or ``None`` if the field accepts
+    every value.
+    """
+    if ranges == [(0, (1 << bits) - 1)]:
+        return None
+    mask = 0
+    for (r_min, r_max) in ranges:
+        mask |= ((1 << (r_max - r_min + 1)) - 1) << r_min
+    return mask
+
+def _wildcard_ranges(fields):
+    """
+    Given the ``(bits, ranges, ...)`` fields of a wildcard (most
+    significant field first), returns an iterator over the ``(min,
+    max)`` integer address ranges matched by the wildcard, in sorted
+    order.  Trailing fields which accept every value are folded into a
+    single range rather than enumerated.
+    """
+    split = len(fields) - 1
+    while split > 0 and fields[split][1] == [(0, (1 << fields[split][0]) - 1)]:
+        split -= 1
+    low_bits = 0
+    for field in fields[split+1:]:
+        low_bits += field[0]
+    low_mask = (1 << low_bits) - 1
+    def gen(i, prefix):
+        (bits, ranges) = fields[i][:2]
+        if i == split:
+            for (r_min, r_max) in ranges:
+                yield ((((prefix << bits) | r_min) << low_bits),
+                       (((prefix << bits) | r_max) << low_bits) | low_mask)
+        else:
+            for (r_min, r_max) in ranges:
+                for v in xrange(r_min, r_max + 1):
+                    for r in gen(i + 1, (prefix << bits) | v):
+                        yield r
+    return gen(0, 0)
+
 def _parse_ipv4_ranges(a):
     ipv4_part = _chunk_ipv4(a)
     octet_ranges = []
@@ -623,35 +1416,7 @@ def _parse_ipv4_ranges(a):
                     raise ValueError()
                 octet_range.append((r, r))
         octet_ranges.append(octet_range)
-    def check(x):
-        x = x.to_ipv4()
-        if x is None:
-            return False
-        for (octet, octet_range) in zip(x.octets(), octet_ranges):
-            matched = False
-            for (r_min, r_max) in octet_range:
-                if octet >= r_min and octet <= r_max:
-                    matched = True
-                    break
-            if matched == False:
-                return False
-        return True
-    def gen():
-        # inelegant, but all "elegant" solutions are worse
-        for (min0, max0) in octet_ranges[0]:
-          for o0 in xrange(min0, max0+1):
-            a0 = o0 << 8
-            for (min1, max1) in octet_ranges[1]:
-              for o1 in xrange(min1, max1+1):
-                a1= (a0 | o1) << 8
-                for (min2, max2) in octet_ranges[2]:
-                  for o2 in xrange(min2, max2+1):
-                    a2 = (a1 | o2) << 8
-                    for (min3, max3) in octet_ranges[3]:
-                      for o3 in xrange(min3, max3+1):
-                        a = a2 | o3
-                        yield IPv4Addr(a)
-    return check, gen, False
+    return _make_fields(octet_ranges, [8] * 4), None, False
 
 def _parse_ipv6_ranges(a):
     # already know addr is a string
@@ -708,76 +1473,12 @@ def _parse_ipv6_ranges(a):
                         raise ValueError()
                     octet_range.append((r, r))
             octet_ranges.append(octet_range)
-    def check(x):
-        x = x.to_ipv6()
-        x = int(x)
-        fields = tuple((x >> (16*(7-i))) & 0xFFFF for i in xrange(8))
-        octets = tuple((x >> (8*(3-i))) & 0xFF for i in xrange(4))
-        if ipv4_part:
-            num_fields = 6
-        else:
-            num_fields = 8
-        for (field, field_range) in zip(fields, field_ranges)[:num_fields]:
-            matched = False
-            for (r_min, r_max) in field_range:
-                if field >= r_min and field <= r_max:
-                    matched = True
-                    break
-            if matched == False:
-                return False
-        if ipv4_part:
-            for (octet, octet_range) in zip(octets, octet_ranges):
-                matched = False
-                for (r_min, r_max) in octet_range:
-                    if octet >= r_min and octet <= r_max:
-                        matched = True
-                        break
-                if matched == False:
-                    return False
-        return True
-    def gen():
-        # inelegant, but all "elegant" solutions are worse
-        for (min0, max0) in field_ranges[0]:
-         for p0 in xrange(min0, max0+1):
-          a0 = p0
-          for (min1, max1) in field_ranges[1]:
-           for p1 in xrange(min1, max1+1):
-            a1 = (a0 << 16) | p1
-            for (min2, max2) in field_ranges[2]:
-             for p2 in xrange(min2, max2+1):
-              a2 = (a1 << 16) | p2
-              for (min3, max3) in field_ranges[3]:
-               for p3 in xrange(min3, max3+1):
-                a3 = (a2 << 16) | p3
-                for (min4, max4) in field_ranges[4]:
-                 for p4 in xrange(min4, max4+1):
-                  a4 = (a3 << 16) | p4
-                  for (min5, max5) in field_ranges[5]:
-                   for p5 in xrange(min5, max5+1):
-                    a5 = (a4 << 16) | p5
-                    if ipv4_part:
-                     for (mino0, maxo0) in octet_ranges[0]:
-                      for po0 in xrange(mino0, maxo0+1):
-                       ao0 = (a5 << 8) | po0
-                       for (mino1, maxo1) in octet_ranges[1]:
-                        for po1 in xrange(mino1, maxo1+1):
-                         ao1 = (ao0 << 8) | po1
-                         for (mino2, maxo2) in octet_ranges[2]:
-                          for po2 in xrange(mino2, maxo2+1):
-                           ao2 = (ao1 << 8) | po2
-                           for (mino3, maxo3) in octet_ranges[3]:
-                            for po3 in xrange(mino3, maxo3+1):
-                             a = (ao2 << 8) | po3
-                             yield IPv6Addr(a)
-                    else:
-                     for (min6, max6) in field_ranges[6]:
-                      for p6 in xrange(min6, max6+1):
-                       a6 = (a5 << 16) | p6
-                       for (min7, max7) in field_ranges[7]:
-                        for p7 in xrange(min7, max7+1):
-                         a = (a6 << 16) | p7
-                         yield IPv6Addr(a)
-    return check, gen, True
+    if ipv4_part:
+        fields = _make_fields(field_ranges[:6] + octet_ranges,
+                              [16] * 6 + [8] * 4)
+    else:
+        fields = _make_fields(field_ranges, [16] * 8)
+    return fields, None, True
 
 def _parse_wildcard(addr):
     a = addr
@@ -798,30 +1499,20 @@ def _parse_wildcard(addr):
                 a = a.mask_prefix(cidr_len)
                 ai = int(a)
                 if a.is_ipv6():
-                    def check(x):
-                        x = x.to_ipv6()
-                        return a == x.mask_prefix(cidr_len)
-                    def gen():
-                        for i in xrange(ai, (ai | (IPv6_MAX >> cidr_len)) + 1):
-                            yield IPv6Addr(i)
-                    return check, gen, True
+                    fields = _block_fields(
+                        ai, ai | (IPv6_MAX >> cidr_len), [16] * 8)
+                    return fields, None, True
                 else:
-                    def check(x):
-                        x = x.to_ipv4()
-                        if x is None:
-                            return False
-                        return a == x.mask_prefix(cidr_len)
-                    def gen():
-                        for i in xrange(ai, (ai | (IPv4_MAX >> cidr_len)) + 1):
-                            yield IPv4Addr(i)
-                    return check, gen, False
+                    fields = _block_fields(
+                        ai, ai | (IPv4_MAX >> cidr_len), [8] * 4)
+                    return fields, None, False
             else:
                 a = IPAddr(a)
-                def check(x):
-                    return a == x
-                def gen():
-                    yield a
-                return check, gen, a.is_ipv6()
+                ai = int(a)
+                if a.is_ipv6():
+                    return _block_fields(ai, ai, [16] * 8), None, True
+                else:
+                    return _block_fields(ai, ai, [8] * 4), None, False
         # ',' or '-', or 'x'  mean it has ranges
         else:
             if ':' in a:
@@ -843,39 +1534,73 @@ def _parse_wildcard(addr):
                     else:
                         a_range = int(IPv4Addr(a_range))
                         ranges.append((a_range, a_range))
-                def check(x):
-                    if x.is_ipv6():
-                        return False
-                    for (a_min, a_max) in ranges:
-                        ix = int(x)
-                        if ix >= a_min and ix <= a_max:
-                            return True
-                    return False
-                def gen():
-                    for (a_min, a_max) in ranges:
-                        for a in xrange(a_min, a_max + 1):
-                            yield IPv4Addr(a)
-                return check, gen, False
+                return None, _coalesce_ranges(sorted(ranges)), False
     except ValueError:
         value_error = ValueError("IPWildcard is not valid: %r" % addr)
         raise value_error
 
 class IPWildcard(object):
-    __slots__ = ['_check', '_gen', '_str', '_is_ipv6']
+    # A wildcard is held either as _fields, a list (most significant
+    # first) of (bits, ranges, mask) triples giving the width of each
+    # field of the address, the field's accepted values as sorted
+    # (min, max) ranges, and the same values as a bitmap (None if every
+    # value is accepted); or, for wildcards written as lists of
+    # integers and integer ranges, as _flat, a sorted list of (min,
+    # max) address ranges.
+    __slots__ = ['_fields', '_flat', '_str', '_is_ipv6']
     def __init__(self, wildcard):
         if isinstance(wildcard, IPWildcard):
-            self._check = wildcard._check
-            self._gen = wildcard._gen
+            self._fields = wildcard._fields
+            self._flat = wildcard._flat
             self._str = wildcard._str
             self._is_ipv6 = wildcard._is_ipv6
         else:
             self._str = wildcard
-            self._check, self._gen, self._is_ipv6 = _parse_wildcard(wildcard)
+            (fields, self._flat, self._is_ipv6) = _parse_wildcard(wildcard)
+            if fields is None:
+                self._fields = None
+            else:
+                self._fields = [(bits, ranges, _field_mask(bits, ranges))
+                                for (bits, ranges) in fields]
+    def _ranges(self):
+        if self._fields is None:
+            return iter(self._flat)
+        return _wildcard_ranges(self._fields)
+    def range_iter(self):
+        if self._is_ipv6:
+            make_ip = IPv6Addr
+        else:
+            make_ip = IPv4Addr
+        for (r_min, r_max) in self._ranges():
+            yield (make_ip(r_min), make_ip(r_max))
     def __iter__(self):
-        return self._gen()
+        if self._is_ipv6:
+            make_ip = IPv6Addr
+        else:
+            make_ip = IPv4Addr
+        for (r_min, r_max) in self._ranges():
+            a = r_min
+            while a <= r_max:
+                yield make_ip(a)
+                a += 1
     def __contains__(self, addr):
         addr = IPAddr(addr)
-        return self._check(addr)
+        if self._fields is None:
+            if addr.is_ipv6():
+                return False
+            a = addr._addr
+            i = bisect.bisect_right(self._flat, (a, IPv4_MAX))
+            return i > 0 and a <= self._flat[i-1][1]
+        a = _ip_int(addr)
+        if not self._is_ipv6:
+            if a < _IPv4_MAPPED_MIN or a > _IPv4_MAPPED_MAX:
+                return False
+            a &= IPv4_MAX
+        for (bits, ranges, mask) in reversed(self._fields):
+            if mask is not None and not (mask >> (a & ((1 << bits) - 1))) & 1:
+                return False
+            a >>= bits
+        return True
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__, self._str)
     def __str__(self):
@@ -913,68 +1638,62 @@ def _parse_tcpflags(value):
         computed_value |= _flag_values[c]
     return computed_value
 
-class TCPFlags(object):
-    __slots__ = '_value'
-    def __init__(self, value):
-        if isinstance(value, basestring):
-            self._value = _parse_tcpflags(value)
-        elif isinstance(value, (int, long)):
-            if value < 0 or value > 0xFF:
-                value_error = ValueError(
-                    "Illegal TCP flag value: %r" % value)
-                raise value_error
-            self._value = value
-        elif isinstance(value, TCPFlags):
-            self._value = value._value
-        else:
-            type_error = TypeError(
-                "TCP flag value must be string, int, or TCPFlags: %r" % value)
-            raise type_error
-    def _stringify(self, padding):
-        result = ""
-        if self._value & _BITS_FIN:
-            result += 'F'
-        else:
-            result += padding
-        if self._value & _BITS_SYN:
-            result += 'S'
-        else:
-            result += padding
-        if self._value & _BITS_RST:
-            result += 'R'
-        else:
-            result += padding
-        if self._value & _BITS_PSH:
-            result += 'P'
-        else:
-            result += padding
-        if self._value & _BITS_ACK:
-            result += 'A'
-        else:
-            result += padding
-        if self._value & _BITS_URG:
-            result += 'U'
-        else:
-            result += padding
-        if self._value & _BITS_ECE:
-            result += 'E'
-        else:
-            result += padding
-        if self._value & _BITS_CWR:
-            result += 'C'
+def _tcpflags_value(value):
+    if isinstance(value, basestring):
+        return _parse_tcpflags(value)
+    elif isinstance(value, (int, long)):
+        if value < 0 or value > 0xFF:
+            value_error = ValueError(
+                "Illegal TCP flag value: %r" % value)
+            raise value_error
+        return value
+    elif isinstance(value, TCPFlags):
+        return value._value
+    else:
+        type_error = TypeError(
+            "TCP flag value must be string, int, or TCPFlags: %r" % value)
+        raise type_error
+
+def _tcpflags_string(value, padding):
+    result = ""
+    for (bit, c) in ((_BITS_FIN, 'F'), (_BITS_SYN, 'S'), (_BITS_RST, 'R'),
+                     (_BITS_PSH, 'P'), (_BITS_ACK, 'A'), (_BITS_URG, 'U'),
+                     (_BITS_ECE, 'E'), (_BITS_CWR, 'C')):
+        if value & bit:
+            result += c
         else:
             result += padding
-        return result
+    return result
+
+# String forms of every flag value, indexed by value
+_tcpflags_str = [_tcpflags_string(v, '') for v in xrange(256)]
+_tcpflags_padded = [_tcpflags_string(v, ' ') for v in xrange(256)]
+
+class TCPFlags(object):
+    # Plain TCPFlags objects are immutable, so the 256 possible values
+    # are interned in _tcpflags_instances and shared.
+    __slots__ = '_value'
+    def __new__(cls, value):
+        value = _tcpflags_value(value)
+        if cls is TCPFlags and _tcpflags_instances:
+            return _tcpflags_instances[value]
+        self = object.__new__(cls)
+        self._value = value
+        return self
+    def __getnewargs__(self):
+        return (self._value,)
     def __str__(self):
-        return self._stringify('')
+        return _tcpflags_str[self._value]
     def padded(self):
-        return self._stringify(' ')
+        return _tcpflags_padded[self._value]
     def __repr__(self):
-        return "TCPFlags(%r)" % self.padded()
+        return "TCPFlags(%r)" % _tcpflags_padded[self._value]
     def __cmp__(self, other):
         if not isinstance(other, TCPFlags):
             return NotImplemented
         return cmp(self._value, other._value)
+    def __hash__(self):
+        return hash(self._value)
     @property
     def fin(self):
         return bool(self._value & 0x01)
@@ -1018,9 +1737,31 @@ class TCPFlags(object):
     def __nonzero__(self):
         return bool(self._value)
     def matches(self, flagmask):
+        if not isinstance(flagmask, TCPFlagMask):
+            flagmask = _compile_flagmask(flagmask, "TCPFlags.matches")
+        return flagmask._matches[self._value]
+
+_tcpflags_instances = []
+_tcpflags_instances[:] = [TCPFlags(v) for v in xrange(256)]
+
+class TCPFlagMask(object):
+    """
+    A flag/mask specification as accepted by :meth:`TCPFlags.matches`,
+    parsed once and reused.  Holds, for each of the 256 flag values,
+    whether that value matches.
+    """
+    __slots__ = ['_str', '_flags', '_mask', '_matches', '_table']
+    def __init__(self, flagmask):
+        if isinstance(flagmask, TCPFlagMask):
+            (self._str, self._flags, self._mask, self._matches,
+             self._table) = (flagmask._str, flagmask._flags, flagmask._mask,
+                             flagmask._matches, flagmask._table)
+        else:
+            self._compile(flagmask, "TCPFlagMask")
+    def _compile(self, flagmask, caller):
         if not isinstance(flagmask, basestring):
             type_error = TypeError(
-                "flag mask not a string in TCPFlags.matches: %r" % flagmask)
+                "flag mask not a string in %s: %r" % (caller, flagmask))
             raise type_error
         parts = flagmask.split('/', 3)
         if len(parts) == 1:
@@ -1031,9 +1772,67 @@ class TCPFlags(object):
             mask_bits = _parse_tcpflags(parts[1])
         else:
             value_error = ValueError(
-                "invalid flag mask in TCPFlags.matches: %r" % flagmask)
+                "invalid flag mask in %s: %r" % (caller, flagmask))
             raise value_error
-        return ((self._value & mask_bits) == flag_bits)
+        self._str = flagmask
+        self._flags = flag_bits
+        self._mask = mask_bits
+        self._matches = [(v & mask_bits) == flag_bits for v in xrange(256)]
+        self._table = ''.join(chr(m) for m in self._matches)
+    def __repr__(self):
+        return "TCPFlagMask(%r)" % self._str
+    def __str__(self):
+        return self._str
+    def matches(self, flags):
+        """
+        Returns ``True`` if *flags* (a :class:`TCPFlags` or anything
+        accepted by its constructor) matches this mask.
+        """
+        if isinstance(flags, (int, long)) and 0 <= flags <= 0xFF:
+            return self._matches[flags]
+        return self._matches[_tcpflags_value(flags)]
+
+# Compiled masks for the flag/mask strings most recently used
+_flagmask_cache = {}
+_FLAGMASK_CACHE_SIZE = 256
+
+def _compile_flagmask(flagmask, caller):
+    try:
+        return _flagmask_cache[flagmask]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable value, rejected by _compile
+        pass
+    compiled = TCPFlagMask.__new__(TCPFlagMask)
+    compiled._compile(flagmask, caller)
+    if len(_flagmask_cache) >= _FLAGMASK_CACHE_SIZE:
+        _flagmask_cache.clear()
+    _flagmask_cache[flagmask] = compiled
+    return compiled
+
+def matches_many(values, flagmask):
+    """
+    Returns an ``array('B')`` holding 1 for each flag value in *values*
+    that matches *flagmask* (a string or :class:`TCPFlagMask`) and 0
+    for each that does not.  *values* may be a byte string or
+    ``bytearray`` of flag bytes, or an iterable of integers or
+    :class:`TCPFlags` objects.
+    """
+    if not isinstance(flagmask, TCPFlagMask):
+        flagmask = _compile_flagmask(flagmask, "matches_many")
+    if isinstance(values, bytearray):
+        values = str(values)
+    if isinstance(values, str):
+        return array.array('B', values.translate(flagmask._table))
+    table = flagmask._matches
+    result = array.array('B')
+    append = result.append
+    for v in values:
+        if not isinstance(v, (int, long)) or v < 0 or v > 0xFF:
+            v = _tcpflags_value(v)
+        append(table[v])
+    return result
 
 TCP_FIN = TCPFlags('F')
 TCP_SYN = TCPFlags('S')
@@ -1060,6 +1859,9 @@ __all__ = """
 
     TCP_FIN TCP_SYN TCP_RST TCP_PSH TCP_ACK TCP_URG TCP_ECE TCP_CWR
 
+    parse_many
+    TCPFlagMask matches_many
+
     __version__
     __impl_version__
 """.split()
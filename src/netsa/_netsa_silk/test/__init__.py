@@ -49,4 +49,5 @@
 from netsa._netsa_silk.test.ipaddr import *
 from netsa._netsa_silk.test.ipset import *
 from netsa._netsa_silk.test.ipwildcard import *
+from netsa._netsa_silk.test.prefixmap import *
 from netsa._netsa_silk.test.tcpflags import *
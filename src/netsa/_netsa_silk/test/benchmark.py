@@ -0,0 +1,222 @@
+# Copyright 2008-2013 by Carnegie Mellon University
+
+# @OPENSOURCE_HEADER_START@
+# Use of the Network Situational Awareness Python support library and
+# related source code is subject to the terms of the following licenses:
+# 
+# GNU Public License (GPL) Rights pursuant to Version 2, June 1991
+# Government Purpose License Rights (GPLR) pursuant to DFARS 252.227.7013
+# 
+# NO WARRANTY
+# 
+# ANY INFORMATION, MATERIALS, SERVICES, INTELLECTUAL PROPERTY OR OTHER 
+# PROPERTY OR RIGHTS GRANTED OR PROVIDED BY CARNEGIE MELLON UNIVERSITY 
+# PURSUANT TO THIS LICENSE (HEREINAFTER THE "DELIVERABLES") ARE ON AN 
+# "AS-IS" BASIS. CARNEGIE MELLON UNIVERSITY MAKES NO WARRANTIES OF ANY 
+# KIND, EITHER EXPRESS OR IMPLIED AS TO ANY MATTER INCLUDING, BUT NOT 
+# LIMITED TO, WARRANTY OF FITNESS FOR A PARTICULAR PURPOSE, 
+# MERCHANTABILITY, INFORMATIONAL CONTENT, NONINFRINGEMENT, OR ERROR-FREE 
+# OPERATION. CARNEGIE MELLON UNIVERSITY SHALL NOT BE LIABLE FOR INDIRECT, 
+# SPECIAL OR CONSEQUENTIAL DAMAGES, SUCH AS LOSS OF PROFITS OR INABILITY 
+# TO USE SAID INTELLECTUAL PROPERTY, UNDER THIS LICENSE, REGARDLESS OF 
+# WHETHER SUCH PARTY WAS AWARE OF THE POSSIBILITY OF SUCH DAMAGES. 
+# LICENSEE AGREES THAT IT WILL NOT MAKE ANY WARRANTY ON BEHALF OF 
+# CARNEGIE MELLON UNIVERSITY, EXPRESS OR IMPLIED, TO ANY PERSON 
+# CONCERNING THE APPLICATION OF OR THE RESULTS TO BE OBTAINED WITH THE 
+# DELIVERABLES UNDER THIS LICENSE.
+# 
+# Licensee hereby agrees to defend, indemnify, and hold harmless Carnegie 
+# Mellon University, its trustees, officers, employees, and agents from 
+# all claims or demands made against them (and any related losses, 
+# expenses, or attorney's fees) arising out of, or relating to Licensee's 
+# and/or its sub licensees' negligent use or willful misuse of or 
+# negligent conduct or willful misconduct regarding the Software, 
+# facilities, or other rights or assistance granted by Carnegie Mellon 
+# University under this License, including, but not limited to, any 
+# claims of product liability, personal injury, death, damage to 
+# property, or violation of any laws or regulations.
+# 
+# Carnegie Mellon University Software Engineering Institute authored 
+# documents are sponsored by the U.S. Department of Defense under 
+# Contract FA8721-05-C-0003. Carnegie Mellon University retains 
+# copyrights in all material produced under this contract. The U.S. 
+# Government retains a non-exclusive, royalty-free license to publish or 
+# reproduce these documents, or allow others to do so, for U.S. 
+# Government purposes only pursuant to the copyright license under the 
+# contract clause at 252.227.7013.
+# @OPENSOURCE_HEADER_END@
+
+"""
+Timing benchmarks for the pure Python netsa_silk implementation.
+
+These are not run as part of the unit tests.  Run them directly with:
+
+    python -m netsa._netsa_silk.test.benchmark [size ...]
+
+Each size is the approximate number of addresses in the sets used.
+The original quadratic range iterator is only timed for sets of up
+to :data:`BASELINE_MAX` addresses.
+"""
+
+import random
+import sys
+import time
+
+from netsa._netsa_silk import IPv4Addr, IPv6Addr, ip_set, parse_many
+from netsa._netsa_silk.python_impl import (
+    IPv4_MAX, _IPv4_MAPPED_MIN, _coalesce_ranges)
+
+DEFAULT_SIZES = [10**5, 10**6, 10**7]
+
+# Largest set for which the original range iterator is timed
+BASELINE_MAX = 10**5
+
+# Number of operations timed by each throughput benchmark
+PROBES = 10**5
+
+def make_ipv4_set(size, seed=0):
+    """
+    Returns an ip_set of roughly *size* IPv4 addresses, made of runs
+    of between 1 and 16 consecutive addresses at random locations.
+    """
+    rand = random.Random(seed)
+    ranges = []
+    count = 0
+    while count < size:
+        start = rand.randint(0, 0xFFFFFFF0)
+        length = rand.randint(1, 16)
+        ranges.append((_IPv4_MAPPED_MIN | start,
+                       _IPv4_MAPPED_MIN | (start + length - 1)))
+        count += length
+    # Build the ranges directly, since adding tens of millions of
+    # addresses one at a time would dominate the benchmark.
+    s = ip_set()
+    s._set_ranges(_coalesce_ranges(sorted(ranges)))
+    return s
+
+def sorted_range_iter(s):
+    """
+    The original sort-and-pop(0) implementation of
+    ``ip_set._range_iter``, for comparison.
+    """
+    sorted_ips = sorted(s)
+    while sorted_ips:
+        range_min = sorted_ips.pop(0)._addr
+        range_max = range_min
+        while sorted_ips and sorted_ips[0]._addr == range_max + 1:
+            range_max = sorted_ips.pop(0)._addr
+        if s._contains_ipv6:
+            yield (IPv6Addr(range_min), IPv6Addr(range_max))
+        else:
+            yield (IPv4Addr(range_min & IPv4_MAX),
+                   IPv4Addr(range_max & IPv4_MAX))
+
+def sorted_cidr_iter(s):
+    """
+    The original implementation of ``ip_set.cidr_iter``, built on
+    :func:`sorted_range_iter`, for comparison.
+    """
+    for (range_min, range_max) in sorted_range_iter(s):
+        range_min = range_min._addr
+        range_max = range_max._addr
+        if s._contains_ipv6:
+            bit, bits = 1, 128
+            make_ip = IPv6Addr
+        else:
+            bit, bits = 1, 32
+            range_min &= IPv4_MAX
+            range_max &= IPv4_MAX
+            make_ip = IPv4Addr
+        while bits:
+            if range_min + bit > range_max:
+                break
+            elif range_min & bit:
+                yield make_ip(range_min & ~(bit - 1)), bits
+                range_min += bit
+            bit <<= 1
+            bits -= 1
+        prefix = range_max & ~(bit - 1)
+        while bit:
+            if prefix + bit - 1 <= range_max:
+                yield make_ip(prefix), bits
+                prefix += bit
+                if prefix > range_max:
+                    break
+            bit >>= 1
+            bits += 1
+
+def time_call(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+def consume(iterator):
+    for x in iterator:
+        pass
+
+def bench_cidr_iter(sizes):
+    print "%-12s %-10s %-10s %-12s %-10s %-12s" % (
+        "addresses", "ranges", "old ranges", "_range_iter",
+        "old cidr", "cidr_iter")
+    for size in sizes:
+        s = ip_set_for_size(size)
+        if size <= BASELINE_MAX:
+            old = ["%-10.3f" % time_call(consume, sorted_range_iter(s)),
+                   "%-10.3f" % time_call(consume, sorted_cidr_iter(s))]
+        else:
+            old = ["%-10s" % "-"] * 2
+        print "%-12d %-10d %s %-12.3f %s %-12.3f" % (
+            s.cardinality(), len(s._starts),
+            old[0], time_call(consume, s._range_iter()),
+            old[1], time_call(consume, s.cidr_iter()))
+    print "(seconds)"
+
+def add_each(s, addrs):
+    for a in addrs:
+        s.add(a)
+
+def contains_each(s, addrs):
+    for a in addrs:
+        a in s
+
+def iterate_first(s, count):
+    for (i, a) in enumerate(s):
+        if i >= count:
+            break
+
+def bench_throughput(sizes):
+    rand = random.Random(1)
+    ints = [rand.randint(0, 0xFFFFFFFF) for i in xrange(PROBES)]
+    addrs = [IPv4Addr(a) for a in ints]
+    strings = [str(a) for a in addrs]
+    print "%-12s" % "addresses" + "".join(
+        " %-10s" % x for x in
+        ["add", "add str", "in", "in str", "in many", "iter"])
+    for size in sizes:
+        s = ip_set_for_size(size)
+        rates = [PROBES / time_call(add_each, s.copy(), addrs),
+                 PROBES / time_call(add_each, s.copy(), strings),
+                 PROBES / time_call(contains_each, s, addrs),
+                 PROBES / time_call(contains_each, s, strings),
+                 PROBES / time_call(lambda: s.contains_many(
+                     parse_many(strings)[0])),
+                 PROBES / time_call(iterate_first, s, PROBES)]
+        print "%-12d" % s.cardinality() + "".join(
+            " %-10d" % r for r in rates)
+    print "(operations per second)"
+
+_set_cache = {}
+
+def ip_set_for_size(size):
+    if size not in _set_cache:
+        _set_cache[size] = make_ipv4_set(size)
+    return _set_cache[size]
+
+def main(argv):
+    sizes = [int(x) for x in argv] or DEFAULT_SIZES
+    bench_cidr_iter(sizes)
+    print
+    bench_throughput(sizes)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
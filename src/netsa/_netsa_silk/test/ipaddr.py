@@ -1328,3 +1328,27 @@ class IPAddrTest(unittest.TestCase):
             self.assertEqual(c, a.mask_prefix(112))
             self.assertEqual(c, c.mask(b))
             self.assertEqual(c, c.mask_prefix(112))
+
+    def test_parse_many_1(self):
+        (values, errors) = netsa._netsa_silk.parse_many(
+            ["1.2.3.4", " 10.0.0.1 ", "16909060", "256.1.1.1",
+             "::1", "bogus"])
+        self.assertEqual(list(values),
+                         [0x01020304, 0x0A000001, 0x01020304, 0, 0, 0])
+        self.assertEqual(list(errors), [0, 0, 0, 1, 1, 1])
+
+    def test_parse_many_2(self):
+        strings = ["1.2.3.4", "::1", "2001:db8::1428:57ab",
+                   "::ffff:1.2.3.4", "1.2.3", "1:2:3"]
+        (values, errors) = netsa._netsa_silk.parse_many(strings, ipv6=True)
+        self.assertEqual(list(errors), [0, 0, 0, 0, 1, 1])
+        self.assertEqual(len(values), 6)
+        self.assertEqual(values[1], 1)
+        self.assertEqual(values[-1], 0)
+        self.assertEqual(list(values),
+                         [0xFFFF01020304, 1,
+                          0x20010db80000000000000000142857ab,
+                          0xFFFF01020304, 0, 0])
+        for (s, v, e) in zip(strings, values, errors):
+            if not e:
+                self.assertEqual(IPv6Addr(v), IPAddr(s))
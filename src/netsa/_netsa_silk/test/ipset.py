@@ -47,8 +47,13 @@
 # @OPENSOURCE_HEADER_END@
 
 import operator
+import os
+import shutil
+import struct
+import tempfile
 import unittest
 import sys
+import zlib
 
 def op_iand(x, y): x &= y; return x
 def op_ior(x, y): x |= y; return x
@@ -65,6 +70,12 @@ IPSet = ip_set
 
 class IPSetTest(unittest.TestCase):
 
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
     def test_cons_1(self):
         self.assertEqual(ip_set(), ip_set())
 
@@ -116,6 +127,24 @@ class IPSetTest(unittest.TestCase):
     def test_in_4(self):
         self.assertRaises(TypeError, operator.contains, ip_set(['1.2.3.4']), 1)
 
+    def test_in_5(self):
+        s = ip_set(['1.2.3.0/24', '2001:db8::1'])
+        self.assertTrue(' 1.2.3.4 ' in s)
+        self.assertTrue('16909060' in s)
+        self.assertTrue('::ffff:1.2.3.4' in s)
+        self.assertTrue('2001:db8::1' in s)
+        self.assertFalse('2001:db8::2' in s)
+        self.assertRaises(TypeError, operator.contains, s, '1.2.3.x')
+
+    def test_contains_many_1(self):
+        s = ip_set(['1.2.3.0/24', '2001:db8::1'])
+        self.assertEqual(list(s.contains_many([0x01020304, 0x01020404])),
+                         [1, 0])
+        self.assertEqual(list(s.contains_many(
+                    [int(IPAddr('2001:db8::1')), int(IPAddr('::1'))],
+                    ipv6=True)),
+                         [1, 0])
+
     def test_eq_1(self):
         self.assertTrue(ip_set(['1.2.3.4', '5.6.7.8']) ==
                         ip_set(['5.6.7.8', '1.2.3.4']))
@@ -735,6 +764,118 @@ class IPSetTest(unittest.TestCase):
                                   (IPAddr('1.2.4.0'), 25),
                                   (IPAddr('1.2.4.128'), 32)]))
 
+    def test_cidr_iter_3(self):
+        s = ip_set([IPWildcard('10.0.0.0/8')])
+        self.assertEqual(list(s.cidr_iter()), [(IPAddr('10.0.0.0'), 8)])
+
+    def test_cidr_iter_4(self):
+        s = ip_set([IPWildcard('10.0.0.0/8')])
+        s.discard('10.0.0.0')
+        s.discard('10.255.255.255')
+        self.assertEqual(len(list(s.cidr_iter())), 46)
+
+    def test_range_1(self):
+        s = ip_set([IPWildcard('10.0.0.0/8'), IPWildcard('2001:db8::/32')])
+        self.assertEqual(s.cardinality(), 2**24 + 2**96)
+        self.assertTrue('10.1.2.3' in s)
+        self.assertTrue('2001:db8:1::1' in s)
+        self.assertFalse('11.0.0.0' in s)
+        self.assertFalse('2001:db9::' in s)
+
+    def test_range_2(self):
+        s = ip_set([IPWildcard('10.0.0.0/8')])
+        s.intersection_update([IPWildcard('10.1-2.x.x'), '12.0.0.1'])
+        self.assertEqual(s.cardinality(), 2 * 2**16)
+        s.difference_update([IPWildcard('10.1.128.0/17')])
+        self.assertEqual(s.cardinality(), 2**16 + 2**15)
+        self.assertFalse('10.1.200.1' in s)
+        self.assertTrue('10.2.200.1' in s)
+
+    def test_range_3(self):
+        s = ip_set(['1.2.3.4', '1.2.3.6'])
+        s.add('1.2.3.5')
+        self.assertEqual(list(s.cidr_iter()),
+                         [(IPAddr('1.2.3.4'), 31), (IPAddr('1.2.3.6'), 32)])
+        s.remove('1.2.3.5')
+        self.assertEqual(list(s), [IPAddr('1.2.3.4'), IPAddr('1.2.3.6')])
+
+    def test_save_load_1(self):
+        s = ip_set([IPWildcard('10.0.0.0/8'), '1.2.3.4', '1.2.3.6'])
+        path = os.path.join(self.tmpdir, 'ipv4.set')
+        s.save(path)
+        s2 = ip_set.load(path)
+        self.assertEqual(s2, s)
+        self.assertEqual(s2.cardinality(), 2**24 + 2)
+        self.assertTrue('10.20.30.40' in s2)
+        self.assertFalse('1.2.3.5' in s2)
+        self.assertEqual(list(s2.cidr_iter()), list(s.cidr_iter()))
+
+    def test_save_load_2(self):
+        s = ip_set([IPWildcard('2001:db8::/32'), '1.2.3.4'])
+        path = os.path.join(self.tmpdir, 'ipv6.set')
+        s.save(path)
+        s2 = ip_set.load(path)
+        self.assertEqual(s2, s)
+        self.assertTrue('2001:db8::1' in s2)
+        self.assertTrue('::ffff:1.2.3.4' in s2)
+        last = IPAddr('2001:db8:ffff:ffff:ffff:ffff:ffff:ffff')
+        self.assertEqual(s2.pop(), last)
+        self.assertFalse(last in s2)
+        self.assertTrue(last in ip_set.load(path))
+
+    def test_save_load_3(self):
+        path = os.path.join(self.tmpdir, 'empty.set')
+        ip_set().save(path)
+        self.assertEqual(ip_set.load(path), ip_set())
+
+    def test_save_load_4(self):
+        path = os.path.join(self.tmpdir, 'bad.set')
+        f = open(path, 'wb')
+        f.write('1.2.3.4\n')
+        f.close()
+        self.assertRaises(ValueError, ip_set.load, path)
+
+    def test_silk_ipset_1(self):
+        s = ip_set([IPWildcard('10.0.0.0/8'), '1.2.3.4', '1.2.3.6-7'])
+        path = os.path.join(self.tmpdir, 'ipv4.set')
+        for version in (2, 4):
+            s.save_silk(path, version)
+            self.assertEqual(ip_set.load_silk(path), s)
+
+    def test_silk_ipset_2(self):
+        s = ip_set([IPWildcard('2001:db8::/32'), '1.2.3.4'])
+        path = os.path.join(self.tmpdir, 'ipv6.set')
+        s.save_silk(path)
+        s2 = ip_set.load_silk(path)
+        self.assertEqual(s2, s)
+        self.assertTrue(s2.pop().is_ipv6())
+        self.assertRaises(ValueError, s.save_silk, path, 2)
+        self.assertRaises(ValueError, s.save_silk, path, 3)
+
+    def test_silk_ipset_3(self):
+        # Little-endian, zlib compressed, version 4, with a bitmap block
+        data = (struct.pack('<L', 0x01020300) + '\x81' +
+                struct.pack('<8L', 0x30, 0, 0, 0, 0, 0, 0, 0x80000000) +
+                struct.pack('<L', 0x0A000000) + chr(8))
+        compressed = zlib.compress(data)
+        path = os.path.join(self.tmpdir, 'le.set')
+        f = open(path, 'wb')
+        f.write(struct.pack('>4sBBBBLHH', '\xDE\xAD\xBE\xEF',
+                            0, 0x1D, 16, 1, 3007000, 1, 4))
+        f.write(struct.pack('>LL6L', 7, 32, 0, 0, 4, 0, 0, 0))
+        f.write(struct.pack('>LL', 0, 8))
+        f.write(struct.pack('>LL', len(compressed), len(data)))
+        f.write(compressed)
+        f.close()
+        self.assertEqual(ip_set.load_silk(path),
+                         ip_set(['1.2.3.4', '1.2.3.5', '1.2.3.255',
+                                 IPWildcard('10.0.0.0/8')]))
+
+    def test_silk_ipset_4(self):
+        path = os.path.join(self.tmpdir, 'bad.set')
+        ip_set(['1.2.3.4']).save(path)
+        self.assertRaises(ValueError, ip_set.load_silk, path)
+
     def test_iter_1(self):
         s = ip_set(['1.2.3.4', '5.6.7.8', '9.10.11.12'])
         self.assertEqual(sorted(list(s)),
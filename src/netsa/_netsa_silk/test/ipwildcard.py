@@ -104,6 +104,34 @@ class IPWildcardTest(unittest.TestCase):
         self.assertEqual([IPAddr(x) for x in ['2000::1', '2000::2', '2000::3']],
                          list(IPWildcard('2000::1-3')))
 
+    def test_iter_3(self):
+        self.assertEqual([IPAddr(x) for x in ['1.2.3.1', '1.2.3.2', '1.2.3.5']],
+                         list(IPWildcard('1.2.3.5,1-2,1')))
+
+    def test_iter_4(self):
+        i = iter(IPWildcard('2001:db8::/64'))
+        self.assertEqual(i.next(), IPAddr('2001:db8::'))
+        self.assertEqual(i.next(), IPAddr('2001:db8::1'))
+
+    def test_range_iter_1(self):
+        self.assertEqual(list(IPWildcard('10.x.x.x').range_iter()),
+                         [(IPAddr('10.0.0.0'), IPAddr('10.255.255.255'))])
+
+    def test_range_iter_2(self):
+        self.assertEqual(list(IPWildcard('1.2.3-4.0-127').range_iter()),
+                         [(IPAddr('1.2.3.0'), IPAddr('1.2.3.127')),
+                          (IPAddr('1.2.4.0'), IPAddr('1.2.4.127'))])
+
+    def test_range_iter_3(self):
+        self.assertEqual(list(IPWildcard('2001:db8::/64').range_iter()),
+                         [(IPAddr('2001:db8::'),
+                           IPAddr('2001:db8::ffff:ffff:ffff:ffff'))])
+
+    def test_range_iter_4(self):
+        self.assertEqual(list(IPWildcard('16909060-16909062,5').range_iter()),
+                         [(IPAddr('0.0.0.5'), IPAddr('0.0.0.5')),
+                          (IPAddr('1.2.3.4'), IPAddr('1.2.3.6'))])
+
     def test_in_1(self):
         self.assertTrue('1.2.3.4' in IPWildcard('1.2.3.x'))
 
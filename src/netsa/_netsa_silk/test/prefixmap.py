@@ -0,0 +1,143 @@
+# Copyright 2008-2013 by Carnegie Mellon University
+
+# @OPENSOURCE_HEADER_START@
+# Use of the Network Situational Awareness Python support library and
+# related source code is subject to the terms of the following licenses:
+# 
+# GNU Public License (GPL) Rights pursuant to Version 2, June 1991
+# Government Purpose License Rights (GPLR) pursuant to DFARS 252.227.7013
+# 
+# NO WARRANTY
+# 
+# ANY INFORMATION, MATERIALS, SERVICES, INTELLECTUAL PROPERTY OR OTHER 
+# PROPERTY OR RIGHTS GRANTED OR PROVIDED BY CARNEGIE MELLON UNIVERSITY 
+# PURSUANT TO THIS LICENSE (HEREINAFTER THE "DELIVERABLES") ARE ON AN 
+# "AS-IS" BASIS. CARNEGIE MELLON UNIVERSITY MAKES NO WARRANTIES OF ANY 
+# KIND, EITHER EXPRESS OR IMPLIED AS TO ANY MATTER INCLUDING, BUT NOT 
+# LIMITED TO, WARRANTY OF FITNESS FOR A PARTICULAR PURPOSE, 
+# MERCHANTABILITY, INFORMATIONAL CONTENT, NONINFRINGEMENT, OR ERROR-FREE 
+# OPERATION. CARNEGIE MELLON UNIVERSITY SHALL NOT BE LIABLE FOR INDIRECT, 
+# SPECIAL OR CONSEQUENTIAL DAMAGES, SUCH AS LOSS OF PROFITS OR INABILITY 
+# TO USE SAID INTELLECTUAL PROPERTY, UNDER THIS LICENSE, REGARDLESS OF 
+# WHETHER SUCH PARTY WAS AWARE OF THE POSSIBILITY OF SUCH DAMAGES. 
+# LICENSEE AGREES THAT IT WILL NOT MAKE ANY WARRANTY ON BEHALF OF 
+# CARNEGIE MELLON UNIVERSITY, EXPRESS OR IMPLIED, TO ANY PERSON 
+# CONCERNING THE APPLICATION OF OR THE RESULTS TO BE OBTAINED WITH THE 
+# DELIVERABLES UNDER THIS LICENSE.
+# 
+# Licensee hereby agrees to defend, indemnify, and hold harmless Carnegie 
+# Mellon University, its trustees, officers, employees, and agents from 
+# all claims or demands made against them (and any related losses, 
+# expenses, or attorney's fees) arising out of, or relating to Licensee's 
+# and/or its sub licensees' negligent use or willful misuse of or 
+# negligent conduct or willful misconduct regarding the Software, 
+# facilities, or other rights or assistance granted by Carnegie Mellon 
+# University under this License, including, but not limited to, any 
+# claims of product liability, personal injury, death, damage to 
+# property, or violation of any laws or regulations.
+# 
+# Carnegie Mellon University Software Engineering Institute authored 
+# documents are sponsored by the U.S. Department of Defense under 
+# Contract FA8721-05-C-0003. Carnegie Mellon University retains 
+# copyrights in all material produced under this contract. The U.S. 
+# Government retains a non-exclusive, royalty-free license to publish or 
+# reproduce these documents, or allow others to do so, for U.S. 
+# Government purposes only pursuant to the copyright license under the 
+# contract clause at 252.227.7013.
+# @OPENSOURCE_HEADER_END@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from netsa._netsa_silk import IPAddr, ip_set, parse_many, prefix_map
+
+class PrefixMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pmap = prefix_map([('0.0.0.0/0', 'ipv4'),
+                                ('10.0.0.0/8', 'ten'),
+                                ('10.1.0.0/16', 'ten-one'),
+                                ('10.1.2.3', 'host'),
+                                ('2001:db8::/32', 'doc'),
+                                ('::/0', 'any')])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_len_1(self):
+        self.assertEqual(len(prefix_map()), 0)
+        self.assertEqual(len(self.pmap), 6)
+
+    def test_lookup_1(self):
+        self.assertEqual(self.pmap.lookup('10.1.2.3'), 'host')
+        self.assertEqual(self.pmap.lookup('10.1.2.4'), 'ten-one')
+        self.assertEqual(self.pmap.lookup('10.2.0.0'), 'ten')
+        self.assertEqual(self.pmap.lookup('11.0.0.0'), 'ipv4')
+
+    def test_lookup_2(self):
+        self.assertEqual(self.pmap.lookup(IPAddr('2001:db8::1')), 'doc')
+        self.assertEqual(self.pmap.lookup('::1'), 'any')
+        self.assertEqual(self.pmap.lookup('::ffff:10.1.2.3'), 'host')
+
+    def test_lookup_3(self):
+        pmap = prefix_map([('10.0.0.0/8', 'ten')])
+        self.assertEqual(pmap.lookup('11.0.0.0'), None)
+        self.assertEqual(pmap.lookup('11.0.0.0', 'none'), 'none')
+        self.assertEqual(pmap.lookup('::1', 'none'), 'none')
+        self.assertRaises(TypeError, pmap.lookup, 1)
+
+    def test_insert_1(self):
+        pmap = prefix_map()
+        pmap.insert((IPAddr('10.0.0.0'), 8), 'ten')
+        pmap.insert('10.0.0.0/8', 'TEN')
+        self.assertEqual(len(pmap), 1)
+        self.assertEqual(pmap.lookup('10.0.0.1'), 'TEN')
+
+    def test_insert_2(self):
+        pmap = prefix_map()
+        for (block, prefix_len) in ip_set(['1.2.3.4-9']).cidr_iter():
+            pmap.insert((block, prefix_len), prefix_len)
+        self.assertEqual(pmap.lookup('1.2.3.5'), 30)
+        self.assertEqual(pmap.lookup('1.2.3.9'), 31)
+
+    def test_insert_3(self):
+        pmap = prefix_map()
+        self.assertRaises(ValueError, pmap.insert, '10.0.0.0/33', 'x')
+        self.assertRaises(ValueError, pmap.insert, 'bogus/8', 'x')
+        self.assertRaises(ValueError, pmap.insert, '::/129', 'x')
+
+    def test_lookup_many_1(self):
+        (values, errors) = parse_many(['10.1.2.3', '10.9.9.9', '9.9.9.9'])
+        self.assertEqual(self.pmap.lookup_many(values),
+                         ['host', 'ten', 'ipv4'])
+        self.assertEqual(
+            self.pmap.lookup_many([int(IPAddr('2001:db8::1')), 1],
+                                  ipv6=True),
+            ['doc', 'any'])
+
+    def test_save_load_1(self):
+        path = os.path.join(self.tmpdir, 'test.pmap')
+        self.pmap.save(path)
+        pmap = prefix_map.load(path)
+        self.assertEqual(len(pmap), 6)
+        for addr in ['10.1.2.3', '10.1.2.4', '10.2.0.0', '11.0.0.0',
+                     '2001:db8::1', '::1']:
+            self.assertEqual(pmap.lookup(addr), self.pmap.lookup(addr))
+        pmap.insert('10.1.2.0/24', 'net')
+        self.assertEqual(pmap.lookup('10.1.2.4'), 'net')
+        self.assertEqual(pmap.lookup('10.1.2.3'), 'host')
+
+    def test_save_load_2(self):
+        path = os.path.join(self.tmpdir, 'bad.pmap')
+        f = open(path, 'wb')
+        f.write('10.0.0.0/8 ten\n')
+        f.close()
+        self.assertRaises(ValueError, prefix_map.load, path)
+
+if __name__ == "__main__":
+    unittest.main()
+
+__all__ = ['PrefixMapTest']
@@ -46,12 +46,14 @@
 # contract clause at 252.227.7013.
 # @OPENSOURCE_HEADER_END@
 
+import copy
 import operator
 import unittest
 import sys
 
 from netsa._netsa_silk import (TCPFlags, TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH,
-                               TCP_URG, TCP_ECE, TCP_CWR, TCP_ACK)
+                               TCP_URG, TCP_ECE, TCP_CWR, TCP_ACK,
+                               TCPFlagMask, matches_many)
 
 class TCPFlagsTest(unittest.TestCase):
 
@@ -174,6 +176,52 @@ class TCPFlagsTest(unittest.TestCase):
     def test_matches_7(self):
         self.assertRaises(ValueError, TCPFlags('fsrp').matches, 'fsqq')
 
+    def test_matches_8(self):
+        mask = TCPFlagMask('s/sa')
+        self.assertTrue(TCPFlags('s').matches(mask))
+        self.assertFalse(TCPFlags('sa').matches(mask))
+        self.assertTrue(mask.matches(0x02))
+        self.assertTrue(mask.matches('sp'))
+        self.assertFalse(mask.matches(TCPFlags('a')))
+
+    def test_matches_9(self):
+        self.assertRaises(TypeError, TCPFlagMask, 17)
+        self.assertRaises(ValueError, TCPFlagMask, 'a/s/')
+        self.assertRaises(ValueError, TCPFlagMask, 'x')
+
+    def test_matches_many_1(self):
+        values = [0x02, 0x12, 0x03, 0x00]
+        self.assertEqual(list(matches_many(values, 's/sa')), [1, 0, 1, 0])
+        self.assertEqual(list(matches_many(''.join(map(chr, values)), 's/sa')),
+                         [1, 0, 1, 0])
+        self.assertEqual(list(matches_many(bytearray(values),
+                                           TCPFlagMask('s/sa'))),
+                         [1, 0, 1, 0])
+        self.assertEqual(list(matches_many([TCPFlags('s'), 'sa'], 's/sa')),
+                         [1, 0])
+
+    def test_matches_many_2(self):
+        for mask in ['s/sa', 'fa', 'r/fsrp', '/u']:
+            flags = range(256)
+            self.assertEqual(
+                list(matches_many(flags, mask)),
+                [int(TCPFlags(v).matches(mask)) for v in flags])
+        self.assertRaises(ValueError, matches_many, [256], 's')
+        self.assertRaises(TypeError, matches_many, [1], 17)
+
+    def test_intern_1(self):
+        self.assert_(TCPFlags('sa') is TCPFlags(0x12))
+        self.assert_(TCPFlags('fs') & TCPFlags('s') is TCP_SYN)
+        self.assertEqual(copy.copy(TCPFlags('fs')), TCPFlags('fs'))
+        self.assertEqual(hash(TCPFlags('fs')), hash(TCPFlags(0x03)))
+
+    def test_str_3(self):
+        for v in xrange(256):
+            flags = TCPFlags(v)
+            self.assertEqual(TCPFlags(str(flags)), flags)
+            self.assertEqual(len(flags.padded()), 8)
+            self.assertEqual(flags.padded().replace(' ', ''), str(flags))
+
     def test_silk_TCPFlagsConstruction(self):
         for i in range(0, 256):
             TCPFlags(i)
@@ -54,6 +54,10 @@ Definitions of country and region names and codes as defined by ISO
 is current as of January 2010.
 """
 
+import array
+import bisect
+import csv
+
 ### | CC | CCC | Name                                        | Sub | Reg | TLDs
 _country_info = """
 900 |    |     | Ascension Island                            |     | 990 | ac
@@ -631,6 +635,206 @@ def iter_region_countries(code):
             yield country_code
     return gen()
 
+if array.array('I').itemsize == 4:
+    _ARRAY_UINT32 = 'I'
+else:
+    _ARRAY_UINT32 = 'L'
+
+def _ip_range_conv(first, last=None):
+    """
+    Returns a triple ``(is_ipv6, first, last)`` giving the integer
+    bounds of an address range specified either as *first* and *last*
+    addresses, or as a single CIDR block or IP wildcard in *first*.
+    """
+    # Imported here so the country tables don't need netsa._netsa_silk
+    from netsa._netsa_silk import IPAddr, IPWildcard
+    if last is None:
+        if '/' not in first:
+            last = first
+        else:
+            wildcard = IPWildcard(first)
+            ranges = list(wildcard.range_iter())
+            if len(ranges) != 1:
+                raise ValueError("Not a single address range: %r" % first)
+            (first, last) = ranges[0]
+    first = IPAddr(first)
+    last = IPAddr(last)
+    if first.is_ipv6() and last.is_ipv6():
+        # IPv4-mapped ranges are kept with the IPv4 ranges
+        if first.to_ipv4() is not None and last.to_ipv4() is not None:
+            (first, last) = (first.to_ipv4(), last.to_ipv4())
+    if first.is_ipv6() != last.is_ipv6():
+        raise ValueError("Mixed IPv4 and IPv6 range: %s-%s" % (first, last))
+    return (first.is_ipv6(), int(first), int(last))
+
+class _ip_range_table(object):
+    """
+    Sorted, non-overlapping address ranges and the country code for
+    each, held in parallel arrays.
+    """
+    __slots__ = ['starts', 'ends', 'codes']
+    def __init__(self, ranges, starts, ends):
+        self.starts = starts
+        self.ends = ends
+        self.codes = array.array('H')
+        for (first, last, code) in ranges:
+            if self.ends and first <= self.ends[-1]:
+                raise ValueError("Overlapping address ranges at %d" % first)
+            if (self.ends and first == self.ends[-1] + 1 and
+                    code == self.codes[-1]):
+                self.ends[-1] = last
+                continue
+            self.starts.append(first)
+            self.ends.append(last)
+            self.codes.append(code)
+    def lookup(self, a, default):
+        i = bisect.bisect_right(self.starts, a)
+        if i and a <= self.ends[i-1]:
+            return self.codes[i-1]
+        return default
+    def lookup_many(self, values, default):
+        (starts, ends, codes) = (self.starts, self.ends, self.codes)
+        bisect_right = bisect.bisect_right
+        result = []
+        append = result.append
+        for a in values:
+            i = bisect_right(starts, a)
+            if i and a <= ends[i-1]:
+                append(codes[i-1])
+            else:
+                append(default)
+        return result
+
+class CountryIPMap(object):
+    """
+    A mapping from IP address ranges to ISO 3166-1 numeric country
+    codes, as returned by :func:`get_country_numeric`.
+
+    *ranges* is an iterable of ``(first, last, code)`` triples, where
+    *first* and *last* are the first and last addresses of a range (as
+    strings or :class:`netsa_silk.IPAddr` objects), and *code* is any
+    country code accepted by :func:`get_country_numeric`.  The ranges
+    may not overlap.
+
+    Raises :exc:`KeyError` if a country code is unrecognized, or
+    :exc:`ValueError` if the ranges overlap.
+    """
+    def __init__(self, ranges=()):
+        v4_ranges = []
+        v6_ranges = []
+        for (first, last, code) in ranges:
+            (is_ipv6, first, last) = _ip_range_conv(first, last)
+            code = get_country_numeric(code)
+            if is_ipv6:
+                v6_ranges.append((first, last, code))
+            else:
+                v4_ranges.append((first, last, code))
+        self._build(v4_ranges, v6_ranges)
+    def _build(self, v4_ranges, v6_ranges):
+        v4_ranges.sort()
+        v6_ranges.sort()
+        self._ipv4 = _ip_range_table(v4_ranges, array.array(_ARRAY_UINT32),
+                                     array.array(_ARRAY_UINT32))
+        self._ipv6 = _ip_range_table(v6_ranges, [], [])
+    def __len__(self):
+        return len(self._ipv4.starts) + len(self._ipv6.starts)
+    def lookup(self, addr, default=None):
+        """
+        Returns the ISO 3166-1 numeric code of the country containing
+        *addr* (an address string or :class:`netsa_silk.IPAddr`), or
+        *default* if the address is not in any known range.
+        IPv4-mapped IPv6 addresses are looked up as IPv4 addresses.
+        """
+        from netsa._netsa_silk import IPAddr
+        addr = IPAddr(addr)
+        a = int(addr)
+        if not addr.is_ipv6():
+            return self._ipv4.lookup(a, default)
+        if a >> 32 == 0xFFFF:
+            return self._ipv4.lookup(a & 0xFFFFFFFF, default)
+        return self._ipv6.lookup(a, default)
+    def lookup_many(self, values, default=None, ipv6=False):
+        """
+        Returns a list of the ISO 3166-1 numeric country codes for each
+        integer address in *values* (as returned by
+        :func:`netsa._netsa_silk.parse_many`), with *default* for each
+        address not in any known range.  The values are IPv4 addresses
+        unless *ipv6* is true, in which case IPv4-mapped addresses are
+        looked up as IPv4 addresses, as by :meth:`lookup`.
+        """
+        if not ipv6:
+            return self._ipv4.lookup_many(values, default)
+        (v4_lookup, v6_lookup) = (self._ipv4.lookup, self._ipv6.lookup)
+        result = []
+        append = result.append
+        for a in values:
+            if a >> 32 == 0xFFFF:
+                append(v4_lookup(a & 0xFFFFFFFF, default))
+            else:
+                append(v6_lookup(a, default))
+        return result
+
+def load_country_ip_map(path, ignore_unknown=False):
+    """
+    Reads a file mapping address ranges to country codes, and returns
+    a :class:`CountryIPMap`.  Each line of the file contains either a
+    CIDR block and a country code, or the first address, last address,
+    and country code of a range.  Fields are separated by commas or by
+    whitespace, and blank lines and lines starting with ``#`` are
+    ignored.  Country codes may be given in any form accepted by
+    :func:`get_country_numeric`.  Ranges with the code ``--`` (used by
+    SiLK for unknown locations) are skipped.
+
+    Raises :exc:`ValueError` if the file contains a malformed line or
+    an unrecognized country code, unless *ignore_unknown* is true, in
+    which case ranges with unrecognized codes are skipped.
+    """
+    def ranges(f):
+        for (line_num, line) in enumerate(f):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if ',' in line:
+                fields = [x.strip() for x in csv.reader([line]).next()]
+            else:
+                fields = line.split()
+            try:
+                if len(fields) == 2:
+                    (first, last, code) = (fields[0], None, fields[1])
+                elif len(fields) == 3:
+                    (first, last, code) = fields
+                else:
+                    raise ValueError()
+                if code == '--':
+                    continue
+                try:
+                    code = get_country_numeric(code)
+                except KeyError:
+                    if ignore_unknown:
+                        continue
+                    raise ValueError()
+                (is_ipv6, first, last) = _ip_range_conv(first, last)
+            except ValueError:
+                value_error = ValueError(
+                    "Invalid country map line %d in %r: %r" %
+                    (line_num + 1, path, line))
+                raise value_error
+            yield (first, last, is_ipv6, code)
+    v4_ranges = []
+    v6_ranges = []
+    f = open(path, 'r')
+    try:
+        for (first, last, is_ipv6, code) in ranges(f):
+            if is_ipv6:
+                v6_ranges.append((first, last, code))
+            else:
+                v4_ranges.append((first, last, code))
+    finally:
+        f.close()
+    result = CountryIPMap()
+    result._build(v4_ranges, v6_ranges)
+    return result
+
 __all__ = """
 
     get_area_numeric
@@ -651,4 +855,7 @@ __all__ = """
     iter_region_subregions
     iter_region_countries
 
+    CountryIPMap
+    load_country_ip_map
+
 """.split()
@@ -257,6 +257,9 @@ def num_prefix(value, units="", sig_fig=3, use_binary=False, thousands_sep=""):
 
 # Date and time formatting
 
+from datetime import timedelta
+from operator import attrgetter
+
 import netsa.data.times
 
 DATETIME_YEAR = 0
@@ -554,6 +557,217 @@ def datetime_iso_day(value):
     """
     return datetime_iso(value, precision=DATETIME_DAY)
 
+# Format strings for each datetime style and precision, as (format,
+# fraction format, fraction divisor).  The format covers the fields up
+# to the second, and the fraction format (if any) formats the
+# microseconds divided by the divisor.
+_datetime_formats = {
+    'silk': {
+        DATETIME_YEAR: ("%04d", None, None),
+        DATETIME_MONTH: ("%04d/%02d", None, None),
+        DATETIME_DAY: ("%04d/%02d/%02d", None, None),
+        DATETIME_HOUR: ("%04d/%02d/%02dT%02d", None, None),
+        DATETIME_MINUTE: ("%04d/%02d/%02dT%02d:%02d", None, None),
+        DATETIME_SECOND: ("%04d/%02d/%02dT%02d:%02d:%02d", None, None),
+        DATETIME_MSEC: ("%04d/%02d/%02dT%02d:%02d:%02d", ".%03d", 1000),
+        DATETIME_USEC: ("%04d/%02d/%02dT%02d:%02d:%02d", ".%03d000", 1000),
+    },
+    'iso': {
+        DATETIME_YEAR: ("%04d", None, None),
+        DATETIME_MONTH: ("%04d-%02d", None, None),
+        DATETIME_DAY: ("%04d-%02d-%02d", None, None),
+        DATETIME_HOUR: ("%04d-%02d-%02dT%02d", None, None),
+        DATETIME_MINUTE: ("%04d-%02d-%02dT%02d:%02d", None, None),
+        DATETIME_SECOND: ("%04d-%02d-%02dT%02d:%02d:%02d", None, None),
+        DATETIME_MSEC: ("%04d-%02d-%02dT%02d:%02d:%02d", ".%03d", 1000),
+        DATETIME_USEC: ("%04d-%02d-%02dT%02d:%02d:%02d", ".%06d", 1),
+    },
+    'iso_basic': {
+        DATETIME_YEAR: ("%04d", None, None),
+        DATETIME_DAY: ("%04d%02d%02d", None, None),
+        DATETIME_HOUR: ("%04d%02d%02dT%02d", None, None),
+        DATETIME_MINUTE: ("%04d%02d%02dT%02d%02d", None, None),
+        DATETIME_SECOND: ("%04d%02d%02dT%02d%02d%02d", None, None),
+        DATETIME_MSEC: ("%04d%02d%02dT%02d%02d%02d", ".%03d", 1000),
+        DATETIME_USEC: ("%04d%02d%02dT%02d%02d%02d", ".%06d", 1),
+    },
+}
+
+# The fields of a datetime needed for each precision up to
+# DATETIME_SECOND
+_datetime_fields = ['year', 'month', 'day', 'hour', 'minute', 'second']
+
+def _datetime_span(v, precision):
+    """
+    Returns a pair ``(lo, hi)`` of datetimes bounding the year, month,
+    day, hour, minute, or second (according to *precision*) containing
+    the datetime *v*, or ``None`` if the bounds are out of range.
+    """
+    try:
+        if precision == DATETIME_SECOND:
+            lo = v.replace(microsecond=0)
+            hi = lo + timedelta(seconds=1)
+        elif precision == DATETIME_MINUTE:
+            lo = v.replace(second=0, microsecond=0)
+            hi = lo + timedelta(minutes=1)
+        elif precision == DATETIME_HOUR:
+            lo = v.replace(minute=0, second=0, microsecond=0)
+            hi = lo + timedelta(hours=1)
+        elif precision == DATETIME_DAY:
+            lo = v.replace(hour=0, minute=0, second=0, microsecond=0)
+            hi = lo + timedelta(days=1)
+        elif precision == DATETIME_MONTH:
+            lo = v.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            if lo.month == 12:
+                hi = lo.replace(year=lo.year + 1, month=1)
+            else:
+                hi = lo.replace(month=lo.month + 1)
+        else:
+            lo = v.replace(month=1, day=1, hour=0, minute=0, second=0,
+                           microsecond=0)
+            hi = lo.replace(year=lo.year + 1)
+    except (OverflowError, ValueError):
+        return None
+    return (lo, hi)
+
+def _make_datetime_formatter(style, precision, cache):
+    """
+    Returns a function formatting a datetime in the given *style*
+    (``'silk'``, ``'iso'``, or ``'iso_basic'``) to the given
+    *precision*, producing the same output as :func:`datetime_silk`,
+    :func:`datetime_iso`, or :func:`datetime_iso_basic`.
+    """
+    try:
+        (fmt, frac_fmt, frac_div) = _datetime_formats[style][precision]
+    except KeyError:
+        if style == 'iso_basic' and precision == DATETIME_MONTH:
+            value_error = ValueError("datetime_iso_basic format does not "
+                                     "support precision option "
+                                     "DATETIME_MONTH")
+        else:
+            value_error = ValueError("Unrecognized neta.data.format datetime "
+                                     "precision option %s" % repr(precision))
+        raise value_error
+    normalize = (style == 'silk')
+    normalize_datetime = netsa.data.times.normalize_datetime
+    utc = netsa.data.times.utc
+    if style == 'iso':
+        tzname = _iso_tzname
+    elif style == 'iso_basic':
+        tzname = _iso_tzname_basic
+    else:
+        tzname = None
+    span_precision = min(precision, DATETIME_SECOND)
+    field_names = _datetime_fields[:span_precision + 1]
+    fields = attrgetter(*field_names)
+    # Formatting everything at once is fastest when nothing is cached
+    full_fmt = fmt
+    if frac_fmt is None:
+        full_fields = fields
+    elif frac_div == 1:
+        full_fmt = fmt + frac_fmt
+        full_fields = attrgetter(*(field_names + ['microsecond']))
+    else:
+        full_fmt = fmt + frac_fmt
+        full_fields = lambda v: (v.year, v.month, v.day, v.hour, v.minute,
+                                 v.second, v.microsecond // frac_div)
+    if normalize:
+        def format_uncached(value):
+            return full_fmt % full_fields(normalize_datetime(value))
+    else:
+        def format_uncached(v):
+            return full_fmt % full_fields(v) + tzname(v)
+    if not cache:
+        return format_uncached
+    # The result for the most recent naive or UTC datetime is kept
+    # along with the span of datetimes which format the same way (up
+    # to the second), as [tzinfo, lo, hi, result].  The time zone
+    # suffix of a naive or UTC datetime is always empty.
+    last = [object(), None, None, None]
+    def format_datetime(value):
+        if normalize:
+            v = normalize_datetime(value)
+        else:
+            v = value
+        tz = v.tzinfo
+        if tz is last[0] and last[1] <= v < last[2]:
+            result = last[3]
+        elif tz is None or tz is utc:
+            span = _datetime_span(v, span_precision)
+            if span is None:
+                return format_uncached(v)
+            result = fmt % fields(v)
+            last[:] = [tz, span[0], span[1], result]
+        else:
+            return format_uncached(v)
+        if frac_fmt is None:
+            return result
+        return result + frac_fmt % (v.microsecond // frac_div)
+    return format_datetime
+
+def make_datetime_silk_formatter(precision=DATETIME_SECOND, cache=True):
+    """
+    Returns a function which formats a datetime exactly as
+    ``datetime_silk(value, precision)`` would.  The format is chosen
+    once, rather than on every call.
+
+    If *cache* is ``True``, the function remembers the text for the
+    most recent second (or minute, hour, and so on, depending on
+    *precision*), which makes formatting a sorted stream of times much
+    faster.
+
+    Raises :exc:`ValueError` if the precision is not recognized.
+
+    Example::
+
+        >>> f = make_datetime_silk_formatter(DATETIME_MSEC)
+        >>> f(netsa.data.times.make_datetime("2010-02-03T04:05:06.007"))
+        '2010/02/03T04:05:06.007'
+    """
+    return _make_datetime_formatter('silk', precision, cache)
+
+def make_datetime_iso_formatter(precision=DATETIME_SECOND, cache=True):
+    """
+    Returns a function which formats a datetime exactly as
+    ``datetime_iso(value, precision)`` would.  See
+    :func:`make_datetime_silk_formatter` for details.  Only naive and
+    UTC datetimes are cached, since only they are formatted without a
+    timezone offset.
+    """
+    return _make_datetime_formatter('iso', precision, cache)
+
+def make_datetime_iso_basic_formatter(precision=DATETIME_SECOND, cache=True):
+    """
+    Returns a function which formats a datetime exactly as
+    ``datetime_iso_basic(value, precision)`` would.  See
+    :func:`make_datetime_iso_formatter` for details.
+    """
+    return _make_datetime_formatter('iso_basic', precision, cache)
+
+def datetime_silk_many(values, precision=DATETIME_SECOND):
+    """
+    Returns a list of each datetime in *values* formatted as by
+    :func:`datetime_silk`, using a caching formatter from
+    :func:`make_datetime_silk_formatter`.
+    """
+    return map(make_datetime_silk_formatter(precision), values)
+
+def datetime_iso_many(values, precision=DATETIME_SECOND):
+    """
+    Returns a list of each datetime in *values* formatted as by
+    :func:`datetime_iso`, using a caching formatter from
+    :func:`make_datetime_iso_formatter`.
+    """
+    return map(make_datetime_iso_formatter(precision), values)
+
+def datetime_iso_basic_many(values, precision=DATETIME_SECOND):
+    """
+    Returns a list of each datetime in *values* formatted as by
+    :func:`datetime_iso_basic`, using a caching formatter from
+    :func:`make_datetime_iso_basic_formatter`.
+    """
+    return map(make_datetime_iso_basic_formatter(precision), values)
+
 def timedelta_iso(value):
     """
     Format a :class:`datetime.timedelta` object as a str in ISO 8601
@@ -630,6 +844,14 @@ __all__ = """
 
     datetime_iso_basic
 
+    make_datetime_silk_formatter
+    make_datetime_iso_formatter
+    make_datetime_iso_basic_formatter
+
+    datetime_silk_many
+    datetime_iso_many
+    datetime_iso_basic_many
+
     timedelta_iso
 
 """.split()
@@ -0,0 +1,157 @@
+# Copyright 2008-2013 by Carnegie Mellon University
+
+# @OPENSOURCE_HEADER_START@
+# Use of the Network Situational Awareness Python support library and
+# related source code is subject to the terms of the following licenses:
+# 
+# GNU Public License (GPL) Rights pursuant to Version 2, June 1991
+# Government Purpose License Rights (GPLR) pursuant to DFARS 252.227.7013
+# 
+# NO WARRANTY
+# 
+# ANY INFORMATION, MATERIALS, SERVICES, INTELLECTUAL PROPERTY OR OTHER 
+# PROPERTY OR RIGHTS GRANTED OR PROVIDED BY CARNEGIE MELLON UNIVERSITY 
+# PURSUANT TO THIS LICENSE (HEREINAFTER THE "DELIVERABLES") ARE ON AN 
+# "AS-IS" BASIS. CARNEGIE MELLON UNIVERSITY MAKES NO WARRANTIES OF ANY 
+# KIND, EITHER EXPRESS OR IMPLIED AS TO ANY MATTER INCLUDING, BUT NOT 
+# LIMITED TO, WARRANTY OF FITNESS FOR A PARTICULAR PURPOSE, 
+# MERCHANTABILITY, INFORMATIONAL CONTENT, NONINFRINGEMENT, OR ERROR-FREE 
+# OPERATION. CARNEGIE MELLON UNIVERSITY SHALL NOT BE LIABLE FOR INDIRECT, 
+# SPECIAL OR CONSEQUENTIAL DAMAGES, SUCH AS LOSS OF PROFITS OR INABILITY 
+# TO USE SAID INTELLECTUAL PROPERTY, UNDER THIS LICENSE, REGARDLESS OF 
+# WHETHER SUCH PARTY WAS AWARE OF THE POSSIBILITY OF SUCH DAMAGES. 
+# LICENSEE AGREES THAT IT WILL NOT MAKE ANY WARRANTY ON BEHALF OF 
+# CARNEGIE MELLON UNIVERSITY, EXPRESS OR IMPLIED, TO ANY PERSON 
+# CONCERNING THE APPLICATION OF OR THE RESULTS TO BE OBTAINED WITH THE 
+# DELIVERABLES UNDER THIS LICENSE.
+# 
+# Licensee hereby agrees to defend, indemnify, and hold harmless Carnegie 
+# Mellon University, its trustees, officers, employees, and agents from 
+# all claims or demands made against them (and any related losses, 
+# expenses, or attorney's fees) arising out of, or relating to Licensee's 
+# and/or its sub licensees' negligent use or willful misuse of or 
+# negligent conduct or willful misconduct regarding the Software, 
+# facilities, or other rights or assistance granted by Carnegie Mellon 
+# University under this License, including, but not limited to, any 
+# claims of product liability, personal injury, death, damage to 
+# property, or violation of any laws or regulations.
+# 
+# Carnegie Mellon University Software Engineering Institute authored 
+# documents are sponsored by the U.S. Department of Defense under 
+# Contract FA8721-05-C-0003. Carnegie Mellon University retains 
+# copyrights in all material produced under this contract. The U.S. 
+# Government retains a non-exclusive, royalty-free license to publish or 
+# reproduce these documents, or allow others to do so, for U.S. 
+# Government purposes only pursuant to the copyright license under the 
+# contract clause at 252.227.7013.
+# @OPENSOURCE_HEADER_END@
+"""
+Timing benchmarks for netsa.data.
+
+These are not run as part of the unit tests.  Run them directly with:
+
+    python -m netsa.data.test.benchmark [n ...]
+
+Each n is a number of times to bin.
+"""
+
+import array
+import random
+import sys
+import time
+
+from calendar import timegm
+from datetime import timedelta
+
+from netsa.data.times import (
+    make_datetime, bin_epoch_many, DateSnapper, dow_epoch)
+from netsa.data.test.times import overlay_clumper
+
+DEFAULT_NS = [10**4, 10**5, 10**6]
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def make_times(n, seed=0):
+    """
+    Returns a list of *n* random integer times (seconds from the UNIX
+    epoch) in 2010.
+    """
+    rand = random.Random(seed)
+    return [rand.randint(1262304000, 1293839999) for i in xrange(n)]
+
+def time_call(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+def bin_datetimes(snapper, times):
+    date_bin = snapper.date_bin
+    for t in times:
+        date_bin(t)
+
+def bin_epochs(snapper, times):
+    epoch_bin = snapper.epoch_bin
+    for t in times:
+        epoch_bin(t)
+
+def bench_binning(ns):
+    snapper = DateSnapper(timedelta(minutes=5), dow_epoch(2))
+    columns = ["datetime", "epoch", "epoch many", "epoch array"]
+    if numpy is not None:
+        columns.append("epoch numpy")
+    print "%-10s" % "n" + "".join(" %-12s" % c for c in columns)
+    for n in ns:
+        times = make_times(n)
+        datetimes = [make_datetime(t) for t in times]
+        results = [time_call(bin_datetimes, snapper, datetimes),
+                   time_call(bin_epochs, snapper, times),
+                   time_call(snapper.epoch_bin_many, times),
+                   time_call(snapper.epoch_bin_many,
+                             array.array('l', times))]
+        if numpy is not None:
+            results.append(time_call(snapper.epoch_bin_many,
+                                     numpy.array(times, dtype=numpy.int64)))
+        print "%-10d" % n + "".join(" %-12.3f" % r for r in results)
+    print "(seconds)"
+
+def make_ranges(n, seed=0):
+    """
+    Returns a list of *n* random ``(begin, end)`` datetime ranges in
+    2010, from a few minutes to a few days long.
+    """
+    rand = random.Random(seed)
+    ranges = []
+    for t in make_times(n, seed):
+        ranges.append((make_datetime(t),
+                       make_datetime(t + rand.randint(0, 3 * 86400))))
+    return ranges
+
+def bench_clumper(ns):
+    snapper = DateSnapper(timedelta(hours=1))
+    print "%-10s %-12s %-12s %-12s %-12s" % (
+        "n", "overlay", "sweep", "sweep sorted", "epoch")
+    for n in ns:
+        ranges = make_ranges(n)
+        sorted_ranges = sorted(ranges)
+        epoch_ranges = [(int(timegm(a.utctimetuple())),
+                         int(timegm(b.utctimetuple()))) for (a, b) in ranges]
+        results = [
+            time_call(overlay_clumper, snapper, ranges),
+            time_call(lambda: list(snapper.date_clumper(ranges))),
+            time_call(lambda: list(snapper.date_clumper(sorted_ranges,
+                                                        presorted=True))),
+            time_call(lambda: list(snapper.epoch_clumper(epoch_ranges)))]
+        print "%-10d" % n + "".join(" %-12.3f" % r for r in results)
+    print "(seconds)"
+
+def main(argv):
+    ns = [int(x) for x in argv] or DEFAULT_NS
+    bench_binning(ns)
+    print
+    bench_clumper(ns)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -46,6 +46,10 @@
 # contract clause at 252.227.7013.
 # @OPENSOURCE_HEADER_END@
 
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
 
 from netsa.data.countries import *
@@ -476,3 +480,80 @@ class CountryTest(unittest.TestCase):
     def test_iter_region_countries_3(self):
         self.assertRaises(KeyError, iter_region_countries, 999)
 
+    def test_country_ip_map_1(self):
+        m = CountryIPMap([('1.0.0.0', '1.0.0.255', 'AU'),
+                          ('1.0.1.0', '1.0.3.255', 'CHN'),
+                          ('2001:db8::', '2001:db8::ffff', 840)])
+        self.assertEqual(len(m), 3)
+        self.assertEqual(m.lookup('1.0.0.5'), 36)
+        self.assertEqual(m.lookup('1.0.2.2'), 156)
+        self.assertEqual(m.lookup('::ffff:1.0.2.2'), 156)
+        self.assertEqual(m.lookup('2001:db8::1'), 840)
+        self.assertEqual(m.lookup('1.0.4.0'), None)
+        self.assertEqual(m.lookup('1.0.4.0', 0), 0)
+
+    def test_country_ip_map_2(self):
+        m = CountryIPMap([('1.0.0.0', '1.0.0.255', 'AU'),
+                          ('2001:db8::', '2001:db8::ffff', 'US')])
+        self.assertEqual(m.lookup_many([0x01000005, 0x01000105]), [36, None])
+        self.assertEqual(m.lookup_many([0x20010db8 << 96], ipv6=True),
+                         [840])
+
+    def test_country_ip_map_mapped(self):
+        from netsa._netsa_silk import parse_many
+        m = CountryIPMap([('10.0.0.0', '10.255.255.255', 'US'),
+                          ('2001:db8::', '2001:db8::ffff', 'FR')])
+        strings = ['10.1.2.3', '::ffff:10.9.9.9', '2001:db8::1',
+                   '9.9.9.9', '::1', '::ffff:9.9.9.9']
+        (values, errors) = parse_many(strings, ipv6=True)
+        self.assertEqual(m.lookup_many(values, ipv6=True),
+                         [m.lookup(s) for s in strings])
+        self.assertEqual(m.lookup_many(values, 0, ipv6=True),
+                         [840, 840, 250, 0, 0, 0])
+
+    def test_country_ip_map_3(self):
+        self.assertRaises(KeyError, CountryIPMap,
+                          [('1.0.0.0', '1.0.0.255', 'XX')])
+        self.assertRaises(ValueError, CountryIPMap,
+                          [('1.0.0.0', '1.0.0.255', 'AU'),
+                           ('1.0.0.128', '1.0.1.255', 'US')])
+
+    def test_country_ip_map_lazy_import(self):
+        # Only address lookups should load netsa._netsa_silk
+        script = ("import sys, netsa.data.countries as c\n"
+                  "c.get_country_numeric('AU')\n"
+                  "print 'netsa._netsa_silk' in sys.modules\n"
+                  "c.CountryIPMap([('1.0.0.0', '1.0.0.255', 'AU')])\n"
+                  "print 'netsa._netsa_silk' in sys.modules\n")
+        p = subprocess.Popen([sys.executable, "-c", script],
+                             stdout=subprocess.PIPE)
+        output = p.communicate()[0]
+        self.assertEqual(p.returncode, 0)
+        self.assertEqual(output.split(), ['False', 'True'])
+
+    def test_load_country_ip_map_1(self):
+        (fd, path) = tempfile.mkstemp()
+        try:
+            f = os.fdopen(fd, 'w')
+            f.write('# comment\n'
+                    '1.0.0.0/24,AU\n'
+                    '"1.0.1.0","1.0.3.255","CN"\n'
+                    '\n'
+                    '1.0.4.0   1.0.7.255   AUS\n'
+                    '2.0.0.0/8 --\n'
+                    '2001:db8::/32 us\n')
+            f.close()
+            m = load_country_ip_map(path)
+            self.assertEqual(len(m), 4)
+            self.assertEqual(m.lookup('1.0.6.1'), 36)
+            self.assertEqual(m.lookup('1.0.1.1'), 156)
+            self.assertEqual(m.lookup('2.0.0.1'), None)
+            self.assertEqual(m.lookup('2001:db8:1::1'), 840)
+            f = open(path, 'a')
+            f.write('3.0.0.0/8 xx\n')
+            f.close()
+            self.assertRaises(ValueError, load_country_ip_map, path)
+            m = load_country_ip_map(path, ignore_unknown=True)
+            self.assertEqual(m.lookup('3.0.0.1'), None)
+        finally:
+            os.unlink(path)
@@ -46,6 +46,7 @@
 # contract clause at 252.227.7013.
 # @OPENSOURCE_HEADER_END@
 
+import random
 import unittest
 
 import netsa.data.format
@@ -443,3 +444,72 @@ class FormatTest(unittest.TestCase):
     test_timedelta_iso_negs = td_test("-PT1S", seconds=-1)
     test_timedelta_iso_d_negs = td_test("PT23H59M59S", days=1, seconds=-1)
     test_timedelta_iso_s_negd = td_test("-PT23H59M59S", days=-1, seconds=1)
+
+class DatetimeFormatterTest(unittest.TestCase):
+
+    precisions = [DATETIME_YEAR, DATETIME_MONTH, DATETIME_DAY, DATETIME_HOUR,
+                  DATETIME_MINUTE, DATETIME_SECOND, DATETIME_MSEC,
+                  DATETIME_USEC]
+
+    styles = [(datetime_silk, make_datetime_silk_formatter,
+               datetime_silk_many),
+              (datetime_iso, make_datetime_iso_formatter,
+               datetime_iso_many),
+              (datetime_iso_basic, make_datetime_iso_basic_formatter,
+               datetime_iso_basic_many)]
+
+    def values(self):
+        rand = random.Random(4)
+        utc = netsa.data.times.utc
+        zones = [utc, None, netsa.data.times.tzinfo_fixed(9*60+10),
+                 netsa.data.times.tzinfo_fixed(-3*60)]
+        t = datetime(2009, 12, 31, 23, 59, 50, 999000)
+        values = []
+        # a mostly monotonic stream crossing year, month, and day
+        # boundaries, with some times out of order and in other zones
+        for i in xrange(2000):
+            t += timedelta(microseconds=rand.choice(
+                [0, 1, 999, 250000, 1000000, 60 * 10**6, 86400 * 10**6]))
+            if rand.random() < 0.05:
+                v = t - timedelta(seconds=rand.randint(1, 10**6))
+            else:
+                v = t
+            tz = rand.choice(zones[:2] * 8 + zones)
+            if tz is not None and tz is not utc and not rand.randint(0, 1):
+                v = v.replace(tzinfo=utc).astimezone(tz)
+            else:
+                v = v.replace(tzinfo=tz)
+            values.append(v)
+        values.append(datetime(9999, 12, 31, 23, 59, 59, 999999, utc))
+        values.append(datetime(1, 1, 1, tzinfo=utc))
+        return values
+
+    def test_formatters_match(self):
+        values = self.values()
+        for (format, make_formatter, format_many) in self.styles:
+            for precision in self.precisions:
+                if (format is datetime_iso_basic and
+                        precision == DATETIME_MONTH):
+                    continue
+                expected = [format(v, precision) for v in values]
+                for cache in (True, False):
+                    f = make_formatter(precision, cache)
+                    self.assertEqual([f(v) for v in values], expected,
+                                     (format, precision, cache))
+                self.assertEqual(format_many(values, precision), expected)
+
+    def test_formatter_default_precision(self):
+        t = datetime(2010, 2, 3, 4, 5, 6, 7008,
+                     tzinfo=netsa.data.times.tzinfo_fixed(9*60+10))
+        self.assertEqual(make_datetime_silk_formatter()(t), datetime_silk(t))
+        self.assertEqual(make_datetime_iso_formatter()(t), datetime_iso(t))
+        self.assertEqual(make_datetime_iso_basic_formatter()(t),
+                         datetime_iso_basic(t))
+
+    def test_formatter_errors(self):
+        self.assertRaises(ValueError, make_datetime_silk_formatter, 8)
+        self.assertRaises(ValueError, make_datetime_iso_formatter, None)
+        self.assertRaises(ValueError, make_datetime_iso_basic_formatter,
+                          DATETIME_MONTH)
+        self.assertRaises(TypeError, make_datetime_silk_formatter(),
+                          "2010-02-03")
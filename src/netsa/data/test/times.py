@@ -46,12 +46,18 @@
 # contract clause at 252.227.7013.
 # @OPENSOURCE_HEADER_END@
 
+import array
+import random
 import unittest
 
 from datetime import datetime, timedelta
 
+import netsa.data.format
 import netsa.data.times
 from netsa.data.times import make_datetime, bin_datetime, make_timedelta
+from netsa.data.times import make_datetime_parser
+from netsa.data.times import bin_epoch, bin_epoch_many, DateSnapper
+from netsa.data.times import dow_epoch, CalendarSnapper
 
 class TimesTest(unittest.TestCase):
 
@@ -334,4 +340,400 @@ class TimesTest(unittest.TestCase):
         self.assertEqual(
             make_timedelta('P1Y1M1DT1H1M1.001S'),
             timedelta(days=396, hours=1, minutes=1, seconds=1, milliseconds=1))
-        
+
+class DatetimeParserTest(unittest.TestCase):
+
+    values = [
+        "2010-02-03", "2010-02-03T04", "2010-02-03T04:05",
+        "2010-02-03T04:05:06", "2010-02-03 04:05:06",
+        "2010-02-03T04:05:06.007", "2010-02-03T04:05:06.007008",
+        "2010-02-03T04:05:06.00700899", "2010-02-03T04:05:06Z",
+        "2010-02-03T04:05:06.007008+09", "2010-02-03T04:05:06.007008+09:10",
+        "2010-02-03T04:05:06.007008-09:10", "2010-02-03T04:05:06.007008-08:10",
+        "2010/02/03", "2010/02/03T04", "2010/02/03T04:05",
+        "2010/02/03T04:05:06", "2010/02/03 04:05:06", "2010/02/03:04:05:06",
+        "2010/02/03T04:05:06.007", "2010/2/3T4:5:6.007", "2010/2/13T4:5:6.007",
+        "02/03/2010", "02/03/2010 04:05:06", "02/03/2010T04:05:06.007",
+        "  2010/02/03T04:05:06.007\n", u"2010/02/03T04:05:06.007",
+        1265169906, 1265169906.5, datetime(2010, 2, 3, 4, 5, 6)]
+
+    bad_values = [
+        "2010/02/03T04:05:06.0x7", "2010/02/03X04:05:06.007",
+        "2010/13/03T04:05:06.007", "2010/02/30T04:05:06.007",
+        "2010-02-03T04:05:06.007+9", "garbage", ""]
+
+    def check(self, parse, values, utc_only=True):
+        for v in values:
+            expected = make_datetime(v, utc_only)
+            result = parse(v)
+            self.assertEqual(result, expected, (v, result, expected))
+            self.assertEqual(result.utcoffset(), expected.utcoffset(), v)
+
+    def check_bad(self, parse, values):
+        for v in values:
+            self.assertRaises(ValueError, make_datetime, v)
+            self.assertRaises(ValueError, parse, v)
+
+    def test_parser_same_format(self):
+        parse = make_datetime_parser()
+        values = ["2010/02/03T04:05:%02d.%03d" % (s, s * 7)
+                  for s in xrange(60)]
+        self.check(parse, values)
+        self.check_bad(parse, self.bad_values)
+        self.check(parse, values)
+
+    def test_parser_mixed_formats(self):
+        parse = make_datetime_parser()
+        self.check(parse, self.values)
+        self.check(parse, list(reversed(self.values)))
+        self.check_bad(parse, self.bad_values)
+
+    def test_parser_not_utc_only(self):
+        parse = make_datetime_parser(utc_only=False)
+        self.check(parse, self.values, utc_only=False)
+        self.check(parse, list(reversed(self.values)), utc_only=False)
+
+    def test_parser_format_hint(self):
+        parse = make_datetime_parser("1999-01-01T00:00:00.000000+09:10")
+        self.check(parse, self.values)
+        self.check_bad(parse, self.bad_values)
+        self.assertRaises(ValueError, make_datetime_parser, "garbage")
+
+    def test_parser_cache(self):
+        parse = make_datetime_parser(cache_size=3)
+        self.check(parse, self.values * 2)
+        self.check_bad(parse, self.bad_values)
+        self.assert_(parse("2010/02/03") is parse("2010/02/03"))
+        self.assertEqual(parse("2010/02/03"), make_datetime("2010/02/03"))
+
+    def test_lru_cache(self):
+        cache = netsa.data.times._lru_cache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        cache.put('a', 4)
+        cache.put('d', 5)
+        self.assertEqual(cache.get('c'), None)
+        self.assertEqual(cache.get('a'), 4)
+        self.assertEqual(cache.get('d'), 5)
+
+class EpochBinTest(unittest.TestCase):
+
+    sizes = [timedelta(seconds=1), timedelta(seconds=7), timedelta(minutes=5),
+             timedelta(hours=3), timedelta(days=1), timedelta(days=7)]
+
+    epochs = [netsa.data.times.DT_EPOCH, dow_epoch(2),
+              datetime(2010, 2, 3, 4, 5, 6, tzinfo=netsa.data.times.utc)]
+
+    def times(self):
+        rand = random.Random(1)
+        return [rand.randint(-10**9, 2 * 10**9) for i in xrange(200)]
+
+    def test_bin_epoch_matches_date_bin(self):
+        times = self.times()
+        for size in self.sizes:
+            for epoch in self.epochs:
+                snapper = DateSnapper(size, epoch)
+                for t in times:
+                    expected = snapper.date_bin(t)
+                    b = bin_epoch(size, t, epoch)
+                    self.assertEqual(make_datetime(b), expected)
+                    self.assertEqual(snapper.epoch_bin(t), b)
+                    b = bin_epoch(size, t * 1000 + 999, epoch, msec=True)
+                    self.assertEqual(b, bin_epoch(size, t, epoch) * 1000)
+                    self.assertEqual(
+                        snapper.epoch_bin(t * 1000 + 999, msec=True), b)
+
+    def test_bin_epoch_int_params(self):
+        self.assertEqual(bin_epoch(300, 1265169906), 1265169900)
+        self.assertEqual(bin_epoch(300, 1265169906, 1), 1265169901)
+        self.assertEqual(bin_epoch(300, 1265169906789, 0, msec=True),
+                         1265169906600)
+        self.assertEqual(bin_epoch(300000, 1265169906789, 0, msec=True),
+                         1265169900000)
+        self.assertEqual(bin_epoch(timedelta(milliseconds=250),
+                                   1265169906789, msec=True),
+                         1265169906750)
+        self.assertRaises(ValueError, bin_epoch, timedelta(0), 1265169906)
+
+    def test_bin_epoch_sub_second(self):
+        # Sub-second sizes are kept in msec mode, but not by bin_datetime
+        size = timedelta(seconds=1, milliseconds=500)
+        self.assertEqual(bin_epoch(size, 1265169906789, 0, msec=True),
+                         1265169906000)
+        self.assertEqual(bin_epoch(size, 1265169907789, 0, msec=True),
+                         1265169907500)
+        self.assertEqual(bin_epoch(size, 1265169907),
+                         bin_epoch(timedelta(seconds=1), 1265169907))
+        self.assertEqual(
+            make_datetime(bin_epoch(size, 1265169907)),
+            bin_datetime(size, make_datetime(1265169907)))
+        # Epochs are truncated to whole seconds or milliseconds
+        epoch = datetime(2010, 2, 3, 4, 5, 6, 1500,
+                         tzinfo=netsa.data.times.utc)
+        self.assertEqual(bin_epoch(300000, 1265169906789, epoch, msec=True),
+                         1265169906001)
+        self.assertEqual(bin_epoch(300, 1265169907, epoch), 1265169906)
+
+    def test_bin_epoch_many(self):
+        times = self.times()
+        size = timedelta(minutes=5)
+        epoch = dow_epoch(2)
+        expected = [bin_epoch(size, t, epoch) for t in times]
+        result = bin_epoch_many(size, times, epoch)
+        self.assertEqual(result, expected)
+        result = bin_epoch_many(size, array.array('l', times), epoch)
+        self.assertEqual(result, array.array('l', expected))
+        snapper = DateSnapper(size, epoch)
+        self.assertEqual(snapper.epoch_bin_many(times), expected)
+        self.assertEqual(snapper.epoch_bin_many(iter(times)), expected)
+
+class CalendarSnapperTest(unittest.TestCase):
+
+    def times(self):
+        rand = random.Random(2)
+        return [make_datetime(rand.randint(-3 * 10**9, 5 * 10**9))
+                for i in xrange(500)]
+
+    def utc(self, *args):
+        return datetime(*args, **{'tzinfo': netsa.data.times.utc})
+
+    def check(self, snapper, expected_bin):
+        for t in self.times():
+            b = snapper.date_bin(t)
+            self.assertEqual(b, expected_bin(t), t)
+            self.assert_(b <= t < snapper.next_date_bin(t))
+            self.assertEqual(snapper.date_bin(snapper.next_date_bin(t)),
+                             snapper.next_date_bin(t))
+            self.assertEqual(snapper.next_date_bin(snapper.prior_date_bin(t)),
+                             b)
+            self.assert_(snapper.date_aligned(b))
+            e = netsa.data.times.epoch_usec(t) // 1000000
+            self.assertEqual(make_datetime(snapper.epoch_bin(e)), b)
+
+    def test_month(self):
+        self.check(CalendarSnapper('month'),
+                   lambda t: self.utc(t.year, t.month, 1))
+
+    def test_quarter(self):
+        self.check(CalendarSnapper('quarter'),
+                   lambda t: self.utc(t.year, (t.month - 1) // 3 * 3 + 1, 1))
+
+    def test_year(self):
+        self.check(CalendarSnapper('yearly'), lambda t: self.utc(t.year, 1, 1))
+
+    def test_fiscal_year(self):
+        def fiscal(t):
+            if t.month >= 10:
+                return self.utc(t.year, 10, 1)
+            return self.utc(t.year - 1, 10, 1)
+        self.check(CalendarSnapper('year', epoch="2009-10-15"), fiscal)
+
+    def test_two_months(self):
+        self.check(CalendarSnapper('month', 2, epoch="2010-02-01"),
+                   lambda t: self.utc(t.year, (t.month - 2) // 2 * 2 + 2, 1)
+                   if t.month > 1 else self.utc(t.year - 1, 12, 1))
+
+    def test_week(self):
+        def week(t):
+            d = t.date() - timedelta(days=t.weekday())
+            return self.utc(d.year, d.month, d.day)
+        self.check(CalendarSnapper('week'), week)
+
+    def test_growth(self):
+        # Each bin boundary is computed only once as the tables grow
+        snapper = CalendarSnapper('week')
+        calls = []
+        bin_start = snapper._bin_start
+        def counting_bin_start(k):
+            calls.append(k)
+            return bin_start(k)
+        snapper._bin_start = counting_bin_start
+        for t in self.times():
+            snapper.date_bin(t)
+        self.assertEqual(len(calls), len(set(calls)))
+        self.assertEqual(len(snapper._bins), 65 + len(calls))
+        self.assertEqual(snapper._bins,
+                         [bin_start(k) for k in xrange(
+                             snapper._first_k,
+                             snapper._first_k + len(snapper._bins))])
+        self.assertEqual(snapper._starts,
+                         [netsa.data.times.epoch_usec(b) // 1000000
+                          for b in snapper._bins])
+
+    def test_no_size(self):
+        snapper = CalendarSnapper('quarter')
+        self.assertEqual(snapper.size, None)
+        self.assertRaises(NotImplementedError, snapper._epoch_params, False)
+        self.assertEqual(snapper.epoch_bin_many([1265169906]), [1262304000])
+        self.assertEqual(snapper.date_bin_many(["2010-02-03"]),
+                         [self.utc(2010, 1, 1)])
+        self.assertEqual(snapper.date_bin_end("2010-02-03"),
+                         self.utc(2010, 3, 31, 23, 59, 59))
+
+    def test_sequencer(self):
+        snapper = CalendarSnapper('month')
+        dates = [self.utc(2009, 11, 15), self.utc(2010, 2, 3)]
+        self.assertEqual(
+            list(snapper.date_sequencer(dates)),
+            [(self.utc(2009, 11, 1), dates[0]),
+             (self.utc(2009, 12, 1), dates[0]),
+             (self.utc(2010, 1, 1), dates[0]),
+             (self.utc(2010, 2, 1), dates[1])])
+
+    def test_clumper(self):
+        snapper = CalendarSnapper('quarter')
+        ranges = [("2001-02-03", "2001-05-06"),
+                  ("2001-06-01", "2001-08-01"),
+                  ("2020-01-01", "2020-01-02"),
+                  ("1995-12-31", "1996-01-01")]
+        self.assertEqual(
+            list(snapper.date_clumper(ranges)),
+            [(self.utc(1995, 10, 1), self.utc(1996, 1, 1)),
+             (self.utc(2001, 1, 1), self.utc(2001, 7, 1)),
+             (self.utc(2020, 1, 1), self.utc(2020, 1, 1))])
+        self.assertEqual(snapper.date_bin_end("2001-02-03"),
+                         self.utc(2001, 3, 31, 23, 59, 59))
+
+    def test_epoch_bin_many(self):
+        snapper = CalendarSnapper('month')
+        times = [1265169906, 0, -1, 1265169906000]
+        self.assertEqual(snapper.epoch_bin_many(times[:3]),
+                         [1264982400, 0, -2678400])
+        self.assertEqual(snapper.epoch_bin(times[3], msec=True),
+                         1264982400000)
+        self.assertEqual(snapper.epoch_bin_many(array.array('l', times[:3])),
+                         array.array('l', [1264982400, 0, -2678400]))
+
+    def test_errors(self):
+        self.assertRaises(ValueError, CalendarSnapper, 'fortnight')
+        self.assertRaises(ValueError, CalendarSnapper, 'month', 0)
+        snapper = CalendarSnapper('year')
+        self.assertRaises(OverflowError, snapper.next_date_bin,
+                          "9999-06-01")
+        self.assertEqual(snapper.date_bin("9998-06-01"),
+                         self.utc(9998, 1, 1))
+
+def overlay_clumper(snapper, date_ranges):
+    """
+    The original counting implementation of DateSnapper.date_clumper,
+    for comparison.
+    """
+    overlay = {}
+    for drange in date_ranges:
+        if isinstance(drange, basestring):
+            drange = make_datetime(drange)
+            begin = snapper.date_bin(drange)
+            end = snapper.next_date_bin(begin)
+        elif isinstance(drange, datetime):
+            begin = end = snapper.date_bin(drange)
+        else:
+            (begin, end) = sorted([snapper.date_bin(x) for x in drange])
+        overlay[begin] = overlay.get(begin, 0) + 1
+        end_plus = snapper.next_date_bin(end)
+        overlay[end_plus] = overlay.get(end_plus, 0) - 1
+    result = []
+    begin = None
+    in_range = 0
+    for date in sorted(overlay):
+        if not overlay[date]:
+            continue
+        if begin is None:
+            begin = date
+        in_range += overlay[date]
+        if not in_range:
+            result.append((begin, snapper.prior_date_bin(date)))
+            begin = None
+    return result
+
+class ClumperTest(unittest.TestCase):
+
+    snappers = [DateSnapper(timedelta(hours=1)),
+                DateSnapper(timedelta(days=7), dow_epoch(3)),
+                CalendarSnapper('month')]
+
+    def ranges(self, n, seed=0):
+        rand = random.Random(seed)
+        result = []
+        for i in xrange(n):
+            begin = rand.randint(1262304000, 1293839999)
+            end = begin + rand.choice([0, 600, 3600, 86400, 40 * 86400])
+            kind = rand.randint(0, 3)
+            if kind == 0:
+                result.append(make_datetime(begin))
+            elif kind == 1:
+                result.append(
+                    netsa.data.format.datetime_iso(make_datetime(begin)))
+            elif kind == 2:
+                result.append((make_datetime(end), make_datetime(begin)))
+            else:
+                result.append((make_datetime(begin), make_datetime(end)))
+        return result
+
+    def test_clumper_matches_overlay(self):
+        for n in (0, 1, 5, 50, 500):
+            ranges = self.ranges(n, n)
+            for snapper in self.snappers:
+                self.assertEqual(list(snapper.date_clumper(ranges)),
+                                 overlay_clumper(snapper, ranges))
+
+    def test_clumper_presorted(self):
+        ranges = [(make_datetime(x), make_datetime(y)) for (x, y) in
+                  sorted((t, t + 3600) for t in
+                         xrange(1262304000, 1262304000 + 86400 * 100, 50000))]
+        for snapper in self.snappers:
+            self.assertEqual(
+                list(snapper.date_clumper(ranges, presorted=True)),
+                overlay_clumper(snapper, ranges))
+            clumps = snapper.date_clumper(reversed(ranges), presorted=True)
+            self.assertRaises(ValueError, list, clumps)
+
+    def test_clumper_lazy(self):
+        def ranges():
+            yield "2010-01-01T00:00:00"
+            yield "2010-01-01T05:00:00"
+            raise StopIteration
+        snapper = DateSnapper(timedelta(hours=1))
+        clumps = snapper.date_clumper(ranges(), presorted=True)
+        self.assertEqual(clumps.next(),
+                         (make_datetime("2010-01-01T00:00:00"),
+                          make_datetime("2010-01-01T01:00:00")))
+
+    def test_epoch_clumper(self):
+        rand = random.Random(5)
+        ranges = []
+        for i in xrange(300):
+            begin = rand.randint(1262304000, 1293839999)
+            ranges.append((begin, begin + rand.choice([0, 3600, 86400 * 30])))
+        ranges.append(1262304000)
+        for snapper in self.snappers:
+            expected = [(snapper.epoch_bin(netsa.data.times.epoch_usec(a)
+                                           // 1000000),
+                         snapper.epoch_bin(netsa.data.times.epoch_usec(b)
+                                           // 1000000))
+                        for (a, b) in snapper.date_clumper(ranges)]
+            self.assertEqual(list(snapper.epoch_clumper(ranges)), expected)
+            msec_ranges = [(a * 1000 + 999, b * 1000)
+                           for (a, b) in ranges[:-1]]
+            self.assertEqual(
+                list(snapper.epoch_clumper(msec_ranges, msec=True)),
+                [(a * 1000, b * 1000)
+                 for (a, b) in snapper.epoch_clumper(ranges[:-1])])
+
+    def test_date_bin_many(self):
+        rand = random.Random(6)
+        times = sorted(rand.randint(1262304000, 1293839999)
+                       for i in xrange(500))
+        dates = [make_datetime(t) for t in times]
+        for snapper in self.snappers:
+            expected = [snapper.date_bin(d) for d in dates]
+            self.assertEqual(snapper.date_bin_many(dates), expected)
+            self.assertEqual(snapper.date_bin_many(reversed(times)),
+                             list(reversed(expected)))
+            self.assertEqual(list(snapper.date_binner(times)),
+                             zip(expected, times))
@@ -50,6 +50,8 @@ from __future__ import division
 
 from datetime import date, datetime, timedelta, tzinfo
 from calendar import timegm
+import array
+import bisect
 import re
 
 mxDateTime_support = False
@@ -129,6 +131,75 @@ re_old_silk_datetime = re.compile(r"""
 (?:    \. (?P<fsec>\d+) )? )? )? )? $
 """, re.VERBOSE)
 
+def _match_datetime(vs):
+    """
+    Returns the match of the first datetime pattern (ISO, SiLK, or old
+    SiLK) matching the string *vs*, or ``None`` if none match.
+    """
+    return (re_iso_datetime.match(vs) or
+            re_silk_datetime.match(vs) or
+            re_old_silk_datetime.match(vs))
+
+def _match_tz_str(m):
+    """
+    Returns the time zone string of a datetime pattern match.  The SiLK
+    patterns have no time zone, and are always UTC.
+    """
+    try:
+        return m.group('tz')
+    except:
+        return 'Z'
+
+def _make_tz(dt_tz_str):
+    """
+    Returns the :class:`datetime.tzinfo` for a time zone string, or
+    ``None`` if the string is empty.
+    """
+    if dt_tz_str == '' or dt_tz_str is None:
+        return None
+    elif dt_tz_str == 'Z':
+        return utc
+    if len(dt_tz_str) == 3:
+        dt_tz_offset = int(dt_tz_str[1:3]) * 60
+    else:
+        dt_tz_offset = int(dt_tz_str[1:3]) * 60 + int(dt_tz_str[4:6])
+    if dt_tz_str[0] == '-':
+        dt_tz_offset = -dt_tz_offset
+    return tzinfo_fixed(dt_tz_offset)
+
+def _match_to_datetime(m):
+    """
+    Returns the :class:`datetime.datetime` for a datetime pattern
+    match.
+    """
+    dt_year = int(m.group('year'))
+    dt_mon = int(m.group('mon'))
+    dt_day = int(m.group('day'))
+    dt_hour = int(m.group('hour') or 0)
+    dt_min = int(m.group('min') or 0)
+    dt_sec = int(m.group('sec') or 0)
+    dt_usec = int(((m.group('fsec') or '0') + '00000')[:6])
+    dt_tz = _make_tz(_match_tz_str(m))
+    return datetime(dt_year, dt_mon, dt_day, dt_hour, dt_min, dt_sec,
+                    dt_usec, dt_tz)
+
+def _coerce_datetime(v, utc_only):
+    """
+    Returns the :class:`datetime.datetime` *v*, coerced to UTC if
+    *utc_only* is ``True``.
+    """
+    if not utc_only:
+        # allowing non-UTC times, so return it
+        return v
+    elif v.tzinfo is utc:
+        return v
+    elif v.tzinfo == None:
+        # if it's a datetime with no timezone, assume UTC
+        return v.replace(tzinfo=utc)
+    else:
+        # otherwise, convert it to UTC
+        return v.astimezone(utc)
+
 def make_datetime(value, utc_only=True):
     """
 
@@ -152,53 +223,169 @@ def make_datetime(value, utc_only=True):
         return v.replace(tzinfo=utc)
     if isinstance(v, basestring):
         # string representation: parse to datetime, then proceed
-        vs = v.strip()
-        m = (re_iso_datetime.match(vs) or
-             re_silk_datetime.match(vs) or
-             re_old_silk_datetime.match(vs))
+        m = _match_datetime(v.strip())
         if not m:
             raise ValueError("Could not parse %s as a datetime" % repr(v))
-        dt_year = int(m.group('year'))
-        dt_mon = int(m.group('mon'))
-        dt_day = int(m.group('day'))
-        dt_hour = int(m.group('hour') or 0)
-        dt_min = int(m.group('min') or 0)
-        dt_sec = int(m.group('sec') or 0)
-        dt_usec = int(((m.group('fsec') or '0') + '00000')[:6])
-        try:
-            dt_tz_str = m.group('tz')
-        except:
-            dt_tz_str = 'Z'
-        if dt_tz_str == '' or dt_tz_str is None:
-            dt_tz = None
-        elif dt_tz_str == 'Z':
-            dt_tz = utc
-        else:
-            if len(dt_tz_str) == 3:
-                dt_tz_offset = int(dt_tz_str[1:3]) * 60
-            else:
-                dt_tz_offset = int(dt_tz_str[1:3]) * 60 + int(dt_tz_str[4:6])
-            if dt_tz_str[0] == '-':
-                dt_tz_offset = -dt_tz_offset
-            dt_tz = tzinfo_fixed(dt_tz_offset)
-        v = datetime(dt_year, dt_mon, dt_day, dt_hour, dt_min, dt_sec,
-                     dt_usec, dt_tz)
+        v = _match_to_datetime(m)
     if isinstance(v, datetime):
         # datetime object
-        if not utc_only:
-            # allowing non-UTC times, so return it
-            return v
-        else:
-            # normalize to UTC
-            if v.tzinfo == None:
-                # if it's a datetime with no timezone, assume UTC
-                return v.replace(tzinfo=utc)
-            else:
-                # otherwise, convert it to UTC
-                return v.astimezone(utc)
+        return _coerce_datetime(v, utc_only)
     value_error = ValueError("can't interpret %s as a datetime" % repr(value))
     raise value_error
 
+# Translation table mapping every digit to '0', so that two strings
+# with the same layout of digits and other characters translate to the
+# same string.
+_digit_mask = ''.join([(c.isdigit() and '0') or c
+                       for c in map(chr, xrange(256))])
+
+class _datetime_shape(object):
+    """
+    The layout of a datetime string matched by one of the datetime
+    patterns: its length, its non-digit characters, and the span of
+    each field.  The patterns only distinguish digits from other
+    characters, so any string with the same layout is matched by the
+    same pattern with the same spans, and can be parsed by slicing.
+    """
+    __slots__ = ['length', 'key', 'spans', 'zeros', 'fsec',
+                 'tz', 'tz_pos', 'tz_str']
+    def __init__(self, vs, m):
+        self.length = len(vs)
+        self.key = vs.translate(_digit_mask)
+        self.spans = [m.span(g) for g in
+                      ('year', 'mon', 'day', 'hour', 'min', 'sec')
+                      if m.group(g) is not None]
+        self.zeros = [0] * (6 - len(self.spans))
+        if m.group('fsec') is None:
+            self.fsec = None
+        else:
+            self.fsec = m.span('fsec')
+        tz_str = _match_tz_str(m)
+        self.tz = _make_tz(tz_str)
+        if self.tz is None or self.tz is utc:
+            self.tz_pos = None
+            self.tz_str = None
+        else:
+            # The offset's digits are masked in the key, so check them
+            # separately.
+            self.tz_pos = m.start('tz')
+            self.tz_str = tz_str
+    def matches(self, vs):
+        return (len(vs) == self.length and
+                vs.translate(_digit_mask) == self.key and
+                (self.tz_pos is None or vs[self.tz_pos:] == self.tz_str))
+    def parse(self, vs):
+        fields = [int(vs[a:b]) for (a, b) in self.spans]
+        fields.extend(self.zeros)
+        if self.fsec is None:
+            fields.append(0)
+        else:
+            (a, b) = self.fsec
+            fields.append(int((vs[a:b] + '00000')[:6]))
+        fields.append(self.tz)
+        return datetime(*fields)
+
+class _lru_cache(object):
+    """
+    A mapping holding at most *size* entries, discarding the least
+    recently used entry when full.  Entries are kept in a circular
+    doubly-linked list of ``[prev, next, key, value]`` links, most
+    recently used last.
+    """
+    __slots__ = ['size', 'links', 'root']
+    def __init__(self, size):
+        self.size = size
+        self.links = {}
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+    def get(self, key, default=None):
+        link = self.links.get(key)
+        if link is None:
+            return default
+        (prev, next) = link[:2]
+        prev[1] = next
+        next[0] = prev
+        root = self.root
+        last = root[0]
+        last[1] = root[0] = link
+        link[0] = last
+        link[1] = root
+        return link[3]
+    def put(self, key, value):
+        root = self.root
+        if key in self.links:
+            self.links[key][3] = value
+            self.get(key)
+            return
+        if len(self.links) >= self.size:
+            oldest = root[1]
+            root[1] = oldest[1]
+            oldest[1][0] = root
+            del self.links[oldest[2]]
+        last = root[0]
+        link = [last, root, key, value]
+        last[1] = root[0] = self.links[key] = link
+    def __len__(self):
+        return len(self.links)
+
+def make_datetime_parser(format_hint=None, utc_only=True, cache_size=0):
+    """
+    Returns a function which converts a value to a
+    :class:`datetime.datetime` exactly as :func:`make_datetime` does,
+    but which is faster when parsing many strings in the same format.
+
+    The first string parsed (or *format_hint*, an example datetime
+    string, if given) fixes the expected layout of digits and
+    separators.  Later strings with the same layout are parsed by
+    slicing the fields out directly instead of by pattern matching.  A
+    string with a different layout is parsed as usual by
+    :func:`make_datetime`, and its layout becomes the new expected
+    layout.
+
+    If *cache_size* is non-zero, up to that many of the most recently
+    used strings and their results are remembered, which helps when
+    the same timestamps are repeated many times (as in SiLK output
+    binned to the second).
+
+    Raises :exc:`ValueError` if *format_hint* cannot be parsed.
+    """
+    shape = [None]
+    if format_hint is not None:
+        vs = format_hint.strip()
+        m = _match_datetime(vs)
+        if not m:
+            value_error = ValueError(
+                "Could not parse %s as a datetime" % repr(format_hint))
+            raise value_error
+        if type(vs) is str:
+            shape[0] = _datetime_shape(vs, m)
+    def parse_str(v):
+        vs = v.strip()
+        s = shape[0]
+        if s is not None and s.matches(vs):
+            return _coerce_datetime(s.parse(vs), utc_only)
+        m = _match_datetime(vs)
+        if not m:
+            raise ValueError("Could not parse %s as a datetime" % repr(v))
+        shape[0] = _datetime_shape(vs, m)
+        return _coerce_datetime(_match_to_datetime(m), utc_only)
+    if cache_size:
+        cache = _lru_cache(cache_size)
+        def parse(value):
+            if type(value) is not str:
+                return make_datetime(value, utc_only)
+            result = cache.get(value)
+            if result is None:
+                result = parse_str(value)
+                cache.put(value, result)
+            return result
+    else:
+        def parse(value):
+            if type(value) is not str:
+                return make_datetime(value, utc_only)
+            return parse_str(value)
+    return parse
+
 def normalize_datetime(v):
     """
     Coerces a datetime object to UTC if it is not already.
@@ -259,6 +446,72 @@ def bin_datetime(dt, t, z=DT_EPOCH):
     rs = (tzs // dts) * dts
     return z + timedelta(seconds=rs)
 
+def _epoch_bin_params(size, epoch, msec):
+    """
+    Returns the bin *size* (a :class:`datetime.timedelta` or an
+    integer) and *epoch* (a :class:`datetime.datetime` or an integer)
+    as integers in seconds, or in milliseconds if *msec* is ``True``.
+    """
+    if isinstance(size, timedelta):
+        if msec:
+            size = ((size.days * 86400 + size.seconds) * 1000 +
+                    size.microseconds // 1000)
+        else:
+            size = size.days * 86400 + size.seconds
+    if isinstance(epoch, datetime):
+        epoch = epoch_usec(normalize_datetime(epoch))
+        if msec:
+            epoch //= 1000
+        else:
+            epoch //= 1000000
+    size = abs(size)
+    if not size:
+        raise ValueError("bin size must be non-zero")
+    return (size, epoch)
+
+def bin_epoch(size, t, epoch=DT_EPOCH, msec=False):
+    """
+    Returns the floor of the integer time *t* (seconds from the UNIX
+    epoch, or milliseconds if *msec* is ``True``) in a *size*-sized
+    bin, as an integer in the same units.  *size* may be a
+    :class:`datetime.timedelta` or an integer in the same units as
+    *t*, and the bins are anchored at *epoch*, which may be a
+    :class:`datetime.datetime` or an integer.  For example::
+
+        bin_epoch(timedelta(minutes=5), 1265169906)
+
+    returns ``1265169900``.  The result is the same as
+    :func:`bin_datetime` (or :meth:`DateSnapper.date_bin`) would give
+    for the same time, without constructing any
+    :class:`datetime.datetime` objects.
+
+    The two differ only below one second.  :func:`bin_datetime`
+    ignores any fraction of a second in its bin size, but if *msec*
+    is ``True`` a :class:`datetime.timedelta` *size* keeps its whole
+    milliseconds, so sub-second bins are possible.  A
+    :class:`datetime.datetime` *epoch* is truncated to a whole second,
+    or to a whole millisecond if *msec* is ``True``.
+    """
+    (size, epoch) = _epoch_bin_params(size, epoch, msec)
+    return t - (t - epoch) % size
+
+def bin_epoch_many(size, values, epoch=DT_EPOCH, msec=False):
+    """
+    Like :func:`bin_epoch`, but bins every integer time in *values*.
+    If *values* is an :class:`array.array`, returns an array of the
+    same type; if it is a NumPy array, the binning is done with NumPy
+    array arithmetic and a NumPy array is returned; otherwise returns
+    a list.
+    """
+    (size, epoch) = _epoch_bin_params(size, epoch, msec)
+    if hasattr(values, '__array_interface__'):
+        # NumPy (or compatible) array: vectorized arithmetic
+        return values - (values - epoch) % size
+    result = [t - (t - epoch) % size for t in values]
+    if isinstance(values, array.array):
+        return array.array(values.typecode, result)
+    return result
+
 re_iso_duration = re.compile(r"""
     ^ (?P<sign>[+-])?
     P
@@ -371,6 +624,33 @@ def dow_day_snapper(size, dow=0, z=DT_EPOCH):
     """
     return DateSnapper(timedelta(days=size), epoch=dow_epoch(dow))
 
+def _merge_bin_ranges(ranges, next_bin):
+    """
+    Given ``(begin_bin, end_bin)`` pairs sorted by *begin_bin*, and a
+    function *next_bin* returning the bin following a given bin, yields
+    the ``(first_bin, last_bin)`` ranges covering their union, merging
+    ranges which overlap or are adjacent.
+    """
+    first = last = after = None
+    for (begin, end) in ranges:
+        if first is None:
+            (first, last) = (begin, end)
+            after = next_bin(last)
+        elif begin < first:
+            value_error = ValueError(
+                "date ranges not sorted: %r before %r" % (first, begin))
+            raise value_error
+        elif begin <= after:
+            if end > last:
+                last = end
+                after = next_bin(last)
+        else:
+            yield (first, last)
+            (first, last) = (begin, end)
+            after = next_bin(last)
+    if first is not None:
+        yield (first, last)
+
 class DateSnapper(object):
     """
     Class for date bin manipulations
@@ -396,6 +676,38 @@ class DateSnapper(object):
         """
         return bin_datetime(self.size, make_datetime(date), z=self.epoch)
 
+    def epoch_bin(self, t, msec=False):
+        """
+        Returns the beginning of the date bin containing the integer
+        time *t* (seconds from the UNIX epoch, or milliseconds if
+        *msec* is ``True``), as an integer in the same units.
+
+        See :func:`bin_epoch` for more details.
+        """
+        (size, epoch) = self._epoch_params(msec)
+        return t - (t - epoch) % size
+
+    def epoch_bin_many(self, values, msec=False):
+        """
+        Returns the beginning of the date bin containing each integer
+        time in *values*, as by :meth:`epoch_bin`.
+
+        See :func:`bin_epoch_many` for more details.
+        """
+        (size, epoch) = self._epoch_params(msec)
+        return bin_epoch_many(size, values, epoch)
+
+    def _epoch_params(self, msec):
+        key = (self.size, self.epoch, msec)
+        try:
+            if self._epoch_cache[0] == key:
+                return self._epoch_cache[1]
+        except AttributeError:
+            pass
+        params = _epoch_bin_params(self.size, self.epoch, msec)
+        self._epoch_cache = (key, params)
+        return params
+
     def date_aligned(self, date):
         """
         Tests whether or not the provided date is the beginning
@@ -445,51 +757,90 @@ class DateSnapper(object):
         """
         return self.next_date_bin(date) - timedelta(seconds=1)
 
-    def date_clumper(self, date_ranges):
+    def date_clumper(self, date_ranges, presorted=False):
         """
         Given a list of date ranges, return a list of date bins that
         intersect the union of the given date ranges. Each date range in
         the provided list can be a single datetime descriptor or a tuple
-        representing a beginning and end datetime for the range.
+        representing a beginning and end datetime for the range.  The
+        result is an iterator over ``(first_bin, last_bin)`` tuples in
+        sorted order, with overlapping and adjacent bins merged.
+
+        The ranges are sorted before merging, unless *presorted* is
+        ``True``, in which case the ranges must already be sorted by
+        their beginning dates, and the merged ranges are produced as
+        the input is consumed.  :exc:`ValueError` is raised if
+        presorted ranges are out of order.
 
         See :func:`make_datetime` for more detail on acceptable
         formats for date descriptors.
         """
-        overlay = {}
-        for drange in date_ranges:
-            if isinstance(drange, basestring):
-                drange = make_datetime(drange)
-                begin  = self.date_bin(drange)
-                end    = self.next_date_bin(begin)
-            elif isinstance(drange, datetime):
-                begin = self.date_bin(drange)
-                end   = begin
-            else:
-                (begin, end) = sorted([self.date_bin(x) for x in drange])
-            sib = None
-            try:
-                overlay[begin] += 1
-                if overlay[begin] == 0:
-                    del overlay[begin]
-            except KeyError:
-                overlay[begin] = 1
-            end_plus = self.next_date_bin(end)
-            try:
-                overlay[end_plus] -= 1
-                if overlay[end_plus] == 0:
-                    del overlay[end_plus]
-            except KeyError:
-                overlay[end_plus] = -1
-        begin = None
-        in_range = 0
-        for date in sorted(overlay):
-            count = overlay[date]
-            if begin == None:
-                begin = date
-            in_range += count
-            if not in_range:
-                yield (begin, self.prior_date_bin(date))
-                begin = None
+        (date_bin, next_bin) = self._bin_functions()
+        def ranges():
+            for drange in date_ranges:
+                if isinstance(drange, basestring):
+                    begin = date_bin(drange)
+                    end = next_bin(begin)
+                elif isinstance(drange, (datetime, int, long, float)):
+                    begin = end = date_bin(drange)
+                else:
+                    (begin, end) = sorted([date_bin(x) for x in drange])
+                yield (begin, end)
+        if presorted:
+            return _merge_bin_ranges(ranges(), next_bin)
+        return _merge_bin_ranges(sorted(ranges()), next_bin)
+
+    def epoch_clumper(self, epoch_ranges, msec=False, presorted=False):
+        """
+        Like :meth:`date_clumper`, but for integer times (seconds from
+        the UNIX epoch, or milliseconds if *msec* is ``True``).  Each
+        item of *epoch_ranges* is either a single time or a ``(begin,
+        end)`` pair, and the result is an iterator over ``(first_bin,
+        last_bin)`` tuples of integer times in the same units.
+        """
+        (epoch_bin, next_bin) = self._epoch_bin_functions(msec)
+        def ranges():
+            for erange in epoch_ranges:
+                if isinstance(erange, (int, long)):
+                    begin = end = epoch_bin(erange)
+                else:
+                    (begin, end) = sorted([epoch_bin(x) for x in erange])
+                yield (begin, end)
+        if presorted:
+            return _merge_bin_ranges(ranges(), next_bin)
+        return _merge_bin_ranges(sorted(ranges()), next_bin)
+
+    def _bin_functions(self):
+        """
+        Returns a pair of functions equivalent to :meth:`date_bin` and
+        :meth:`next_date_bin` (for dates already at the beginning of a
+        bin), specialized for this snapper's size and epoch.
+        """
+        size = self.size
+        epoch = self.epoch
+        size_secs = size.days * 86400 + size.seconds
+        def date_bin(date):
+            if type(date) is not datetime or date.tzinfo is not utc:
+                date = normalize_datetime(make_datetime(date))
+            d = date - epoch
+            s = d.days * 86400 + d.seconds
+            return epoch + timedelta(seconds=s - s % size_secs)
+        def next_bin(bin):
+            return bin + size
+        return (date_bin, next_bin)
+
+    def _epoch_bin_functions(self, msec):
+        """
+        Returns a pair of functions equivalent to :meth:`epoch_bin` and
+        its next-bin counterpart, specialized for this snapper's size
+        and epoch.
+        """
+        (size, epoch) = self._epoch_params(msec)
+        def epoch_bin(t):
+            return t - (t - epoch) % size
+        def next_bin(bin):
+            return bin + size
+        return (epoch_bin, next_bin)
 
     def date_binner(self, dates):
         """
@@ -502,8 +853,25 @@ class DateSnapper(object):
         See :func:`make_datetime` for more detail on acceptable
         formats for datetime descriptors.
         """
+        (date_bin, next_bin) = self._bin_functions()
+        bin = bin_end = None
         for date in dates:
-            yield(self.date_bin(date), date)
+            t = make_datetime(date)
+            # Successive dates usually fall in the same bin, so check
+            # the previous bin before binning from scratch.
+            if bin is None or not (bin <= t < bin_end):
+                bin = date_bin(t)
+                bin_end = next_bin(bin)
+            yield (bin, date)
+
+    def date_bin_many(self, dates):
+        """
+        Returns a list of the beginning of the date bin containing each
+        date in *dates*.  This is faster than calling :meth:`date_bin`
+        for each date, especially when successive dates tend to fall in
+        the same bin.
+        """
+        return [bin for (bin, date) in self.date_binner(dates)]
 
     def date_sequencer(self, date_list):
         """
@@ -543,17 +911,220 @@ class DateSnapper(object):
             prior_date = date
             yield(bin, date)
 
+# Calendar units accepted by CalendarSnapper, as (months, days) per bin
+_calendar_units = {
+    'mon': (1, None), 'month': (1, None), 'months': (1, None),
+    'monthly': (1, None),
+    'quarter': (3, None), 'quarters': (3, None), 'quarterly': (3, None),
+    'year': (12, None), 'years': (12, None), 'yearly': (12, None),
+    'annual': (12, None),
+    'week': (None, 7), 'weeks': (None, 7), 'weekly': (None, 7),
+}
+
+class CalendarSnapper(DateSnapper):
+    """
+    Class for calendar date bin manipulations
+    """
+    def __init__(self, unit, count=1, epoch=DT_EPOCH):
+        """
+        Returns a :class:`CalendarSnapper` object that bins dates in
+        bins of *count* calendar months, quarters, years, or ISO weeks
+        (given by *unit* as ``'month'``, ``'quarter'``, ``'year'``, or
+        ``'week'``), with the same interface as :class:`DateSnapper`.
+
+        Month, quarter, and year bins begin at midnight on the first
+        day of a month, and the optional *epoch* selects which months
+        begin bins: for example, ``CalendarSnapper('year',
+        epoch=datetime(2009, 10, 1))`` bins by fiscal years beginning
+        in October.  Week bins begin at midnight on a Monday.  For
+        multi-bin sizes, the bins are counted from the bin containing
+        *epoch*.
+
+        Bins are looked up in a table of bin boundaries which grows as
+        needed, so stepping through many bins is cheap.  Since calendar
+        bins vary in length, the *size* attribute is ``None``.
+
+        Raises :exc:`ValueError` if *unit* or *count* is invalid.
+        """
+        try:
+            (months, days) = _calendar_units[unit.strip().lower()]
+        except KeyError:
+            value_error = ValueError("unknown calendar unit: %r" % unit)
+            raise value_error
+        if count < 1:
+            raise ValueError("calendar bin count must be at least 1")
+        self.unit = unit
+        self.count = count
+        self.size = None
+        self.epoch = make_datetime(epoch)
+        if months:
+            self._months = months * count
+            self._days = None
+            self._base = self.epoch.year * 12 + self.epoch.month - 1
+            # k ranges over bins beginning in years 1 through 9999
+            self._min_k = -((self._base - 12) // self._months)
+            self._max_k = (12 * 10000 - 1 - self._base) // self._months
+        else:
+            self._months = None
+            self._days = days * count
+            self._base = (self.epoch.date().toordinal() -
+                          self.epoch.weekday())
+            self._min_k = -((self._base - 1) // self._days)
+            self._max_k = (date.max.toordinal() - self._base) // self._days
+        self._first_k = 0
+        self._bins = []
+        self._starts = []
+        self._cover(-32, 32)
+
+    def _bin_start(self, k):
+        """
+        Returns the beginning of the *k*'th bin after the bin
+        containing the epoch.
+        """
+        if self._months:
+            m = self._base + k * self._months
+            return datetime(m // 12, m % 12 + 1, 1, tzinfo=utc)
+        else:
+            d = date.fromordinal(self._base + k * self._days)
+            return datetime(d.year, d.month, d.day, tzinfo=utc)
+
+    def _cover(self, lo_k, hi_k):
+        """
+        Extends the boundary tables to hold bins *lo_k* through *hi_k*,
+        as far as the range of :class:`datetime.datetime` allows.
+        Returns ``False`` if the tables could not be extended.
+        """
+        lo_k = max(lo_k, self._min_k)
+        hi_k = min(hi_k, self._max_k)
+        if not self._bins:
+            self._first_k = lo_k
+            self._bins = [self._bin_start(k) for k in xrange(lo_k, hi_k + 1)]
+            self._starts = [timegm(b.utctimetuple()) for b in self._bins]
+            return True
+        first_k = self._first_k
+        last_k = first_k + len(self._bins) - 1
+        grown = False
+        # Only compute the new bins, and splice them onto either end
+        if lo_k < first_k:
+            head = [self._bin_start(k) for k in xrange(lo_k, first_k)]
+            self._bins[0:0] = head
+            self._starts[0:0] = [timegm(b.utctimetuple()) for b in head]
+            self._first_k = lo_k
+            grown = True
+        if hi_k > last_k:
+            tail = [self._bin_start(k) for k in xrange(last_k + 1, hi_k + 1)]
+            self._bins.extend(tail)
+            self._starts.extend(timegm(b.utctimetuple()) for b in tail)
+            grown = True
+        return grown
+
+    def _index(self, t, table):
+        """
+        Returns the index in the named boundary *table* (``'_bins'``
+        or ``'_starts'``) of the bin containing *t*, growing the tables
+        as needed so that the prior and next bins are present too.
+        """
+        bins = getattr(self, table)
+        while t < bins[1] or t >= bins[-1]:
+            n = len(bins)
+            if t < bins[1]:
+                grown = self._cover(self._first_k - n, self._first_k)
+            else:
+                grown = self._cover(self._first_k, self._first_k + 2 * n)
+            if not grown:
+                raise OverflowError("date value out of range")
+            bins = getattr(self, table)
+        return bisect.bisect_right(bins, t) - 1
+
+    def date_bin(self, date):
+        """
+        Returns a :class:`datetime.datetime` object representing the
+        beginning of the calendar bin containing the provided date.
+
+        See :func:`make_datetime` for more detail on acceptable
+        formats for date descriptors.
+        """
+        i = self._index(make_datetime(date), '_bins')
+        return self._bins[i]
+
+    def next_date_bin(self, date):
+        """
+        Returns a :class:`datetime.datetime` object representing the
+        beginning of the calendar bin following the bin in which the
+        given date resides.
+        """
+        i = self._index(make_datetime(date), '_bins')
+        return self._bins[i + 1]
+
+    def prior_date_bin(self, date):
+        """
+        Returns a :class:`datetime.datetime` object representing the
+        beginning of the calendar bin prior to the bin in which the
+        given date resides.
+        """
+        i = self._index(make_datetime(date), '_bins')
+        return self._bins[i - 1]
+
+    def epoch_bin(self, t, msec=False):
+        """
+        Returns the beginning of the calendar bin containing the
+        integer time *t* (seconds from the UNIX epoch, or milliseconds
+        if *msec* is ``True``), as an integer in the same units.
+        """
+        if msec:
+            i = self._index(t // 1000, '_starts')
+            return self._starts[i] * 1000
+        i = self._index(t, '_starts')
+        return self._starts[i]
+
+    def epoch_bin_many(self, values, msec=False):
+        """
+        Returns the beginning of the calendar bin containing each
+        integer time in *values*, as by :meth:`epoch_bin`.  If
+        *values* is an :class:`array.array`, returns an array of the
+        same type, otherwise returns a list.
+        """
+        epoch_bin = self.epoch_bin
+        result = [epoch_bin(t, msec) for t in values]
+        if isinstance(values, array.array):
+            return array.array(values.typecode, result)
+        return result
+
+    def _epoch_params(self, msec):
+        # Every DateSnapper method that needs a fixed bin size is
+        # overridden above, but fail clearly if one is ever missed.
+        raise NotImplementedError(
+            "CalendarSnapper bins have no fixed size")
+
+    def _bin_functions(self):
+        return (self.date_bin, self.next_date_bin)
+
+    def _epoch_bin_functions(self, msec):
+        def epoch_bin(t):
+            return self.epoch_bin(t, msec)
+        def next_bin(bin):
+            if msec:
+                i = self._index(bin // 1000, '_starts')
+                return self._starts[i + 1] * 1000
+            i = self._index(bin, '_starts')
+            return self._starts[i + 1]
+        return (epoch_bin, next_bin)
+
 ###
     
 __all__ = """
 
     make_datetime
+    make_datetime_parser
     bin_datetime
+    bin_epoch
+    bin_epoch_many
 
     make_timedelta
     divmod_timedelta
 
     DateSnapper
+    CalendarSnapper
     dow_day_snapper
     dow_epoch
 
@@ -537,8 +537,269 @@ class range_set(object):
     def __repr__(self):
         return "range_set(%s)" % repr(self.ranges())
 
+# Helpers for int_range_set.  Each operates on sorted, coalesced
+# ranges held as parallel lists of starts and ends, and returns a new
+# (starts, ends) pair.
+
+def _int_coalesce(ranges):
+    """
+    Given a sorted iterable of ``(start, end)`` integer pairs, returns
+    parallel lists of starts and ends in which overlapping and
+    adjacent ranges have been joined together.
+    """
+    starts = []
+    ends = []
+    for (a, b) in ranges:
+        if ends and a <= ends[-1] + 1:
+            if b > ends[-1]:
+                ends[-1] = b
+        else:
+            starts.append(a)
+            ends.append(b)
+    return (starts, ends)
+
+def _int_union(xs, xe, ys, ye):
+    starts = []
+    ends = []
+    (i, j) = (0, 0)
+    (nx, ny) = (len(xs), len(ys))
+    while i < nx or j < ny:
+        if j >= ny or (i < nx and xs[i] <= ys[j]):
+            (a, b) = (xs[i], xe[i])
+            i += 1
+        else:
+            (a, b) = (ys[j], ye[j])
+            j += 1
+        if ends and a <= ends[-1] + 1:
+            if b > ends[-1]:
+                ends[-1] = b
+        else:
+            starts.append(a)
+            ends.append(b)
+    return (starts, ends)
+
+def _int_intersection(xs, xe, ys, ye):
+    starts = []
+    ends = []
+    (i, j) = (0, 0)
+    (nx, ny) = (len(xs), len(ys))
+    while i < nx and j < ny:
+        a = max(xs[i], ys[j])
+        b = min(xe[i], ye[j])
+        if a <= b:
+            starts.append(a)
+            ends.append(b)
+        if xe[i] < ye[j]:
+            i += 1
+        else:
+            j += 1
+    return (starts, ends)
+
+def _int_difference(xs, xe, ys, ye):
+    starts = []
+    ends = []
+    j = 0
+    ny = len(ys)
+    for i in xrange(len(xs)):
+        (a, b) = (xs[i], xe[i])
+        while j < ny and ye[j] < a:
+            j += 1
+        k = j
+        covered = False
+        while k < ny and ys[k] <= b:
+            if ys[k] > a:
+                starts.append(a)
+                ends.append(ys[k] - 1)
+            if ye[k] >= b:
+                covered = True
+                break
+            a = ye[k] + 1
+            k += 1
+        if not covered:
+            starts.append(a)
+            ends.append(b)
+    return (starts, ends)
+
+def _int_symmetric_difference(xs, xe, ys, ye):
+    (us, ue) = _int_union(xs, xe, ys, ye)
+    (is_, ie) = _int_intersection(xs, xe, ys, ye)
+    return _int_difference(us, ue, is_, ie)
+
+class int_range_set(range_set):
+    """
+    A :class:`range_set` of values whose internal representation (as
+    returned by :meth:`_in_conv`) is an integer.  The ranges are kept
+    as parallel sorted lists of starts and ends, so membership tests
+    use binary search and set operations are simple merges.  Every
+    method that would use the inherited ``_ranges`` slot is overridden
+    to use the lists instead, so that slot is never set.  The
+    :meth:`_in_conv` and :meth:`_out_conv` methods may be overridden to
+    create type-specific subclasses, but :meth:`_cmp`, :meth:`_succ`,
+    :meth:`_pred`, and :meth:`_diff` are not used.
+    """
+    __slots__ = ('_starts', '_ends')
+    def __init__(self, iterable=None):
+        self._starts = []
+        self._ends = []
+        if iterable is not None:
+            (starts, ends) = self._other_ranges(iterable)
+            (self._starts, self._ends) = (list(starts), list(ends))
+    def _range_iter(self, other):
+        if type(self) == type(other):
+            return itertools.izip(other._starts, other._ends)
+        return range_set._range_iter(self, other)
+    def _other_ranges(self, other):
+        """
+        Returns the ranges of *other* as parallel lists of starts and
+        ends, converting via :meth:`_range_iter` unless *other* has the
+        same type as *self*.
+        """
+        if type(self) == type(other):
+            return (other._starts, other._ends)
+        ranges = list(self._range_iter(other))
+        for i in xrange(1, len(ranges)):
+            if ranges[i] < ranges[i-1]:
+                ranges.sort()
+                break
+        return _int_coalesce(ranges)
+    def _op(self, op, other):
+        (ys, ye) = self._other_ranges(other)
+        return op(self._starts, self._ends, ys, ye)
+    def _new(self, ranges):
+        result = self.__class__()
+        (result._starts, result._ends) = ranges
+        return result
+    def __iter__(self):
+        out_conv = self._out_conv
+        for (a, b) in itertools.izip(self._starts, self._ends):
+            while a <= b:
+                yield out_conv(a)
+                a += 1
+    def iterranges(self):
+        out_conv = self._out_conv
+        for (a, b) in itertools.izip(self._starts, self._ends):
+            yield (out_conv(a), out_conv(b))
+    def __len__(self):
+        l = 0
+        for (a, b) in itertools.izip(self._starts, self._ends):
+            l += b - a + 1
+        return l
+    def __nonzero__(self):
+        return bool(self._starts)
+    def __contains__(self, x):
+        x = self._in_conv(x)
+        i = bisect.bisect_right(self._starts, x)
+        return i > 0 and x <= self._ends[i-1]
+    def isdisjoint(self, other):
+        return not self._op(_int_intersection, other)[0]
+    def issubset(self, other):
+        return not self._op(_int_difference, other)[0]
+    def issuperset(self, other):
+        (ys, ye) = self._other_ranges(other)
+        return not _int_difference(ys, ye, self._starts, self._ends)[0]
+    def __lt__(self, other):
+        if not self._check_range(other, "<"): return NotImplemented
+        return self.issubset(other) and not self == other
+    def __gt__(self, other):
+        if not self._check_range(other, ">"): return NotImplemented
+        return self.issuperset(other) and not self == other
+    def __eq__(self, other):
+        if other is None:
+            return False
+        (ys, ye) = self._other_ranges(other)
+        return self._starts == ys and self._ends == ye
+    def __ne__(self, other):
+        return not self == other
+    def union(self, other):
+        return self._new(self._op(_int_union, other))
+    def intersection(self, other):
+        return self._new(self._op(_int_intersection, other))
+    def difference(self, other):
+        return self._new(self._op(_int_difference, other))
+    def symmetric_difference(self, other):
+        return self._new(self._op(_int_symmetric_difference, other))
+    def update(self, other):
+        (self._starts, self._ends) = self._op(_int_union, other)
+    def __ior__(self, other):
+        if not self._check_range(other, "|="): return NotImplemented
+        self.update(other)
+        return self
+    def intersection_update(self, other):
+        (self._starts, self._ends) = self._op(_int_intersection, other)
+    def __iand__(self, other):
+        if not self._check_range(other, "&="): return NotImplemented
+        self.intersection_update(other)
+        return self
+    def difference_update(self, other):
+        (self._starts, self._ends) = self._op(_int_difference, other)
+    def __isub__(self, other):
+        if not self._check_range(other, "-="): return NotImplemented
+        self.difference_update(other)
+        return self
+    def symmetric_difference_update(self, other):
+        (self._starts, self._ends) = self._op(_int_symmetric_difference,
+                                              other)
+    def __ixor__(self, other):
+        if not self._check_range(other, "^="): return NotImplemented
+        self.symmetric_difference_update(other)
+        return self
+    def copy(self):
+        return self._new((list(self._starts), list(self._ends)))
+    def add(self, elem):
+        x = self._in_conv(elem)
+        (starts, ends) = (self._starts, self._ends)
+        i = bisect.bisect_right(starts, x)
+        if i > 0 and x <= ends[i-1] + 1:
+            # Inside or just after range i-1
+            if x <= ends[i-1]:
+                return
+            ends[i-1] = x
+            if i < len(starts) and starts[i] == x + 1:
+                ends[i-1] = ends[i]
+                del starts[i]
+                del ends[i]
+        elif i < len(starts) and starts[i] == x + 1:
+            starts[i] = x
+        else:
+            starts.insert(i, x)
+            ends.insert(i, x)
+    def discard(self, elem):
+        x = self._in_conv(elem)
+        (starts, ends) = (self._starts, self._ends)
+        i = bisect.bisect_right(starts, x) - 1
+        if i < 0 or x > ends[i]:
+            return
+        (a, b) = (starts[i], ends[i])
+        if a == b:
+            del starts[i]
+            del ends[i]
+        elif x == a:
+            starts[i] = x + 1
+        elif x == b:
+            ends[i] = x - 1
+        else:
+            ends[i] = x - 1
+            starts.insert(i + 1, x + 1)
+            ends.insert(i + 1, b)
+    def pop(self):
+        if not self._starts:
+            raise KeyError('pop from an empty int_range_set')
+        b = self._ends[-1]
+        if self._starts[-1] == b:
+            self._starts.pop()
+            self._ends.pop()
+        else:
+            self._ends[-1] = b - 1
+        return self._out_conv(b)
+    def clear(self):
+        self._starts = []
+        self._ends = []
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.ranges())
+
 __all__ = """
 
     range_set
+    int_range_set
 
 """.split()
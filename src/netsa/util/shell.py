@@ -166,6 +166,8 @@ __docformat__ = "restructuredtext en"
 
 import copy
 import errno
+import fcntl
+import heapq
 import netsa
 import os
 import select
@@ -176,6 +178,11 @@ import time
 import traceback
 import threading
 
+from netsa import logging
+from netsa.files import get_temp_pipe_name
+
+log = logging.getLogger("netsa.util.shell")
+
 try:
     MAXFD = os.sysconf("SC_OPEN_MAX")
 except:
@@ -194,13 +201,20 @@ class PipelineException(Exception):
     discovered, including stderr output for each sub-command if
     available.
     """
-    def __init__(self, message, exit_statuses):
+    def __init__(self, message, exit_statuses, resources=None):
         self._message = message
         self._exit_statuses = exit_statuses
+        self._resources = resources
     def get_message(self):
         return self._message
     def get_exit_statuses(self):
         return self._exit_statuses
+    def get_resources(self):
+        """
+        Returns the resources used by each process, in the same shape
+        as the exit statuses.  See :meth:`PipelineRun.get_resources`.
+        """
+        return self._resources
     def __str__(self):
         return str(self._message)
 
@@ -225,6 +239,36 @@ def format_status(status):
     else:
         return "?(%d)" % status
 
+def format_resources(resources):
+    if resources is None:
+        return None
+    fields = ["%.2fs wall" % resources['wall_time']]
+    if resources['user_time'] is not None:
+        fields.append("%.2fs user" % resources['user_time'])
+        fields.append("%.2fs sys" % resources['sys_time'])
+        fields.append("%dKB rss" % resources['max_rss'])
+    if resources['read_bytes'] is not None:
+        fields.append("%dB read" % resources['read_bytes'])
+        fields.append("%dB written" % resources['write_bytes'])
+    return "[%s]" % ', '.join(fields)
+
+def _read_proc_io(pid):
+    """
+    If process *pid* has exited but not been reaped, returns a pair
+    of the total bytes it read and wrote, from ``/proc/pid/io``.
+    Returns ``False`` if it is still running, and raises
+    :exc:`IOError` if ``/proc`` is not available.
+    """
+    stat = open("/proc/%d/stat" % pid).read()
+    # The command name field may contain spaces and parentheses
+    if stat[stat.rindex(')') + 2] != 'Z':
+        return False
+    io = {}
+    for line in open("/proc/%d/io" % pid):
+        (k, v) = line.split(':')
+        io[k] = int(v)
+    return (io['rchar'], io['wchar'])
+
 def format_stream(prefix, stream, append=False):
     if stream is None:
         return None
@@ -276,12 +320,10 @@ class Task(object):
         return self._name
     def wait(self):
         "Wait for this task to complete."
-        self._cond_var.acquire()
-        try:
-            while self.is_running():
-                self._cond_var.wait()
-        finally:
-            self._cond_var.release()
+        if not self._task_groups:
+            self.add_task_group(Task_group())
+        task_group = iter(self._task_groups).next()
+        task_group._supervise(lambda: not self.is_running())
     def _notify_status_change(self):
         self._cond_var.acquire()
         try:
@@ -290,6 +332,24 @@ class Task(object):
                 task_group._check_task(self)
         finally:
             self._cond_var.release()
+    # The following methods are called by the Task_group supervisor
+    # loop, and do nothing for tasks that are not processes.
+    def _get_stderr_fd(self):
+        "File descriptor to watch for error output, or None."
+        return None
+    def _read_stderr(self):
+        "Read available error output, closing the pipe at end of file."
+        pass
+    def _reap(self, signalled=True):
+        """Collect the exit status if the task has exited, without
+        waiting.  *signalled* is false if no child process can have
+        exited since the last call."""
+        pass
+    def _get_deadline(self):
+        "Time at which _check_deadline must be called, or None."
+        return None
+    def _check_deadline(self, now):
+        pass
     def abort(self):
         "Abort processing this task.  Do not wait for abort to complete."
         raise NotImplementedError("Task.abort")
@@ -302,6 +362,27 @@ class Task(object):
     def get_status(self):
         "Human readable status description."
         raise NotImplementedError("Task.get_status")
+    def get_resources(self):
+        """Returns a list of the resources used by each process, in
+        the same order as :meth:`get_exit_status`.  Each is a dict
+        with the following keys, or ``None`` for a process that has
+        not completed:
+
+          *wall_time*
+            Seconds from starting the process until it was reaped.
+          *user_time*, *sys_time*
+            CPU seconds used by the process in user and system mode.
+          *max_rss*
+            Maximum resident set size of the process, in kilobytes.
+          *read_bytes*, *write_bytes*
+            Bytes read and written by the process, through pipes or
+            otherwise.  These are ``None`` unless the *io_accounting*
+            option was given and ``/proc`` is available.
+
+        Only *wall_time* is known for a process that was reaped by
+        someone else.
+        """
+        raise NotImplementedError("Task.get_resources")
     def get_exit_status(self):
         """Returns a list of process exit statuses. For groups of
         tasks, each element represents a process in the group, in
@@ -312,41 +393,275 @@ class Task(object):
         format defined for the :func:`os.wait` function.  Tasks that
         have not been completed (e.g., due to an error in a pipeline
         before the process was run), will have an exit status of
-        ``None``."""
+        ``None``.  A process reaped by someone else, so that its
+        status could not be collected, has an exit status of ``-1``."""
         raise NotImplementedError("Task.get_exit_status")
 
+SUPERVISOR_POLL = 1.0           # Longest wait between checks on children
+SUPERVISOR_THREAD_POLL = 0.05   # The same, when SIGCHLD can't be caught
+
+def _ignore_signal(signum, frame):
+    pass
+
+def _read_nonblocking(fd):
+    """
+    Reads whatever is available from the non-blocking file descriptor
+    *fd*.  Returns ``None`` at end of file.
+    """
+    chunks = []
+    while True:
+        try:
+            data = os.read(fd, 4096)
+        except OSError, e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return ''.join(chunks)
+            raise
+        if data == '':
+            if chunks:
+                return ''.join(chunks)
+            return None
+        chunks.append(data)
+
+class _Sigchld_wakeup(object):
+    """
+    Catches SIGCHLD in the main thread and writes it to a pipe (with
+    :func:`signal.set_wakeup_fd`), so that the supervisor loop can
+    wait for child processes to exit in select().  It is shared by
+    every Task_group, and installed while any of them is using it.
+    *count* counts the wakeups seen, so that each group can tell
+    whether a child has exited since it last looked.
+
+    If another wakeup descriptor is already installed (by an event
+    loop such as asyncio or Twisted, say), it is left alone and the
+    supervisor falls back to polling with short timeouts.
+    """
+    def __init__(self):
+        self.fd = None
+        self.count = 0
+        self._write_fd = None
+        self._users = 0
+        self._thread = None
+        self._old_handler = None
+        self._old_wakeup = None
+    def acquire(self):
+        """
+        Installs the wakeup if needed, returning ``False`` if SIGCHLD
+        can't be caught in this thread.
+        """
+        if self._users:
+            if threading.currentThread() is not self._thread:
+                return False
+            self._users += 1
+            return True
+        try:
+            if self.fd is None:
+                # The pipe is kept open for reuse
+                (read_fd, write_fd) = os.pipe()
+                for fd in (read_fd, write_fd):
+                    fcntl.fcntl(fd, fcntl.F_SETFL,
+                                fcntl.fcntl(fd, fcntl.F_GETFL) |
+                                os.O_NONBLOCK)
+                (self.fd, self._write_fd) = (read_fd, write_fd)
+            old_wakeup = signal.set_wakeup_fd(self._write_fd)
+        except (OSError, ValueError, AttributeError):
+            # Out of descriptors, or not the main thread
+            return False
+        if old_wakeup not in (-1, self._write_fd):
+            # Somebody else's wakeup descriptor: don't take it over
+            signal.set_wakeup_fd(old_wakeup)
+            return False
+        try:
+            old_handler = signal.signal(signal.SIGCHLD, _ignore_signal)
+            # The handler stays installed between supervisor passes,
+            # so don't let it interrupt other system calls.  select()
+            # still wakes up through the pipe.
+            signal.siginterrupt(signal.SIGCHLD, False)
+        except (ValueError, AttributeError):
+            signal.set_wakeup_fd(old_wakeup)
+            return False
+        self._old_wakeup = old_wakeup
+        self._old_handler = old_handler
+        self._thread = threading.currentThread()
+        self._users = 1
+        return True
+    def release(self):
+        "Uninstalls the wakeup once no group is using it."
+        self._users -= 1
+        if self._users:
+            return
+        try:
+            signal.set_wakeup_fd(self._old_wakeup)
+            if self._old_handler is not None:
+                signal.signal(signal.SIGCHLD, self._old_handler)
+                # Undo siginterrupt() from acquire(): handlers set
+                # with signal.signal() interrupt system calls
+                signal.siginterrupt(signal.SIGCHLD, True)
+        except ValueError:
+            # Not the main thread: leave the (harmless) handler and
+            # pipe in place
+            pass
+        self._thread = None
+    def drain(self):
+        "Reads pending wakeups from the pipe."
+        _read_nonblocking(self.fd)
+        self.count += 1
+
+_sigchld_wakeup = _Sigchld_wakeup()
+
 class Task_group(object):
-    __slots__ = ['_name', '_tasks', '_running_tasks', '_failed', '_cond_var']
-    def __init__(self, name=None):
+    # Rather than a thread per process, a Task_group is driven by a
+    # single supervisor loop (see _supervise), run by whichever thread
+    # is waiting on it.  The loop sleeps in select() on the stderr
+    # pipes of its tasks and, when run in the main thread, on a pipe
+    # written when SIGCHLD arrives.  It reaps exited children with
+    # non-blocking waitpid() calls.
+    __slots__ = ['_name', '_tasks', '_running_tasks', '_failed', '_cond_var',
+                 '_supervisor', '_abort_on_failure', '_aborted',
+                 '_has_wakeup', '_signal_count']
+    def __init__(self, name=None, abort_on_failure=True):
+        self._has_wakeup = False
+        self._signal_count = None
         self._name = name
         self._tasks = []
         self._running_tasks = set([])
         self._failed = False
         self._cond_var = threading.Condition()
+        self._supervisor = threading.Lock()
+        self._abort_on_failure = abort_on_failure
+        self._aborted = False
     def __str__(self):
         return self.get_status()
     def get_name(self):
         return self._name
     def wait(self):
-        self._cond_var.acquire()
+        self._supervise(lambda: not self._running_tasks)
+    def _supervise(self, done, fds=()):
+        """
+        Runs the supervisor loop until *done()* returns true, or until
+        any of the file descriptors in *fds* is ready for reading.
+        Returns the list of ready descriptors from *fds*.  Only one
+        thread runs the loop for a group at a time.
+        """
+        self._supervisor.acquire()
         try:
+            if done():
+                return []
+            wakeup = self._acquire_wakeup()
             try:
-                # Wait while there are still running tasks in the group
-                while self._running_tasks:
-                    self._cond_var.wait()
+                while not done():
+                    ready = self._poll(wakeup, fds)
+                    if ready:
+                        return ready
+                return []
             except KeyboardInterrupt:
                 # If we get a keyboard interrupt while waiting, abort
                 self.abort()
                 raise
+            finally:
+                self._release_wakeup()
+        finally:
+            self._supervisor.release()
+    def _supervise_once(self, timeout):
+        """
+        Runs one pass of the supervisor loop, waiting up to *timeout*
+        seconds for something to happen.  The SIGCHLD wakeup is always
+        released afterwards, since the caller may go back to an event
+        loop of its own before the next pass.
+        """
+        self._supervisor.acquire()
+        try:
+            wakeup = self._acquire_wakeup()
+            try:
+                self._poll(wakeup, (), timeout)
+            finally:
+                self._release_wakeup(True)
+        finally:
+            self._supervisor.release()
+    def _acquire_wakeup(self):
+        """
+        Returns the descriptor of the SIGCHLD wakeup pipe, or ``None``
+        if SIGCHLD can't be caught in this thread.  The group keeps the
+        wakeup installed for as long as it has running tasks, so that
+        repeated calls to the supervisor loop (for example, for each
+        chunk of streamed output) don't set it up each time.
+        """
+        if not self._has_wakeup:
+            if not _sigchld_wakeup.acquire():
+                return None
+            self._has_wakeup = True
+            # Any child may have exited before SIGCHLD was caught
+            self._signal_count = None
+        return _sigchld_wakeup.fd
+    def _release_wakeup(self, force=False):
+        """
+        Releases the SIGCHLD wakeup once no tasks are running, or
+        straight away if *force* is true.
+        """
+        if self._has_wakeup and (force or not self.is_running()):
+            self._has_wakeup = False
+            _sigchld_wakeup.release()
+    def _poll(self, wakeup, fds=(), timeout=None):
+        """
+        Sleeps until a task has something to do, then does it.
+        Returns the list of descriptors from *fds* that are ready for
+        reading.  If SIGCHLD is being caught through *wakeup*, tasks
+        are told whether any child may have exited since the last
+        pass.
+        """
+        self._cond_var.acquire()
+        try:
+            tasks = list(self._running_tasks)
         finally:
             self._cond_var.release()
+        if timeout is None:
+            if wakeup is not None:
+                timeout = SUPERVISOR_POLL
+            else:
+                timeout = SUPERVISOR_THREAD_POLL
+        now = time.time()
+        readers = {}
+        if wakeup is not None:
+            readers[wakeup] = None
+        for fd in fds:
+            readers[fd] = None
+        for task in tasks:
+            fd = task._get_stderr_fd()
+            if fd is not None:
+                readers[fd] = task
+            deadline = task._get_deadline()
+            if deadline is not None:
+                timeout = max(0.0, min(timeout, deadline - now))
+        try:
+            (rl, wl, xl) = select.select(readers.keys(), [], [], timeout)
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
+            rl = []
+        ready = []
+        for fd in rl:
+            if fd == wakeup:
+                _sigchld_wakeup.drain()
+            elif readers[fd] is None:
+                ready.append(fd)
+            else:
+                readers[fd]._read_stderr()
+        if wakeup is None:
+            signalled = True
+        else:
+            signalled = (self._signal_count != _sigchld_wakeup.count)
+            self._signal_count = _sigchld_wakeup.count
+        now = time.time()
+        for task in tasks:
+            task._reap(signalled)
+            task._check_deadline(now)
+        return ready
     def add_task(self, task):
         self._cond_var.acquire()
         try:
             self._tasks.append(task)
             self._running_tasks.add(task)
             # Are we already aborted?
-            if self._failed:
+            if self._aborted:
                 task.abort()
             self._cond_var.notifyAll()
             self._check_task(task)
@@ -358,27 +673,29 @@ class Task_group(object):
             if task in self._running_tasks and not task.is_running():
                 self._running_tasks.remove(task)
                 if not task.is_success():
-                    # It was a failure: boom
-                    self.abort()
+                    if self._abort_on_failure:
+                        # It was a failure: boom
+                        self.abort()
+                    else:
+                        self._failed = True
                 self._cond_var.notifyAll()
         finally:
             self._cond_var.release()
     def abort(self):
         self._cond_var.acquire()
         try:
-            if self._failed:
+            if self._aborted:
                 # Already aborted, abort aborting
                 return
             else:
                 self._failed = True
-            # Make thread to do the aborting,  Ungh.
+                self._aborted = True
             running_tasks = list(self._running_tasks)
-            def abort_subtasks():
-                for task in running_tasks:
-                    task.abort()
-            threading.Thread(target=abort_subtasks).start()
         finally:
             self._cond_var.release()
+        # Aborting only sends signals, so no need for a thread
+        for task in running_tasks:
+            task.abort()
     def is_running(self):
         self._cond_var.acquire()
         try:
@@ -395,14 +712,17 @@ class Task_group(object):
         return '\n'.join(task.get_status() for task in self._tasks)
     def get_exit_status(self):
         return [s for task in self._tasks for s in task.get_exit_status()]
+    def get_resources(self):
+        return [r for task in self._tasks for r in task.get_resources()]
 
 NUKE_DELAY = 4.0                # Seconds before using SIGKILL after SIGTERM
 
 class Task_process(Task):
     __slots__ = ['_exit_status', '_ignore_exits', '_pid',
-                 '_stderr_text', '_aborted']
+                 '_stderr_text', '_aborted', '_stderr_fd', '_nuke_time',
+                 '_io_accounting', '_start_time', '_resources']
     def __init__(self, args, fin, fout, ferr, fout_append, ferr_append,
-                 ignore_exits, fout_to_ferr):
+                 ignore_exits, fout_to_ferr, io_accounting=False):
         Task.__init__(self, format_args(args),
                       fin, fout, ferr, fout_append, ferr_append)
         self._cond_var.acquire()
@@ -412,25 +732,24 @@ class Task_process(Task):
             self._ignore_exits = ignore_exits
             self._pid = None
             self._stderr_text = ""
+            self._stderr_fd = None
+            self._nuke_time = None
+            self._io_accounting = io_accounting
+            self._start_time = None
+            self._resources = None
             
-            # If ferr is None, let's set up a collector thread
+            # If ferr is None, collect stderr through a pipe watched by
+            # the task group's supervisor
             used_own_ferr = False
             if ferr is None:
                 used_own_ferr = True
                 (ferr_in, ferr) = os.pipe()
-                def collect_stderr():
-                    try:
-                        last_read = None
-                        while self.is_running():
-                            (rl, wl, xl) = select.select([ferr_in], [], [], 1.0)
-                            if rl:
-                                while last_read != "":
-                                    last_read = os.read(ferr_in, 1024)
-                                    self._stderr_text += last_read
-                    finally:
-                        os.close(ferr_in)
-                threading.Thread(target=collect_stderr).start()
+                fcntl.fcntl(ferr_in, fcntl.F_SETFL,
+                            fcntl.fcntl(ferr_in, fcntl.F_GETFL) |
+                            os.O_NONBLOCK)
+                self._stderr_fd = ferr_in
             # All of our ducks are lined up.
+            self._start_time = time.time()
             pid = os.fork()
             if pid == 0:
                 # Child
@@ -458,11 +777,7 @@ class Task_process(Task):
                                 open_stream(ferr, ferr_append and 'a' or 'w')
                             os.dup2(err_fd, 2)
                         # Close everything else
-                        for i in xrange(3, MAXFD):
-                            try:
-                                os.close(i)
-                            except:
-                                pass
+                        os.closerange(3, MAXFD)
                         if callable(args[0]):
                             # The "program" is actually a function
                             try:
@@ -495,20 +810,101 @@ class Task_process(Task):
             if used_own_ferr:
                 os.close(ferr)
             self._pid = pid
-            def wait_for_process():
-                (result_pid, result_exit) = os.waitpid(self._pid, 0)
-                assert result_pid == self._pid
-                self._set_status(result_exit)
-            threading.Thread(target=wait_for_process).start()
         finally:
             self._cond_var.release()
+    def _get_stderr_fd(self):
+        return self._stderr_fd
+    def _read_stderr(self):
+        self._cond_var.acquire()
+        try:
+            if self._stderr_fd is None:
+                return
+            data = _read_nonblocking(self._stderr_fd)
+            if data is None:
+                os.close(self._stderr_fd)
+                self._stderr_fd = None
+            else:
+                self._stderr_text += data
+        finally:
+            self._cond_var.release()
+    def _reap(self, signalled=True):
+        if self._pid is None or not self.is_running():
+            return
+        io = None
+        if self._io_accounting:
+            if not signalled:
+                # No child has exited, so don't bother with /proc
+                return
+            # I/O totals are only available before the process is
+            # reaped, so check whether it has exited first.
+            try:
+                io = _read_proc_io(self._pid)
+            except (IOError, OSError, ValueError, KeyError):
+                self._io_accounting = False
+            if io is False:
+                # Still running
+                return
+        try:
+            (result_pid, result_exit, rusage) = \
+                os.wait4(self._pid, os.WNOHANG)
+        except OSError, e:
+            if e.errno == errno.EINTR:
+                return
+            if e.errno != errno.ECHILD:
+                raise
+            # Somebody else reaped the child, so its status is unknown
+            (result_pid, result_exit, rusage) = (self._pid, -1, None)
+        if result_pid == 0:
+            # Still running
+            return
+        assert result_pid == self._pid
+        self._resources = {
+            'wall_time': time.time() - self._start_time,
+            'user_time': None,
+            'sys_time': None,
+            'max_rss': None,
+            'read_bytes': None,
+            'write_bytes': None,
+        }
+        if rusage is not None:
+            self._resources['user_time'] = rusage.ru_utime
+            self._resources['sys_time'] = rusage.ru_stime
+            self._resources['max_rss'] = rusage.ru_maxrss
+        if io:
+            (self._resources['read_bytes'],
+             self._resources['write_bytes']) = io
+        # Collect whatever error output is waiting, but don't wait for
+        # more, since the pipe may have been passed on to other
+        # processes.
+        self._cond_var.acquire()
+        try:
+            if self._stderr_fd is not None:
+                data = _read_nonblocking(self._stderr_fd)
+                if data:
+                    self._stderr_text += data
+                os.close(self._stderr_fd)
+                self._stderr_fd = None
+        finally:
+            self._cond_var.release()
+        self._set_status(result_exit)
+    def _get_deadline(self):
+        return self._nuke_time
+    def _check_deadline(self, now):
+        if self._nuke_time is not None and now >= self._nuke_time:
+            self._nuke_time = None
+            self._abort(signal.SIGKILL)
     def _set_status(self, status):
         self._cond_var.acquire()
         try:
             self._exit_status = status
+            self._nuke_time = None
             if netsa.DEBUG:
                 print >>sys.stderr, "Status [%d] %s" % \
                     (self._pid, self)
+            if self._resources is not None:
+                log.debug("[%d] %s %s %s", self._pid, self.get_name(),
+                          format_status(status),
+                          format_resources(self._resources))
             self._notify_status_change()
         finally:
             self._cond_var.release()
@@ -516,13 +912,9 @@ class Task_process(Task):
         self._cond_var.acquire()
         try:
             # Can't abort if there's no PID.  Check if exited or not started
-            if not self.is_running():
+            if not self.is_running() or self._pid is None:
                 # We already completed, do nothing
                 return
-            while self._pid is None:
-                # We're not running yet, wait for startup to complete
-                self._cond_var.wait()
-            # Now we must be running, try killing it
             try:
                 if netsa.DEBUG:
                     print >>sys.stderr, "Killing [%d] %s (%d)" % \
@@ -539,11 +931,14 @@ class Task_process(Task):
             return
         # Try SIGTERM
         self._abort(signal.SIGTERM)
-        # Set up a thread to try SIGKILL in a short time
-        def delayed_nuke():
-            time.sleep(NUKE_DELAY)
-            self._abort(signal.SIGKILL)
-        threading.Thread(target=delayed_nuke).start()
+        # Have the supervisor try SIGKILL in a short time
+        self._cond_var.acquire()
+        try:
+            if not self._aborted:
+                self._aborted = True
+                self._nuke_time = time.time() + NUKE_DELAY
+        finally:
+            self._cond_var.release()
     def is_running(self):
         self._cond_var.acquire()
         try:
@@ -577,6 +972,8 @@ class Task_process(Task):
             else:
                 stat_line = self.get_name() + " " + \
                     format_status(self._exit_status)
+                if self._resources is not None:
+                    stat_line += " " + format_resources(self._resources)
             if self._stderr_text:
                 stderr_text = self._stderr_text
                 if stderr_text[-1] == '\n':
@@ -588,6 +985,8 @@ class Task_process(Task):
             self._cond_var.release()
     def get_exit_status(self):
         return [self._exit_status]
+    def get_resources(self):
+        return [self._resources]
                 
 
 def _interpolate_vars(arg_list, vars):
@@ -659,10 +1058,11 @@ def fork_child(task_group, command, stdin, stdout, stdout_append,
     if ignore: ignore_exits = True
     stdout_to_stderr = command.get_options(defaults) \
         .get('stdout_to_stderr', False)
+    io_accounting = command.get_options(defaults).get('io_accounting', False)
     # Fork an individual child in a pipeline
     task = Task_process(args, stdin, stdout, stderr,
                         stdout_append, stderr_append, ignore_exits,
-                        stdout_to_stderr)
+                        stdout_to_stderr, io_accounting)
     task.add_task_group(task_group)
     return task
 
@@ -853,6 +1253,15 @@ def command(*argv, **options):
       *ignore_exit_statuses*
         A list of numeric exit statuses that should not be considered
         errors when they are encountered.
+      *io_accounting*
+        If ``True``, record the number of bytes the command reads and
+        writes, for :meth:`PipelineRun.get_resources`.  This requires
+        the Linux ``/proc`` filesystem.  Each time a child process
+        exits, ``/proc`` is read for every running command with this
+        option, to catch the one that exited before it is reaped.
+        When pipelines are waited on outside the main thread, exits
+        can't be detected that way, and ``/proc`` is read for each such
+        command every time the pipelines are checked.  Off by default.
 
     In addition, these options may be "handed down" from the
     :func:`pipeline` call, or from :func:`run_parallel` or
@@ -1125,6 +1534,15 @@ def run_parallel(*args, **options):
         :func:`command` and :func:`pipeline` specifications in this
         `run_parallel` call.
 
+      *max_parallel*
+        The largest number of pipelines to run at once.  By default
+        all are started at once.  See :class:`PipelinePool`.
+
+      *keep_going*
+        If true, a failing command only kills the rest of its own
+        pipeline, and the remaining pipelines are still run before
+        :exc:`PipelineException` is raised.  See :class:`PipelinePool`.
+
     Additional keyword arguments will be passed down as default values
     to the :func:`pipeline` and :func:`command` specifications making
     up this :func:`run_parallel` call.
@@ -1161,43 +1579,460 @@ def run_parallel(*args, **options):
         #  [[0, 0], [0, 0, 0]]
     """
 
+    return start_parallel(*args, **options).wait()
+
+class PipelinePool(object):
+    """
+    A queue of pipelines to be run with a limited number running at
+    once.  Pipelines are added with :meth:`add` and run with
+    :meth:`run`, which behaves like :func:`run_parallel`.
+
+    If *max_parallel* is ``None``, every pipeline is started at once.
+    Otherwise, at most *max_parallel* pipelines are running at a time,
+    and another is started from the queue as each one completes.
+    Pipelines that communicate with each other (through named pipes,
+    for example) must be able to run at the same time, or they will
+    never complete.
+
+    If *keep_going* is false (the default), then when any command
+    fails, every running command is killed, no more pipelines are
+    started, and :exc:`PipelineException` is raised.  If *keep_going*
+    is true, only the other commands in the failed pipeline are
+    killed, the remaining pipelines are run, and
+    :exc:`PipelineException` is raised when all have completed.
+
+    *vars* and any additional keyword arguments are used as in
+    :func:`run_parallel`.
+
+    Example: Run a pull for each of many sensors, four at a time::
+
+        pool = PipelinePool(max_parallel=4)
+        for sensor in sensors:
+            pool.add(["rwfilter --sensor=%(sensor)s ...", ">%(sensor)s.rw"],
+                     vars={'sensor': sensor})
+        exits = pool.run()
+    """
+    def __init__(self, max_parallel=None, keep_going=False, vars={},
+                 **options):
+        if max_parallel is not None and max_parallel < 1:
+            value_error = ValueError(
+                "max_parallel must be at least 1: %r" % max_parallel)
+            raise value_error
+        self._max_parallel = max_parallel
+        self._keep_going = keep_going
+        self._vars = vars
+        self._options = options
+        self._pipelines = []
+        self._queue = []
+    def add(self, pipeline_spec, priority=0, vars=None):
+        """
+        Adds a pipeline (anything accepted by :func:`pipeline`) to the
+        queue.  Pipelines with higher *priority* are started first,
+        and pipelines with equal priority are started in the order
+        they were added.  If *vars* is given, its substitutions are
+        made in addition to those given for the pool.
+        """
+        p_vars = self._vars
+        if vars:
+            p_vars = dict(p_vars)
+            p_vars.update(vars)
+        index = len(self._pipelines)
+        self._pipelines.append((pipeline(pipeline_spec), p_vars))
+        heapq.heappush(self._queue, (-priority, index))
+    def __len__(self):
+        return len(self._pipelines)
+    def run(self):
+        """
+        Runs every queued pipeline, and returns a list of the exit
+        statuses of the processes in each, in the order the pipelines
+        were added, as for :func:`run_parallel`.  Pipelines which were
+        never started have an exit status of ``None`` for each process.
+        The pool is empty afterwards.
+        """
+        return self.start().wait()
+    def start(self):
+        """
+        Starts running the queued pipelines without waiting for them,
+        and returns a :class:`PipelineRun` to follow their progress.
+        The pool is empty afterwards.
+        """
+        run = PipelineRun(self._pipelines, self._queue, self._max_parallel,
+                          self._keep_going, self._options)
+        (self._pipelines, self._queue) = ([], [])
+        return run
+
+class PipelineRun(object):
+    """
+    The progress of pipelines started by :func:`start_parallel` or
+    :meth:`PipelinePool.start`.  Queued pipelines are only started, and
+    completed processes only noticed, while :meth:`poll` or
+    :meth:`wait` is being called, so a program with its own event loop
+    should call :meth:`poll` regularly (from a timer, for example)
+    until it returns ``True``.
+
+    While :meth:`wait` runs in the main thread, SIGCHLD is caught so
+    that exits are noticed at once.  :meth:`poll` removes its SIGCHLD
+    handler and :func:`signal.set_wakeup_fd` descriptor again before
+    returning, so nothing is left installed between calls.  Neither
+    one replaces a wakeup descriptor installed by the caller's event
+    loop; they check on the processes at short intervals instead.
+    """
+    def __init__(self, pipelines, queue, max_parallel, keep_going,
+                 options):
+        self._pipelines = pipelines
+        self._queue = queue
+        self._max_parallel = max_parallel
+        self._options = options
+        # Every task belongs to the run's group, which aborts
+        # everything on failure unless keep_going is set, and to a
+        # group for its pipeline, which always does.
+        self._task_group = Task_group(abort_on_failure=not keep_going)
+        self._started = {}
+        self._running = []
+        self._update()
+    def _update(self):
+        """
+        Forgets completed pipelines, and starts queued ones while there
+        is room.
+        """
+        self._running = [g for g in self._running if g.is_running()]
+        queue = self._queue
+        while queue and not self._task_group._aborted:
+            if (self._max_parallel is not None and
+                    len(self._running) >= self._max_parallel):
+                break
+            index = heapq.heappop(queue)[1]
+            (p, p_vars) = self._pipelines[index]
+            p_group = Task_group()
+            self._started[index] = p_group
+            self._running.append(p_group)
+            fork_children(p_group, p, p_vars, self._options)
+            for task in p_group._tasks:
+                task.add_task_group(self._task_group)
+    def is_running(self):
+        "True if any pipeline is running or waiting to run."
+        return bool(self._running)
+    def poll(self, timeout=0):
+        """
+        Checks on the running pipelines, waiting up to *timeout*
+        seconds for something to happen, and starts queued pipelines
+        as others complete.  Returns ``True`` once every pipeline has
+        completed.
+        """
+        if self._running:
+            self._task_group._supervise_once(timeout)
+            self._update()
+        return not self._running
+    def wait(self):
+        """
+        Waits for every pipeline to complete, and returns the result
+        of :meth:`result`.
+        """
+        while self._running:
+            self._task_group._supervise(
+                lambda: any(not g.is_running() for g in self._running))
+            self._update()
+        return self.result()
+    def abort(self):
+        """
+        Kills every running pipeline, and prevents any more from
+        starting.  :meth:`poll` or :meth:`wait` must still be called
+        to collect them.
+        """
+        self._task_group.abort()
+    def result(self):
+        """
+        Returns the exit statuses of the pipelines, as for
+        :func:`run_parallel`, or raises :exc:`PipelineException` if
+        any failed.  Raises :exc:`ValueError` if any are still
+        running.
+        """
+        if self._running:
+            value_error = ValueError("Pipelines are still running")
+            raise value_error
+        exit_statuses = self._per_pipeline(Task_group.get_exit_status)
+        if not self._task_group.is_success():
+            # It failed, raise an exception
+            pipeline_failure = \
+                PipelineException("Failure processing pipeline\n" +
+                                  self._task_group.get_status(),
+                                  exit_statuses, self.get_resources())
+            raise pipeline_failure
+        else:
+            return exit_statuses
+    def get_resources(self):
+        """
+        Returns the resources used by each process so far, as a list
+        of lists in the same shape as the exit statuses.  Each item is
+        ``None`` for a process that has not completed, or a dict with
+        the keys *wall_time*, *user_time*, *sys_time*, *max_rss*,
+        *read_bytes*, and *write_bytes*.  Times are in seconds and
+        *max_rss* in kilobytes.  The byte counts are ``None`` unless
+        the *io_accounting* option was given to the command.
+        """
+        return self._per_pipeline(Task_group.get_resources)
+    def get_status(self):
+        """
+        Returns a human-readable description of every process started
+        so far, one per line, with its exit status and resource usage
+        once it has completed, and any error output.
+        """
+        return self._task_group.get_status()
+    def _per_pipeline(self, get):
+        result = []
+        for (index, (p, p_vars)) in enumerate(self._pipelines):
+            p_result = [None] * len(p.commands)
+            if index in self._started:
+                values = get(self._started[index])
+                p_result[:len(values)] = values
+            result.append(p_result)
+        return result
+
+def start_parallel(*args, **options):
+    """
+    Starts a series of pipelines like :func:`run_parallel`, with the
+    same arguments, but returns a :class:`PipelineRun` immediately
+    rather than waiting for them to complete.  This allows pipelines
+    to be run from programs that cannot block while waiting, such as
+    those built around an event loop.
+
+    Example: Check on two pipelines from a timer callback::
+
+        run = start_parallel(["ls -l", "grep ^d"], ["sleep 10"])
+        ...
+        def on_timer():
+            if run.poll():
+                exits = run.result()
+    """
     # By default, provide no substitutions
-    vars = options.get('vars', {})
+    vars = options.pop('vars', {})
+    max_parallel = options.pop('max_parallel', None)
+    keep_going = options.pop('keep_going', False)
 
-    # Don't pass this one down to be part of the pipeline definition
-    if 'vars' in options:
-        del options['vars']
+    pool = PipelinePool(max_parallel=max_parallel, keep_going=keep_going,
+                        vars=vars, **options)
+    for x in args:
+        pool.add(x)
+    return pool.start()
 
-    # Parse the arguments into pipeline specifications
-    pipelines = [pipeline(x) for x in args]
+class PipelineStream(object):
+    """
+    A read-only file-like object for the output of a pipeline started
+    by :func:`run_stream` or :func:`run_tee`.  Besides the methods
+    below, iterating over it yields lines of output.
+    """
+    def __init__(self, run, fd):
+        self._run = run
+        self._task_group = run._task_group
+        self._fd = fd
+        self._buf = ''
+        self._eof = False
+        self._exit_statuses = None
+    def __iter__(self):
+        return self
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+    def _fill(self):
+        """
+        Reads more output into the buffer, supervising the pipeline
+        while waiting.  Raises :exc:`PipelineException` if the pipeline
+        fails.  Returns ``False`` at end of output.
+        """
+        if self._eof:
+            return False
+        while True:
+            ready = self._task_group._supervise(
+                lambda: self._task_group._failed, [self._fd])
+            if self._task_group._failed:
+                self._finish(True)
+            if ready:
+                break
+        data = os.read(self._fd, 65536)
+        if data:
+            self._buf += data
+            return True
+        self._finish(True)
+        return False
+    def _finish(self, check):
+        """
+        Closes the output, waits for the pipeline to complete, and if
+        *check* is true raises :exc:`PipelineException` if it failed.
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._eof = True
+        if self._exit_statuses is None:
+            self._task_group.wait()
+            self._exit_statuses = self._run._per_pipeline(
+                Task_group.get_exit_status)
+        if check and not self._task_group.is_success():
+            pipeline_failure = \
+                PipelineException("Failure processing pipeline\n" +
+                                  self._task_group.get_status(),
+                                  self._exit_statuses, self.get_resources())
+            raise pipeline_failure
+    def read(self, size=-1):
+        "Reads up to *size* bytes, or all remaining output."
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            (result, self._buf) = (self._buf, '')
+            return result
+        while len(self._buf) < size and self._fill():
+            pass
+        (result, self._buf) = (self._buf[:size], self._buf[size:])
+        return result
+    def readline(self):
+        "Reads one line of output, including the trailing newline."
+        start = 0
+        while True:
+            i = self._buf.find('\n', start)
+            if i != -1:
+                (result, self._buf) = (self._buf[:i+1], self._buf[i+1:])
+                return result
+            start = len(self._buf)
+            if not self._fill():
+                (result, self._buf) = (self._buf, '')
+                return result
+    def close(self):
+        """
+        Stops reading output.  If the pipeline is still running, it is
+        killed.  Returns the exit statuses of the pipeline, as for
+        :func:`run_parallel`.  Does not raise :exc:`PipelineException`.
+        """
+        if self._exit_statuses is None and self._task_group.is_running():
+            self._task_group.abort()
+        self._finish(False)
+        return self._exit_statuses
+    def get_exit_statuses(self):
+        """
+        Returns the exit statuses of the pipeline once it has
+        completed, or ``None`` while it is still running.
+        """
+        return self._exit_statuses
+    def get_resources(self):
+        """
+        Returns the resources used by each process in the pipeline, as
+        for :meth:`PipelineRun.get_resources`.
+        """
+        return self._run.get_resources()
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    def __del__(self):
+        # A stream dropped before the end of its output would leave
+        # the pipeline blocked on a full pipe, and never reaped.
+        try:
+            if self._exit_statuses is None:
+                self.close()
+        except (OSError, AttributeError):
+            pass
 
-    def chew_exit_statuses(statuses):
-        # Note that this _destructively edits_ the exit statuses
-        # list....
-        all_exits = []
-        for p in pipelines:
-            p_exits = []
-            for c in p.commands:
-                if len(statuses) == 0:
-                    p_exits.append(None)
-                else:
-                    p_exits.append(statuses.pop(0))
-            all_exits.append(p_exits)
-        return all_exits
-
-    task_group = Task_group()
+def run_stream(*args, **options):
+    """
+    Runs a series of commands specifying a single pipeline like
+    :func:`run_collect`, but returns a :class:`PipelineStream` which
+    reads the output of the final command while the pipeline runs,
+    rather than collecting it in a temporary file.  stderr output from
+    the commands is reported in any :exc:`PipelineException`, unless
+    redirected.
+
+    If any command fails, all remaining commands are killed and
+    :exc:`PipelineException` is raised by the next read from the
+    stream.  Closing the stream before the end of the output kills any
+    remaining commands, as does leaving a ``with`` block or dropping
+    the last reference to the stream.
+
+    Example: Print the lines of ``ls -l | sort -r`` as they arrive::
+
+        for line in run_stream("ls -l", "sort -r"):
+            print line,
+
+    """
+    vars = options.pop('vars', {})
+    (stream_in, stream_out) = os.pipe()
+    # Replace any existing "stdout" definition
+    options["stdout"] = stream_out
+    options["stdout_append"] = False
+    return _start_stream([pipeline(*args)], stream_in, stream_out,
+                         vars, options)
+
+def _start_stream(pipelines, stream_in, stream_out, vars, options):
+    """
+    Starts *pipelines*, one of which writes to the pipe *stream_out*,
+    and returns a :class:`PipelineStream` reading from *stream_in*.
+    """
+    pool = PipelinePool(vars=vars, **options)
     for p in pipelines:
-        fork_children(task_group, p, vars, options)
-    task_group.wait()
-    exit_statuses = chew_exit_statuses(task_group.get_exit_status())
-    if not task_group.is_success():
-        # It failed, raise an exception
-        pipeline_failure = \
-            PipelineException("Failure processing pipeline\n" +
-                              task_group.get_status(), exit_statuses)
-        raise pipeline_failure
-    else:
-        return exit_statuses
+        pool.add(p)
+    try:
+        run = pool.start()
+    except:
+        os.close(stream_in)
+        raise
+    finally:
+        for p in pipelines:
+            if p.get_options(options).get('stdout') is stream_out:
+                break
+        else:
+            # Nothing writes to the stream, so fork_children didn't
+            # close it.
+            os.close(stream_out)
+    return PipelineStream(run, stream_in)
+
+def run_tee(source, *consumers, **options):
+    """
+    Runs the *source* pipeline with a copy of its output fed to the
+    standard input of each of the *consumers* pipelines, all running
+    in parallel.  Each argument is passed to the :func:`pipeline`
+    function.  The copying is done by a ``tee`` command through named
+    pipes, so the output is produced only once and is not copied
+    through Python.
+
+    If the *stream* option is true, the output is also made available
+    to the caller: a :class:`PipelineStream` is returned immediately
+    which reads another copy of it.  Otherwise, :func:`run_tee` waits
+    for every pipeline to complete, and returns exit statuses as for
+    :func:`run_parallel`, with those of the *source* pipeline first.
+    The ``tee`` command appears as an extra command at the end of the
+    source pipeline.
+
+    Failures are handled as for :func:`run_parallel`: if any command
+    fails, all are killed and :exc:`PipelineException` is raised.
+    Other options are as for :func:`run_parallel`.
+
+    Example: Feed one pull to two different summaries::
+
+        run_tee(["rwfilter --type=in ... --pass=stdout"],
+                ["rwuniq --fields=sip", ">%(out1)s"],
+                ["rwstats --fields=dport --count=10", ">%(out2)s"],
+                vars={'out1': "by_sip.txt", 'out2': "top_ports.txt"})
+    """
+    stream = options.pop('stream', False)
+    vars = options.pop('vars', {})
+    if not consumers and not stream:
+        type_error = TypeError(
+            "run_tee() requires a consumer pipeline or stream=True")
+        raise type_error
+    source = pipeline(source)
+    fifos = [get_temp_pipe_name().replace('%', '%%') for c in consumers]
+    source = PipelineSpec(source.commands + [command(["tee"] + fifos)],
+                          source.options)
+    pipelines = [source]
+    for (c, fifo) in zip(consumers, fifos):
+        pipelines.append(pipeline(c).with_options({'stdin': fifo}))
+    if not stream:
+        return run_parallel(vars=vars, *pipelines, **options)
+    (stream_in, stream_out) = os.pipe()
+    pipelines[0] = source.with_options({'stdout': stream_out,
+                                        'stdout_append': False})
+    return _start_stream(pipelines, stream_in, stream_out, vars, options)
 
 def run_collect_files(*args, **options):
     """
@@ -1226,7 +2061,8 @@ def run_collect_files(*args, **options):
         stderr_tmp.flush()
         stderr_tmp.seek(0)
         msg = "\n".join(filter(None, [msg, stderr_tmp.read().strip()]))
-        raise PipelineException(msg, e.get_exit_statuses())
+        raise PipelineException(msg, e.get_exit_statuses(),
+                                e.get_resources())
     # Seek back to the start of the temporary files
     stdout_tmp.seek(0)
     stderr_tmp.seek(0)
@@ -1290,6 +2126,12 @@ __all__ = """
 
     run_parallel
     run_collect
+    PipelinePool
+    start_parallel
+    PipelineRun
+    run_stream
+    run_tee
+    PipelineStream
     run_collect_files
 
 """.split()
@@ -46,42 +46,103 @@
 # contract clause at 252.227.7013.
 # @OPENSOURCE_HEADER_END@
 
-import bisect, itertools
+import cPickle, heapq, itertools, operator, os, sys
+
+from netsa.files import get_temp_file_name
+
+class _reverse_key(object):
+    """
+    Wraps a sort key so that it orders in reverse.
+    """
+    __slots__ = ['key']
+    def __init__(self, key):
+        self.key = key
+    def __lt__(self, other):
+        return other.key < self.key
+    def __eq__(self, other):
+        return self.key == other.key
 
 def imerge(*iterators, **kwargs):
     """
     Given a list of presumably pre-sorted iterables, return an iterator
     that yields the sequentially merged items.
 
+    The optional parameter 'key' (default: None) specifies a function
+    of one argument used to extract a comparison key from each item,
+    as for the built-in sorted().
+
     The optional parameter 'reversed' (default: False) specifies
     whether the highest value is picked during each iteration as
     opposed to the lowest value.
+
+    Items which compare equal are yielded in the order of the
+    iterables they came from.
     """
 
     try:
         reversed = kwargs.pop('reversed')
     except KeyError:
         reversed = False
+    key = kwargs.pop('key', None)
     if kwargs:
         msg = "imerge() got an unexpected keyword argument "
         raise TypeError, msg + "'%s'" % kwargs.keys()[0]
-    queue = []
-    for it in iterators:
-        it = iter(it)
-        try:
-            bisect.insort(queue, (it.next(), it))
-        except StopIteration:
-            pass
-    while queue:
-        if reversed:
-            val, it = queue.pop(-1)
+    if reversed:
+        if key is None:
+            key = _reverse_key
         else:
-            val, it = queue.pop(0)
-        yield val
+            plain_key = key
+            key = lambda val: _reverse_key(plain_key(val))
+    # Each heap entry is a list [item, iterable index, next method], or
+    # [sort key, iterable index, item, next method] if there is a key.
+    # The index breaks ties, so items and iterators are never compared,
+    # and the entries are updated in place rather than rebuilt.
+    heap = []
+    for i, it in enumerate(iterators):
+        next = iter(it).next
         try:
-            bisect.insort(queue, (it.next(), it))
+            val = next()
         except StopIteration:
-            pass
+            continue
+        if key is None:
+            heap.append([val, i, next])
+        else:
+            heap.append([key(val), i, val, next])
+    heapq.heapify(heap)
+    heapreplace = heapq.heapreplace
+    heappop = heapq.heappop
+    if key is None:
+        while len(heap) > 1:
+            try:
+                while True:
+                    entry = heap[0]
+                    yield entry[0]
+                    entry[0] = entry[2]()
+                    heapreplace(heap, entry)
+            except StopIteration:
+                heappop(heap)
+        if heap:
+            (val, i, next) = heap[0]
+            yield val
+            while True:
+                yield next()
+    else:
+        while len(heap) > 1:
+            try:
+                while True:
+                    entry = heap[0]
+                    yield entry[2]
+                    val = entry[3]()
+                    entry[0] = key(val)
+                    entry[2] = val
+                    heapreplace(heap, entry)
+            except StopIteration:
+                heappop(heap)
+        if heap:
+            (_, i, val, next) = heap[0]
+            yield val
+            while True:
+                yield next()
 
 def dzip(*iterators, **kwargs):
     """
@@ -119,3 +180,260 @@ def dzip(*iterators, **kwargs):
     for k,vs in itertools.groupby(imerge(reversed=reversed, *iterators),
                                   key=lambda (k,v): k):
         yield k, tuple(xs for l,xs in vs)
+
+def file_pairs(source, key_fields=1, delimiter='|', skip_header=False,
+               key=None):
+    """
+    Given a file name or file object containing delimited text sorted
+    by its leading fields (for example, the output of rwcut or
+    rwuniq), return an iterator that yields key/value pairs from each
+    line without reading the whole file into memory.
+
+    The key is made from the first 'key_fields' fields (default: 1)
+    and the value is a tuple of the remaining fields.  Fields are split
+    on 'delimiter' (default: '|') and have surrounding white space
+    removed; an empty field left by a trailing delimiter is dropped.
+    If 'key_fields' is 1 the key is the field itself, otherwise it is
+    a tuple of fields.
+
+    The optional parameter 'skip_header' (default: False) specifies
+    whether the first line is a column header to be ignored.  The
+    optional parameter 'key' (default: None) specifies a function
+    applied to each key, for example to convert it to a number so that
+    it compares in the order the file was sorted in.
+    """
+
+    if isinstance(source, basestring):
+        f = open(source, 'r')
+    else:
+        f = source
+    try:
+        lines = iter(f)
+        if skip_header:
+            for line in lines:
+                break
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            fields = [x.strip() for x in line.split(delimiter)]
+            if len(fields) > 1 and fields[-1] == '':
+                fields.pop()
+            if key_fields == 1:
+                k = fields[0]
+            else:
+                k = tuple(fields[:key_fields])
+            if key is not None:
+                k = key(k)
+            yield k, tuple(fields[key_fields:])
+    finally:
+        if f is not source:
+            f.close()
+
+def _pickle_dump(v, f):
+    cPickle.dump(v, f, cPickle.HIGHEST_PROTOCOL)
+
+class _spilled_values(object):
+    """
+    A group of values written to a temporary file, which may be
+    iterated over (repeatedly) and has a length.  The file is removed
+    when the object is discarded.  Values are written with 'dump' and
+    read back with 'load' (by default, pickled.)
+    """
+    __slots__ = ['_path', '_file', '_count', '_dump', '_load']
+    def __init__(self, values=(), dump=None, load=None):
+        self._dump = dump or _pickle_dump
+        self._load = load or cPickle.load
+        self._path = get_temp_file_name()
+        self._file = open(self._path, 'wb')
+        self._count = 0
+        for v in values:
+            self.append(v)
+    def append(self, v):
+        self._dump(v, self._file)
+        self._count += 1
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self
+    def __len__(self):
+        return self._count
+    def __iter__(self):
+        self.close()
+        f = open(self._path, 'rb')
+        try:
+            load = self._load
+            for i in xrange(self._count):
+                yield load(f)
+        finally:
+            f.close()
+    def __repr__(self):
+        return "<%d values spilled to %r>" % (self._count, self._path)
+    def __del__(self):
+        try:
+            self.close()
+            os.remove(self._path)
+        except (OSError, IOError, AttributeError):
+            pass
+
+def dzip_batched(*iterators, **kwargs):
+    """
+    Given a list of pre-sorted iterables that return key/value pairs, or
+    dictionaries, return an iterator that yields the grouped values in
+    blocks.  Each block is a pair (keys, columns), where 'keys' is a
+    list of successive keys and 'columns' holds one list per provided
+    iterable, aligned with 'keys', whose items are the tuples of
+    values that iterable provided for each key (empty if it provided
+    none).
+
+    The iterables are consumed lazily, so large pre-sorted files may be
+    merged through file_pairs() without being loaded into memory.
+
+    The optional parameter 'reversed' (default: False) specifies whether
+    the provided iterators generate values in ascending or descending
+    order.
+
+    The optional parameter 'batch_size' (default: 1000) specifies the
+    maximum number of keys in each block.
+
+    The optional parameter 'spill_size' (default: None) specifies the
+    largest number of values from one iterable for a single key that
+    will be held in memory.  Larger groups are written to temporary
+    files under netsa.files.get_temp_dir_base(), and appear in the
+    columns as iterable objects with a length in place of tuples.
+    These remain valid for as long as they are referenced.
+    """
+
+    try:
+        reversed = kwargs.pop('reversed')
+    except KeyError:
+        reversed = False
+    batch_size = kwargs.pop('batch_size', 1000)
+    spill_size = kwargs.pop('spill_size', None)
+    if kwargs:
+        msg = "dzip_batched() got an unexpected keyword argument "
+        raise TypeError, msg + "'%s'" % kwargs.keys()[0]
+    if batch_size < 1:
+        raise ValueError, "dzip_batched() batch_size must be positive"
+    iterators = list(iterators)
+    for i, it in enumerate(iterators):
+        try:
+            # convert dictionaries to sorted k,v sequence
+            iterators[i] = sorted(it.iteritems(), reverse=reversed)
+        except AttributeError:
+            pass
+    def tagged(i, it):
+        for k, v in it:
+            yield k, i, v
+    merged = imerge(key=operator.itemgetter(0), reversed=reversed,
+                    *[tagged(i, it) for i, it in enumerate(iterators)])
+    n = len(iterators)
+    keys = []
+    columns = [[] for i in xrange(n)]
+    groups = [[] for i in xrange(n)]
+    def finish_key():
+        for i in xrange(n):
+            group = groups[i]
+            if isinstance(group, _spilled_values):
+                columns[i].append(group.close())
+                groups[i] = []
+            else:
+                columns[i].append(tuple(group))
+                del group[:]
+    for k, i, v in merged:
+        if not keys or k != keys[-1]:
+            if keys:
+                finish_key()
+                if len(keys) >= batch_size:
+                    yield keys, columns
+                    keys = []
+                    columns = [[] for j in xrange(n)]
+            keys.append(k)
+        group = groups[i]
+        group.append(v)
+        if spill_size is not None and len(group) > spill_size and \
+                not isinstance(group, _spilled_values):
+            groups[i] = _spilled_values(group)
+    if keys:
+        finish_key()
+        yield keys, columns
+
+def external_sort(iterable, **kwargs):
+    """
+    Given an iterable, return an iterator that yields its items in
+    sorted order, without holding more than a bounded number of them
+    in memory.  Items are sorted in memory in runs, each run is written
+    to a temporary file under netsa.files.get_temp_dir_base(), and the
+    runs are merged with imerge().  The sort is stable, and if the
+    whole input fits in a single run no files are written.
+
+    The optional parameters 'key' (default: None) and 'reverse'
+    (default: False) have the same meaning as for the built-in
+    sorted().
+
+    The optional parameter 'buffer_size' (default: 100000) specifies
+    the maximum number of items in each run.  The optional parameter
+    'buffer_bytes' (default: None) specifies an approximate limit on
+    the memory used by the items in each run, as measured by
+    sys.getsizeof().
+
+    The optional parameter 'max_runs' (default: 64) specifies how many
+    run files may be merged at once.  If there are more, the runs are
+    merged in passes, each pass merging consecutive groups of up to
+    'max_runs' runs into larger runs, so that each item is written
+    about log(runs)/log(max_runs) times.
+
+    The optional parameters 'dump' and 'load' specify how items are
+    written to and read from run files, as functions 'dump(item,
+    file)' and 'load(file)'.  By default items are pickled.
+    """
+
+    key = kwargs.pop('key', None)
+    reverse = kwargs.pop('reverse', False)
+    buffer_size = kwargs.pop('buffer_size', 100000)
+    buffer_bytes = kwargs.pop('buffer_bytes', None)
+    max_runs = kwargs.pop('max_runs', 64)
+    dump = kwargs.pop('dump', None)
+    load = kwargs.pop('load', None)
+    if kwargs:
+        msg = "external_sort() got an unexpected keyword argument "
+        raise TypeError, msg + "'%s'" % kwargs.keys()[0]
+    if buffer_size < 1:
+        raise ValueError, "external_sort() buffer_size must be positive"
+    if max_runs < 2:
+        raise ValueError, "external_sort() max_runs must be at least 2"
+    runs = []
+    buf = []
+    buf_bytes = 0
+    for item in iterable:
+        buf.append(item)
+        if buffer_bytes is not None:
+            buf_bytes += sys.getsizeof(item)
+        if len(buf) >= buffer_size or \
+                (buffer_bytes is not None and buf_bytes >= buffer_bytes):
+            buf.sort(key=key, reverse=reverse)
+            runs.append(_spilled_values(buf, dump, load).close())
+            buf = []
+            buf_bytes = 0
+    buf.sort(key=key, reverse=reverse)
+    if not runs:
+        for item in buf:
+            yield item
+        return
+    # Merge consecutive groups of runs in balanced passes, keeping the
+    # runs in order so that equal items stay in input order.
+    while len(runs) + 1 > max_runs:
+        merged = []
+        for i in xrange(0, len(runs), max_runs):
+            group = runs[i:i + max_runs]
+            if len(group) == 1:
+                merged.append(group[0])
+            else:
+                merged.append(_spilled_values(
+                    imerge(key=key, reversed=reverse, *group),
+                    dump, load).close())
+        runs = merged
+    runs.append(buf)
+    for item in imerge(key=key, reversed=reverse, *runs):
+        yield item
@@ -47,3 +47,5 @@
 # @OPENSOURCE_HEADER_END@
 
 from netsa.util.test.shell import *
+from netsa.util.test.rangeset import *
+from netsa.util.test.tandem import *
@@ -0,0 +1,133 @@
+# Copyright 2008-2013 by Carnegie Mellon University
+
+# @OPENSOURCE_HEADER_START@
+# Use of the Network Situational Awareness Python support library and
+# related source code is subject to the terms of the following licenses:
+# 
+# GNU Public License (GPL) Rights pursuant to Version 2, June 1991
+# Government Purpose License Rights (GPLR) pursuant to DFARS 252.227.7013
+# 
+# NO WARRANTY
+# 
+# ANY INFORMATION, MATERIALS, SERVICES, INTELLECTUAL PROPERTY OR OTHER 
+# PROPERTY OR RIGHTS GRANTED OR PROVIDED BY CARNEGIE MELLON UNIVERSITY 
+# PURSUANT TO THIS LICENSE (HEREINAFTER THE "DELIVERABLES") ARE ON AN 
+# "AS-IS" BASIS. CARNEGIE MELLON UNIVERSITY MAKES NO WARRANTIES OF ANY 
+# KIND, EITHER EXPRESS OR IMPLIED AS TO ANY MATTER INCLUDING, BUT NOT 
+# LIMITED TO, WARRANTY OF FITNESS FOR A PARTICULAR PURPOSE, 
+# MERCHANTABILITY, INFORMATIONAL CONTENT, NONINFRINGEMENT, OR ERROR-FREE 
+# OPERATION. CARNEGIE MELLON UNIVERSITY SHALL NOT BE LIABLE FOR INDIRECT, 
+# SPECIAL OR CONSEQUENTIAL DAMAGES, SUCH AS LOSS OF PROFITS OR INABILITY 
+# TO USE SAID INTELLECTUAL PROPERTY, UNDER THIS LICENSE, REGARDLESS OF 
+# WHETHER SUCH PARTY WAS AWARE OF THE POSSIBILITY OF SUCH DAMAGES. 
+# LICENSEE AGREES THAT IT WILL NOT MAKE ANY WARRANTY ON BEHALF OF 
+# CARNEGIE MELLON UNIVERSITY, EXPRESS OR IMPLIED, TO ANY PERSON 
+# CONCERNING THE APPLICATION OF OR THE RESULTS TO BE OBTAINED WITH THE 
+# DELIVERABLES UNDER THIS LICENSE.
+# 
+# Licensee hereby agrees to defend, indemnify, and hold harmless Carnegie 
+# Mellon University, its trustees, officers, employees, and agents from 
+# all claims or demands made against them (and any related losses, 
+# expenses, or attorney's fees) arising out of, or relating to Licensee's 
+# and/or its sub licensees' negligent use or willful misuse of or 
+# negligent conduct or willful misconduct regarding the Software, 
+# facilities, or other rights or assistance granted by Carnegie Mellon 
+# University under this License, including, but not limited to, any 
+# claims of product liability, personal injury, death, damage to 
+# property, or violation of any laws or regulations.
+# 
+# Carnegie Mellon University Software Engineering Institute authored 
+# documents are sponsored by the U.S. Department of Defense under 
+# Contract FA8721-05-C-0003. Carnegie Mellon University retains 
+# copyrights in all material produced under this contract. The U.S. 
+# Government retains a non-exclusive, royalty-free license to publish or 
+# reproduce these documents, or allow others to do so, for U.S. 
+# Government purposes only pursuant to the copyright license under the 
+# contract clause at 252.227.7013.
+# @OPENSOURCE_HEADER_END@
+"""
+Timing benchmarks for netsa.util.
+
+These are not run as part of the unit tests.  Run them directly with:
+
+    python -m netsa.util.test.benchmark [k ...]
+
+Each k is a number of sorted streams to merge.
+"""
+
+import bisect
+import random
+import sys
+import time
+
+from netsa.util.tandem import imerge
+
+DEFAULT_KS = [2, 10, 50, 100, 500, 2000, 10000]
+
+# Total number of items merged in each imerge benchmark
+ITEMS = 200000
+
+def bisect_imerge(*iterators):
+    """
+    The original list-and-bisect implementation of imerge, for
+    comparison.
+    """
+    queue = []
+    for it in iterators:
+        it = iter(it)
+        try:
+            bisect.insort(queue, (it.next(), it))
+        except StopIteration:
+            pass
+    while queue:
+        val, it = queue.pop(0)
+        yield val
+        try:
+            bisect.insort(queue, (it.next(), it))
+        except StopIteration:
+            pass
+
+def make_streams(k, seed=0):
+    """
+    Returns *k* sorted lists of random integers, with about
+    :data:`ITEMS` items in total.
+    """
+    rand = random.Random(seed)
+    size = max(1, ITEMS // k)
+    return [sorted(rand.randint(0, 10**9) for i in xrange(size))
+            for j in xrange(k)]
+
+# Each benchmark is the best of this many runs
+REPEAT = 3
+
+def time_call(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+def best_time(func):
+    "Returns the shortest of :data:`REPEAT` timings of *func*()."
+    return min(time_call(func) for i in xrange(REPEAT))
+
+def consume(iterator):
+    for x in iterator:
+        pass
+
+def bench_imerge(ks):
+    print "%-8s %-10s %-12s %-12s %-8s" % (
+        "k", "items", "bisect", "heap", "speedup")
+    for k in ks:
+        streams = make_streams(k)
+        items = sum(len(s) for s in streams)
+        old = best_time(lambda: consume(bisect_imerge(*streams)))
+        new = best_time(lambda: consume(imerge(*streams)))
+        print "%-8d %-10d %-12.3f %-12.3f %-8.1f" % (
+            k, items, old, new, old / new)
+    print "(seconds)"
+
+def main(argv):
+    ks = [int(x) for x in argv] or DEFAULT_KS
+    bench_imerge(ks)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,172 @@
+# Copyright 2008-2013 by Carnegie Mellon University
+
+# @OPENSOURCE_HEADER_START@
+# Use of the Network Situational Awareness Python support library and
+# related source code is subject to the terms of the following licenses:
+# 
+# GNU Public License (GPL) Rights pursuant to Version 2, June 1991
+# Government Purpose License Rights (GPLR) pursuant to DFARS 252.227.7013
+# 
+# NO WARRANTY
+# 
+# ANY INFORMATION, MATERIALS, SERVICES, INTELLECTUAL PROPERTY OR OTHER 
+# PROPERTY OR RIGHTS GRANTED OR PROVIDED BY CARNEGIE MELLON UNIVERSITY 
+# PURSUANT TO THIS LICENSE (HEREINAFTER THE "DELIVERABLES") ARE ON AN 
+# "AS-IS" BASIS. CARNEGIE MELLON UNIVERSITY MAKES NO WARRANTIES OF ANY 
+# KIND, EITHER EXPRESS OR IMPLIED AS TO ANY MATTER INCLUDING, BUT NOT 
+# LIMITED TO, WARRANTY OF FITNESS FOR A PARTICULAR PURPOSE, 
+# MERCHANTABILITY, INFORMATIONAL CONTENT, NONINFRINGEMENT, OR ERROR-FREE 
+# OPERATION. CARNEGIE MELLON UNIVERSITY SHALL NOT BE LIABLE FOR INDIRECT, 
+# SPECIAL OR CONSEQUENTIAL DAMAGES, SUCH AS LOSS OF PROFITS OR INABILITY 
+# TO USE SAID INTELLECTUAL PROPERTY, UNDER THIS LICENSE, REGARDLESS OF 
+# WHETHER SUCH PARTY WAS AWARE OF THE POSSIBILITY OF SUCH DAMAGES. 
+# LICENSEE AGREES THAT IT WILL NOT MAKE ANY WARRANTY ON BEHALF OF 
+# CARNEGIE MELLON UNIVERSITY, EXPRESS OR IMPLIED, TO ANY PERSON 
+# CONCERNING THE APPLICATION OF OR THE RESULTS TO BE OBTAINED WITH THE 
+# DELIVERABLES UNDER THIS LICENSE.
+# 
+# Licensee hereby agrees to defend, indemnify, and hold harmless Carnegie 
+# Mellon University, its trustees, officers, employees, and agents from 
+# all claims or demands made against them (and any related losses, 
+# expenses, or attorney's fees) arising out of, or relating to Licensee's 
+# and/or its sub licensees' negligent use or willful misuse of or 
+# negligent conduct or willful misconduct regarding the Software, 
+# facilities, or other rights or assistance granted by Carnegie Mellon 
+# University under this License, including, but not limited to, any 
+# claims of product liability, personal injury, death, damage to 
+# property, or violation of any laws or regulations.
+# 
+# Carnegie Mellon University Software Engineering Institute authored 
+# documents are sponsored by the U.S. Department of Defense under 
+# Contract FA8721-05-C-0003. Carnegie Mellon University retains 
+# copyrights in all material produced under this contract. The U.S. 
+# Government retains a non-exclusive, royalty-free license to publish or 
+# reproduce these documents, or allow others to do so, for U.S. 
+# Government purposes only pursuant to the copyright license under the 
+# contract clause at 252.227.7013.
+# @OPENSOURCE_HEADER_END@
+import random
+import unittest
+
+from netsa.util.collections import range_set, int_range_set
+
+class even_range_set(int_range_set):
+    # Values are stored as their halves
+    def _in_conv(self, x):
+        return x // 2
+    def _out_conv(self, x):
+        return x * 2
+
+class IntRangeSetTest(unittest.TestCase):
+
+    def test_cons_1(self):
+        s = int_range_set([5, 1, 2, 3, 7, 6])
+        self.assertEqual(s.ranges(), [(1, 3), (5, 7)])
+        self.assertEqual(len(s), 6)
+
+    def test_cons_2(self):
+        s = int_range_set([(10, 20), (1, 5), (4, 8), (21, 22)])
+        self.assertEqual(s.ranges(), [(1, 8), (10, 22)])
+        self.assertEqual(int_range_set().ranges(), [])
+        self.assertEqual(int_range_set([]).ranges(), [])
+
+    def test_cons_3(self):
+        s = int_range_set([1, 2, 3])
+        t = int_range_set(s)
+        t.add(10)
+        self.assertEqual(s.ranges(), [(1, 3)])
+        self.assertEqual(t.ranges(), [(1, 3), (10, 10)])
+        self.assertEqual(s.copy(), s)
+
+    def test_contains_1(self):
+        s = int_range_set([(1, 3), (10, 20)])
+        for x in [1, 2, 3, 10, 15, 20]:
+            self.assert_(x in s)
+        for x in [0, 4, 9, 21, -5, 100]:
+            self.assert_(x not in s)
+
+    def test_ops_1(self):
+        s = int_range_set([(1, 10), (20, 30)])
+        t = int_range_set([(5, 25), (40, 40)])
+        self.assertEqual((s | t).ranges(), [(1, 30), (40, 40)])
+        self.assertEqual((s & t).ranges(), [(5, 10), (20, 25)])
+        self.assertEqual((s - t).ranges(), [(1, 4), (26, 30)])
+        self.assertEqual((s ^ t).ranges(),
+                         [(1, 4), (11, 19), (26, 30), (40, 40)])
+        self.assert_(s.intersection(t) <= s)
+        self.assert_(s < s.union(t))
+        self.assert_(not s < s)
+        self.assert_(s.isdisjoint(int_range_set([11, 19, 31])))
+        self.assert_(not s.isdisjoint(t))
+
+    def test_ops_2(self):
+        rand = random.Random(1)
+        for i in xrange(50):
+            xs = set(rand.randint(0, 60) for j in xrange(30))
+            ys = set(rand.randint(0, 60) for j in xrange(30))
+            (s, t) = (int_range_set(xs), int_range_set(ys))
+            self.assertEqual(set(s | t), xs | ys)
+            self.assertEqual(set(s & t), xs & ys)
+            self.assertEqual(set(s - t), xs - ys)
+            self.assertEqual(set(s ^ t), xs ^ ys)
+            self.assertEqual(s <= t, xs <= ys)
+            self.assertEqual(s >= t, xs >= ys)
+            self.assertEqual(s.isdisjoint(t), xs.isdisjoint(ys))
+            self.assertEqual(set(s.union(ys)), xs | ys)
+            self.assertEqual(set(s & range_set(ys)), xs & ys)
+
+    def test_update_1(self):
+        s = int_range_set([(1, 10)])
+        s |= int_range_set([(11, 12)])
+        self.assertEqual(s.ranges(), [(1, 12)])
+        s &= int_range_set([(5, 20)])
+        self.assertEqual(s.ranges(), [(5, 12)])
+        s -= int_range_set([7])
+        self.assertEqual(s.ranges(), [(5, 6), (8, 12)])
+        s ^= int_range_set([(7, 8)])
+        self.assertEqual(s.ranges(), [(5, 7), (9, 12)])
+
+    def test_add_discard_1(self):
+        rand = random.Random(2)
+        s = int_range_set()
+        xs = set()
+        for i in xrange(500):
+            x = rand.randint(0, 40)
+            if rand.random() < 0.6:
+                s.add(x)
+                xs.add(x)
+            else:
+                s.discard(x)
+                xs.discard(x)
+            self.assertEqual(s, int_range_set(xs))
+        self.assertRaises(KeyError, s.remove, 41)
+
+    def test_pop_1(self):
+        s = int_range_set([1, 2, 5])
+        self.assertEqual([s.pop(), s.pop(), s.pop()], [5, 2, 1])
+        self.assertRaises(KeyError, s.pop)
+
+    def test_mixed_1(self):
+        s = int_range_set([(1, 5), (8, 9)])
+        r = range_set(s)
+        self.assertEqual(r.ranges(), s.ranges())
+        self.assertEqual(s, r)
+        self.assertEqual((r | s).ranges(), s.ranges())
+        self.assertEqual((s - range_set([(2, 8)])).ranges(), [(1, 1), (9, 9)])
+        self.assert_(not hasattr(s, '_ranges'))
+
+    def test_conv_1(self):
+        s = even_range_set([2, 4, 6, 10])
+        self.assertEqual(s._starts, [1, 5])
+        self.assertEqual(s.ranges(), [(2, 6), (10, 10)])
+        self.assertEqual(list(s), [2, 4, 6, 10])
+        self.assert_(8 not in s)
+        self.assert_(4 in s)
+        s.add(8)
+        self.assertEqual(s.ranges(), [(2, 10)])
+
+__all__ = """
+
+    IntRangeSetTest
+
+""".split()
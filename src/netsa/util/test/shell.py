@@ -46,6 +46,10 @@
 # contract clause at 252.227.7013.
 # @OPENSOURCE_HEADER_END@
 
+import errno
+import os
+import signal
+import time
 import unittest
 
 from netsa.files import get_temp_file_name, get_temp_pipe_name
@@ -104,6 +108,183 @@ class ShellTest(unittest.TestCase):
             pipeline(command("echo", "foo"), stdout=f1),
             [command("false", ignore_exit_statuses=[2])])
 
+    def test_run_parallel_7(self):
+        f1 = get_temp_file_name()
+        exits = run_parallel(
+            *[["sh -c 'echo %d >>%%(f1)s'" % i] for i in xrange(10)],
+            **{'vars': {"f1": f1}, 'max_parallel': 3})
+        self.assertEqual(exits, [[0]] * 10)
+        content = open(f1, "r").read()
+        self.assertEqual(sorted(content.split()), [str(i) for i in xrange(10)])
+
+    def test_run_parallel_8(self):
+        # One at a time, a failure stops any more from starting
+        f1 = get_temp_file_name()
+        try:
+            run_parallel(["echo a", ">>%(f1)s"], ["false"],
+                         ["echo b", ">>%(f1)s"],
+                         vars={"f1": f1}, max_parallel=1)
+            self.fail()
+        except PipelineException, e:
+            exits = e.get_exit_statuses()
+            self.assertEqual(exits[0], [0])
+            self.assertNotEqual(exits[1][0], 0)
+            self.assertEqual(exits[2], [None])
+        self.assertEqual(open(f1, "r").read(), "a\n")
+
+    def test_run_parallel_9(self):
+        f1 = get_temp_file_name()
+        try:
+            run_parallel(["false"], ["echo b", ">>%(f1)s"],
+                         vars={"f1": f1}, max_parallel=1, keep_going=True)
+            self.fail()
+        except PipelineException, e:
+            self.assertEqual(e.get_exit_statuses()[1], [0])
+        self.assertEqual(open(f1, "r").read(), "b\n")
+
+    def test_pipeline_pool_1(self):
+        f1 = get_temp_file_name()
+        pool = PipelinePool(max_parallel=1, vars={"f1": f1})
+        pool.add(["echo %(x)s", ">>%(f1)s"], vars={"x": "low"})
+        pool.add(["echo %(x)s", ">>%(f1)s"], vars={"x": "high"}, priority=1)
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.run(), [[0], [0]])
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(open(f1, "r").read(), "high\nlow\n")
+        self.assertRaises(ValueError, PipelinePool, max_parallel=0)
+
+    def test_start_parallel_1(self):
+        f1 = get_temp_file_name()
+        run = start_parallel(["sleep 0.2"], ["echo foo", ">%(f1)s"],
+                             vars={"f1": f1}, max_parallel=1)
+        self.assertRaises(ValueError, run.result)
+        polls = 0
+        while not run.poll(0.05):
+            polls += 1
+        self.assert_(polls > 0)
+        self.assertEqual(run.result(), [[0], [0]])
+        self.assertEqual(open(f1, "r").read(), "foo\n")
+
+    def test_start_parallel_2(self):
+        run = start_parallel(["sleep 30"], ["sleep 30"])
+        self.assert_(run.is_running())
+        run.abort()
+        self.assertRaises(PipelineException, run.wait)
+        self.assert_(not run.is_running())
+
+    def get_wakeup_fd(self):
+        fd = signal.set_wakeup_fd(-1)
+        signal.set_wakeup_fd(fd)
+        return fd
+
+    def test_poll_releases_sigchld(self):
+        handler = signal.getsignal(signal.SIGCHLD)
+        run = start_parallel(["sleep 0.2"])
+        while not run.poll(0.05):
+            self.assertEqual(signal.getsignal(signal.SIGCHLD), handler)
+            self.assertEqual(self.get_wakeup_fd(), -1)
+        run.result()
+        self.assertEqual(signal.getsignal(signal.SIGCHLD), handler)
+
+    def test_foreign_wakeup_fd(self):
+        (read_fd, write_fd) = os.pipe()
+        handler = signal.getsignal(signal.SIGCHLD)
+        signal.set_wakeup_fd(write_fd)
+        try:
+            start = time.time()
+            run = start_parallel(["sleep 0.1"])
+            self.assertEqual(self.get_wakeup_fd(), write_fd)
+            run.wait()
+            self.assert_(time.time() - start < 1.0)
+            run.poll()
+            self.assertEqual(self.get_wakeup_fd(), write_fd)
+            self.assertEqual(signal.getsignal(signal.SIGCHLD), handler)
+        finally:
+            signal.set_wakeup_fd(-1)
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_sigchld_interrupt_restored(self):
+        # A handler of our own should interrupt system calls again
+        # once the pipeline is done with SIGCHLD.
+        old_chld = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        (read_fd, write_fd) = os.pipe()
+        old_alrm = signal.signal(signal.SIGALRM,
+                                 lambda signum, frame: os.write(write_fd, "x"))
+        try:
+            run_parallel(["true"])
+            pid = os.fork()
+            if pid == 0:
+                time.sleep(0.2)
+                os._exit(0)
+            start = time.time()
+            signal.alarm(2)
+            try:
+                os.read(read_fd, 1)
+            except OSError, e:
+                self.assertEqual(e.errno, errno.EINTR)
+            os.waitpid(pid, 0)
+            self.assert_(time.time() - start < 1.5)
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old_alrm)
+            signal.signal(signal.SIGCHLD, old_chld)
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_resources_1(self):
+        run = start_parallel(["sh -c 'head -c 100000 /dev/zero'", "cat"],
+                             io_accounting=True)
+        run.wait()
+        [[r1, r2]] = run.get_resources()
+        for r in (r1, r2):
+            self.assert_(r['wall_time'] >= 0)
+            self.assert_(r['user_time'] >= 0)
+            self.assert_(r['sys_time'] >= 0)
+            self.assert_(r['max_rss'] > 0)
+        if os.path.exists("/proc/self/io"):
+            self.assert_(r1['write_bytes'] >= 100000)
+            self.assert_(r2['read_bytes'] >= 100000)
+        status = run.get_status()
+        self.assertEqual(len(status.split('\n')), 2)
+        for (line, r) in zip(status.split('\n'), (r1, r2)):
+            self.assert_("[%.2fs wall, " % r['wall_time'] in line, line)
+            self.assert_("%dKB rss" % r['max_rss'] in line, line)
+
+    def test_resources_2(self):
+        run = start_parallel(["true"], ["sleep 30"])
+        run.abort()
+        try:
+            run.wait()
+            self.fail()
+        except PipelineException, e:
+            [[r1], [r2]] = e.get_resources()
+            self.assertEqual(r1['read_bytes'], None)
+            self.assert_(r2['wall_time'] < 30)
+
+    def test_reaped_elsewhere(self):
+        run = start_parallel(["sleep 0.1"])
+        os.waitpid(-1, 0)
+        try:
+            run.wait()
+            self.fail()
+        except PipelineException, e:
+            self.assertEqual(e.get_exit_statuses(), [[-1]])
+        [[r]] = run.get_resources()
+        self.assertEqual(r['user_time'], None)
+        self.assert_("?(-1)" in run.get_status())
+
+    def test_run_collect_files_resources(self):
+        try:
+            run_collect_files("sh -c 'echo oops >&2; exit 3'")
+            self.fail()
+        except PipelineException, e:
+            [[status]] = e.get_exit_statuses()
+            self.assertEqual(os.WEXITSTATUS(status), 3)
+            [[r]] = e.get_resources()
+            self.assert_(r['wall_time'] >= 0)
+            self.assert_("oops" in e.get_message())
+
     def test_run_collect_1(self):
         f1 = get_temp_file_name()
         f = open(f1, 'w')
@@ -116,6 +297,68 @@ class ShellTest(unittest.TestCase):
         self.assertEqual(stderr, "")
         self.assertEqual(stdout, "bar\nfoo\n")
 
+    def test_run_stream_1(self):
+        stream = run_stream("printf 'a\\nb\\nc'", "cat")
+        self.assertEqual(stream.readline(), "a\n")
+        self.assertEqual(list(stream), ["b\n", "c"])
+        self.assertEqual(stream.get_exit_statuses(), [[0, 0]])
+        self.assertEqual(stream.close(), [[0, 0]])
+
+    def test_run_stream_2(self):
+        stream = run_stream("sh -c 'echo a; sleep 1; exit 3'")
+        self.assertEqual(stream.read(1), "a")
+        try:
+            stream.read()
+            self.fail()
+        except PipelineException, e:
+            self.assertEqual(os.WEXITSTATUS(e.get_exit_statuses()[0][0]), 3)
+
+    def test_run_stream_3(self):
+        stream = run_stream("yes")
+        self.assertEqual(stream.readline(), "y\n")
+        statuses = stream.close()
+        self.assertNotEqual(statuses[0][0], None)
+
+    def test_run_stream_4(self):
+        f1 = get_temp_file_name()
+        stream = run_stream("echo foo", ">%(f1)s", vars={"f1": f1})
+        self.assertEqual(stream.read(), "")
+        self.assertEqual(open(f1, "r").read(), "foo\n")
+
+    def test_run_stream_dropped(self):
+        for line in run_stream("yes", "cat"):
+            break
+        # Nothing should be left running, or waiting to be reaped
+        try:
+            os.waitpid(-1, os.WNOHANG)
+            self.fail()
+        except OSError, e:
+            self.assertEqual(e.errno, errno.ECHILD)
+
+    def test_run_tee_1(self):
+        f1 = get_temp_file_name()
+        f2 = get_temp_file_name()
+        exits = run_tee(["printf 'b\\na\\nb\\n'"],
+                        ["sort", ">%(f1)s"], ["uniq -c", "wc -l", ">%(f2)s"],
+                        vars={"f1": f1, "f2": f2})
+        self.assertEqual(exits, [[0, 0], [0], [0, 0]])
+        self.assertEqual(open(f1, "r").read(), "a\nb\nb\n")
+        self.assertEqual(open(f2, "r").read().strip(), "3")
+
+    def test_run_tee_2(self):
+        f1 = get_temp_file_name()
+        stream = run_tee("seq 1 1000", ["wc -l", ">%(f1)s"],
+                         vars={"f1": f1}, stream=True)
+        lines = list(stream)
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(lines[-1], "1000\n")
+        self.assertEqual(stream.get_exit_statuses(), [[0, 0], [0]])
+        self.assertEqual(open(f1, "r").read().strip(), "1000")
+
+    def test_run_tee_3(self):
+        self.assertRaises(PipelineException, run_tee, "seq 1 10", ["false"])
+        self.assertRaises(TypeError, run_tee, "seq 1 10")
+
     def test_run_collect_files_1(self):
         f1 = get_temp_file_name()
         f = open(f1, 'w')
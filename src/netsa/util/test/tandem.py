@@ -0,0 +1,211 @@
+# Copyright 2008-2013 by Carnegie Mellon University
+
+# @OPENSOURCE_HEADER_START@
+# Use of the Network Situational Awareness Python support library and
+# related source code is subject to the terms of the following licenses:
+# 
+# GNU Public License (GPL) Rights pursuant to Version 2, June 1991
+# Government Purpose License Rights (GPLR) pursuant to DFARS 252.227.7013
+# 
+# NO WARRANTY
+# 
+# ANY INFORMATION, MATERIALS, SERVICES, INTELLECTUAL PROPERTY OR OTHER 
+# PROPERTY OR RIGHTS GRANTED OR PROVIDED BY CARNEGIE MELLON UNIVERSITY 
+# PURSUANT TO THIS LICENSE (HEREINAFTER THE "DELIVERABLES") ARE ON AN 
+# "AS-IS" BASIS. CARNEGIE MELLON UNIVERSITY MAKES NO WARRANTIES OF ANY 
+# KIND, EITHER EXPRESS OR IMPLIED AS TO ANY MATTER INCLUDING, BUT NOT 
+# LIMITED TO, WARRANTY OF FITNESS FOR A PARTICULAR PURPOSE, 
+# MERCHANTABILITY, INFORMATIONAL CONTENT, NONINFRINGEMENT, OR ERROR-FREE 
+# OPERATION. CARNEGIE MELLON UNIVERSITY SHALL NOT BE LIABLE FOR INDIRECT, 
+# SPECIAL OR CONSEQUENTIAL DAMAGES, SUCH AS LOSS OF PROFITS OR INABILITY 
+# TO USE SAID INTELLECTUAL PROPERTY, UNDER THIS LICENSE, REGARDLESS OF 
+# WHETHER SUCH PARTY WAS AWARE OF THE POSSIBILITY OF SUCH DAMAGES. 
+# LICENSEE AGREES THAT IT WILL NOT MAKE ANY WARRANTY ON BEHALF OF 
+# CARNEGIE MELLON UNIVERSITY, EXPRESS OR IMPLIED, TO ANY PERSON 
+# CONCERNING THE APPLICATION OF OR THE RESULTS TO BE OBTAINED WITH THE 
+# DELIVERABLES UNDER THIS LICENSE.
+# 
+# Licensee hereby agrees to defend, indemnify, and hold harmless Carnegie 
+# Mellon University, its trustees, officers, employees, and agents from 
+# all claims or demands made against them (and any related losses, 
+# expenses, or attorney's fees) arising out of, or relating to Licensee's 
+# and/or its sub licensees' negligent use or willful misuse of or 
+# negligent conduct or willful misconduct regarding the Software, 
+# facilities, or other rights or assistance granted by Carnegie Mellon 
+# University under this License, including, but not limited to, any 
+# claims of product liability, personal injury, death, damage to 
+# property, or violation of any laws or regulations.
+# 
+# Carnegie Mellon University Software Engineering Institute authored 
+# documents are sponsored by the U.S. Department of Defense under 
+# Contract FA8721-05-C-0003. Carnegie Mellon University retains 
+# copyrights in all material produced under this contract. The U.S. 
+# Government retains a non-exclusive, royalty-free license to publish or 
+# reproduce these documents, or allow others to do so, for U.S. 
+# Government purposes only pursuant to the copyright license under the 
+# contract clause at 252.227.7013.
+# @OPENSOURCE_HEADER_END@
+import operator
+import os
+import random
+import unittest
+
+from netsa.files import get_temp_file_name
+from netsa.util.tandem import (imerge, dzip, dzip_batched, file_pairs,
+                               external_sort)
+
+class TandemTest(unittest.TestCase):
+
+    def test_imerge_1(self):
+        self.assertEqual(list(imerge([1, 4, 7], [2, 5, 8], [3, 6, 9])),
+                         range(1, 10))
+
+    def test_imerge_2(self):
+        self.assertEqual(list(imerge()), [])
+        self.assertEqual(list(imerge([], [1], [])), [1])
+        self.assertEqual(list(imerge(iter([1, 3]), xrange(0, 5, 2))),
+                         [0, 1, 2, 3, 4])
+
+    def test_imerge_3(self):
+        self.assertEqual(list(imerge([7, 4, 1], [8, 2], reversed=True)),
+                         [8, 7, 4, 2, 1])
+
+    def test_imerge_4(self):
+        xs = [(1, 'a'), (2, 'a'), (2, 'b')]
+        ys = [(0, 'c'), (2, 'c'), (3, 'c')]
+        key = operator.itemgetter(0)
+        self.assertEqual(list(imerge(ys, xs, key=key)),
+                         [(0, 'c'), (1, 'a'), (2, 'c'), (2, 'a'), (2, 'b'),
+                          (3, 'c')])
+        self.assertEqual(list(imerge(xs[::-1], ys[::-1], key=key,
+                                     reversed=True)),
+                         [(3, 'c'), (2, 'b'), (2, 'a'), (2, 'c'), (1, 'a'),
+                          (0, 'c')])
+
+    def test_imerge_5(self):
+        rand = random.Random(1)
+        lists = [sorted(rand.randint(0, 100) for j in xrange(rand.randint(0, 20)))
+                 for i in xrange(50)]
+        self.assertEqual(list(imerge(*lists)), sorted(sum(lists, [])))
+        self.assertEqual(list(imerge(reversed=True,
+                                     *[l[::-1] for l in lists])),
+                         sorted(sum(lists, []), reverse=True))
+
+    def test_imerge_6(self):
+        self.assertRaises(TypeError, list, imerge([1], bogus=True))
+
+    def test_dzip_1(self):
+        self.assertEqual(list(dzip({1: 'a', 2: 'b'}, [(2, 'c'), (3, 'd')])),
+                         [(1, ('a',)), (2, ('b', 'c')), (3, ('d',))])
+
+    def test_dzip_batched_1(self):
+        xs = {1: 'a', 2: 'b', 4: 'c'}
+        ys = [(2, 'd'), (2, 'e'), (3, 'f')]
+        self.assertEqual(list(dzip_batched(xs, ys, batch_size=3)),
+                         [([1, 2, 3], [[('a',), ('b',), ()],
+                                       [(), ('d', 'e'), ('f',)]]),
+                          ([4], [[('c',)], [()]])])
+        self.assertEqual(list(dzip_batched()), [])
+
+    def test_dzip_batched_2(self):
+        rand = random.Random(1)
+        lists = [sorted((rand.randint(0, 50), j) for j in xrange(40))
+                 for i in xrange(5)]
+        expected = list(dzip(*lists))
+        for reverse in (False, True):
+            if reverse:
+                expected.reverse()
+                lists = [l[::-1] for l in lists]
+            result = []
+            for (keys, columns) in dzip_batched(reversed=reverse,
+                                                batch_size=7, *lists):
+                self.assert_(len(keys) <= 7)
+                for (j, k) in enumerate(keys):
+                    result.append(
+                        (k, sorted(sum((c[j] for c in columns), ()))))
+            self.assertEqual(result,
+                             [(k, sorted(vs)) for (k, vs) in expected])
+
+    def test_dzip_batched_3(self):
+        xs = [(1, i) for i in xrange(10)] + [(2, 0)]
+        blocks = list(dzip_batched(xs, [(1, 'x')], spill_size=5))
+        [(keys, [col1, col2])] = blocks
+        self.assertEqual(keys, [1, 2])
+        self.assertEqual(len(col1[0]), 10)
+        self.assertEqual(list(col1[0]), range(10))
+        self.assertEqual(list(col1[0]), range(10))
+        self.assertEqual(col1[1], (0,))
+        self.assertEqual(col2, [('x',), ()])
+
+    def test_dzip_batched_4(self):
+        self.assertRaises(TypeError, list, dzip_batched([], bogus=True))
+        self.assertRaises(ValueError, list, dzip_batched([], batch_size=0))
+
+    def test_file_pairs_1(self):
+        path = get_temp_file_name()
+        f = open(path, 'w')
+        f.write("            sIP|sPort|   Records|\n"
+                "        10.0.0.1|   80|         3|\n"
+                "        10.0.0.2|  443|         1|\n")
+        f.close()
+        self.assertEqual(list(file_pairs(path, skip_header=True)),
+                         [('10.0.0.1', ('80', '3')),
+                          ('10.0.0.2', ('443', '1'))])
+        self.assertEqual(list(file_pairs(open(path), key_fields=2)),
+                         [(('sIP', 'sPort'), ('Records',)),
+                          (('10.0.0.1', '80'), ('3',)),
+                          (('10.0.0.2', '443'), ('1',))])
+        os.remove(path)
+
+    def test_external_sort_1(self):
+        self.assertEqual(list(external_sort([3, 1, 2])), [1, 2, 3])
+        self.assertEqual(list(external_sort([])), [])
+
+    def test_external_sort_2(self):
+        rand = random.Random(1)
+        xs = [(rand.randint(0, 100), i) for i in xrange(1000)]
+        key = operator.itemgetter(0)
+        for reverse in (False, True):
+            for max_runs in (2, 3, 64):
+                self.assertEqual(
+                    list(external_sort(xs, key=key, reverse=reverse,
+                                       buffer_size=37, max_runs=max_runs)),
+                    sorted(xs, key=key, reverse=reverse))
+
+    def test_external_sort_3(self):
+        def dump(v, f):
+            f.write("%d\n" % v)
+        def load(f):
+            return int(f.readline())
+        xs = range(500, 0, -1)
+        self.assertEqual(list(external_sort(xs, buffer_bytes=1000,
+                                            dump=dump, load=load)),
+                         sorted(xs))
+
+    def test_external_sort_passes(self):
+        counts = {'dump': 0, 'load': 0}
+        def dump(v, f):
+            counts['dump'] += 1
+            f.write("%d\n" % v)
+        def load(f):
+            counts['load'] += 1
+            return int(f.readline())
+        rand = random.Random(2)
+        xs = [rand.randint(0, 10**6) for i in xrange(1000)]
+        self.assertEqual(list(external_sort(xs, buffer_size=10, max_runs=4,
+                                            dump=dump, load=load)),
+                         sorted(xs))
+        # 100 runs of 10 are merged in passes to 25, 7, and 2 runs.  The
+        # second pass leaves its last run of 40 items alone.
+        self.assertEqual(counts['dump'], 1000 + 1000 + 960 + 1000)
+        self.assertEqual(counts['load'], counts['dump'])
+
+    def test_external_sort_4(self):
+        self.assertRaises(TypeError, list, external_sort([], bogus=True))
+        self.assertRaises(ValueError, list, external_sort([], max_runs=1))
+
+__all__ = """
+
+    TandemTest
+
+""".split()